@@ -17,11 +17,12 @@ from app.models import (
     auth,           # → auth_usuarios, auth_roles
     auditoria,      # → ope_registro_eventos
     maestros,       # → transportistas, vehiculos_tracto, vehiculos_carreta, choferes, clientes_ie, maestro_fitos, plantas
-    embarque,       # → control_embarque, reporte_embarques
+    embarque,       # → control_embarque, reporte_embarques, alias_nave
     logicapture,    # → logicapture_registros, logicapture_detalles
-    pedido,         # → pedidos_comerciales
-    packing_list,   # → emision_packing_list, detalle_emision_packing_list
+    pedido,         # → pedidos_comerciales, booking_pedido
+    packing_list,   # → emision_packing_list, detalle_emision_packing_list, pl_correlativo_semana
     posicionamiento, # → posicionamientos
+    sincronizacion, # → sync_version_tabla, sync_claves_idempotencia
 )
 
 # this is the Alembic Config object, which provides
@@ -0,0 +1,36 @@
+"""add_archivo_metadata_emision_pl
+
+Revision ID: 4c8e1f9a2b63
+Revises: e2a9c4b7d310
+Create Date: 2026-10-17 14:05:12.418230
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4c8e1f9a2b63'
+down_revision: Union[str, Sequence[str], None] = 'e2a9c4b7d310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las emisiones existentes quedan con NULL: el historial verifica su archivo
+    # en disco una sola vez y guarda el resultado.
+    op.add_column('emision_packing_list', sa.Column('archivo_bytes', sa.Integer(), nullable=True))
+    op.add_column('emision_packing_list', sa.Column('archivo_sha256', sa.String(length=64), nullable=True))
+    op.add_column('emision_packing_list', sa.Column('archivo_disponible', sa.Boolean(), nullable=True))
+    op.create_index(op.f('ix_emision_packing_list_fecha_generacion'), 'emision_packing_list', ['fecha_generacion'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_emision_packing_list_fecha_generacion'), table_name='emision_packing_list')
+    op.drop_column('emision_packing_list', 'archivo_disponible')
+    op.drop_column('emision_packing_list', 'archivo_sha256')
+    op.drop_column('emision_packing_list', 'archivo_bytes')
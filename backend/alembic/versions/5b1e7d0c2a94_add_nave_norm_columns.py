@@ -0,0 +1,45 @@
+"""add_nave_norm_columns
+
+Revision ID: 5b1e7d0c2a94
+Revises: c77ac8cd78bf
+Create Date: 2026-10-17 09:12:40.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b1e7d0c2a94'
+down_revision: Union[str, Sequence[str], None] = 'c77ac8cd78bf'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Misma regla que app.utils.formatters.normalize_vessel_name:
+# MAYÚSCULAS, "/" como espacio y espacios colapsados; NULL si queda vacío.
+def _norm_sql(columna: str) -> str:
+    return f"NULLIF(btrim(regexp_replace(upper({columna}), '[/[:space:]]+', ' ', 'g')), '')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reporte_embarques', sa.Column('nave_arribo_norm', sa.String(length=200), nullable=True))
+    op.add_column('posicionamientos', sa.Column('nave_norm', sa.String(length=100), nullable=True))
+
+    # Backfill de los registros existentes
+    op.execute(f"UPDATE reporte_embarques SET nave_arribo_norm = {_norm_sql('nave_arribo')}")
+    op.execute(f"UPDATE posicionamientos SET nave_norm = {_norm_sql('nave')}")
+
+    op.create_index(op.f('ix_reporte_embarques_nave_arribo_norm'), 'reporte_embarques', ['nave_arribo_norm'], unique=False)
+    op.create_index(op.f('ix_posicionamientos_nave_norm'), 'posicionamientos', ['nave_norm'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_posicionamientos_nave_norm'), table_name='posicionamientos')
+    op.drop_index(op.f('ix_reporte_embarques_nave_arribo_norm'), table_name='reporte_embarques')
+    op.drop_column('posicionamientos', 'nave_norm')
+    op.drop_column('reporte_embarques', 'nave_arribo_norm')
@@ -0,0 +1,44 @@
+"""add_sync_claves_idempotencia
+
+Revision ID: 7c2e4a9f1b56
+Revises: c5f9e3a7d208
+Create Date: 2026-10-17 23:52:14.418306
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2e4a9f1b56'
+down_revision: Union[str, Sequence[str], None] = 'c5f9e3a7d208'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_claves_idempotencia',
+        sa.Column('clave', sa.String(length=200), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('huella', sa.String(length=64), nullable=False),
+        sa.Column('job_id', sa.String(length=32), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('proceso', sa.String(length=32), nullable=False),
+        sa.Column('descripcion', sa.String(length=200), nullable=True),
+        sa.Column('resultado', sa.JSON(), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('fecha_creacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('fecha_actualizacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('clave'),
+    )
+    op.create_index(op.f('ix_sync_claves_idempotencia_job_id'), 'sync_claves_idempotencia', ['job_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_sync_claves_idempotencia_job_id'), table_name='sync_claves_idempotencia')
+    op.drop_table('sync_claves_idempotencia')
@@ -0,0 +1,41 @@
+"""add_alias_nave
+
+Revision ID: 8d4f2a6c1e37
+Revises: 5b1e7d0c2a94
+Create Date: 2026-10-17 10:03:11.542870
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d4f2a6c1e37'
+down_revision: Union[str, Sequence[str], None] = '5b1e7d0c2a94'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('alias_nave',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('alias', sa.String(length=200), nullable=False),
+    sa.Column('canonico', sa.String(length=200), nullable=False),
+    sa.Column('nave_canonica', sa.String(length=200), nullable=False),
+    sa.Column('fecha_creacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_alias_nave_alias'), 'alias_nave', ['alias'], unique=True)
+    op.create_index(op.f('ix_alias_nave_canonico'), 'alias_nave', ['canonico'], unique=False)
+    op.create_index(op.f('ix_alias_nave_id'), 'alias_nave', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_alias_nave_id'), table_name='alias_nave')
+    op.drop_index(op.f('ix_alias_nave_canonico'), table_name='alias_nave')
+    op.drop_index(op.f('ix_alias_nave_alias'), table_name='alias_nave')
+    op.drop_table('alias_nave')
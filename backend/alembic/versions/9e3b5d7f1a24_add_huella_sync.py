@@ -0,0 +1,34 @@
+"""add_huella_sync
+
+Revision ID: 9e3b5d7f1a24
+Revises: 4c8e1f9a2b63
+Create Date: 2026-10-17 16:20:41.903114
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9e3b5d7f1a24'
+down_revision: Union[str, Sequence[str], None] = '4c8e1f9a2b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Las filas existentes quedan con NULL: la primera sincronización (completa o
+    # delta) las reescribe y les asigna su huella.
+    op.add_column('posicionamientos', sa.Column('huella', sa.String(length=32), nullable=True))
+    op.add_column('pedidos_comerciales', sa.Column('huella', sa.String(length=32), nullable=True))
+    op.add_column('reporte_embarques', sa.Column('huella', sa.String(length=32), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('reporte_embarques', 'huella')
+    op.drop_column('pedidos_comerciales', 'huella')
+    op.drop_column('posicionamientos', 'huella')
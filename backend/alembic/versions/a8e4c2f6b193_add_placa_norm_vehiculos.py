@@ -0,0 +1,50 @@
+"""add_placa_norm_vehiculos
+
+Revision ID: a8e4c2f6b193
+Revises: f1c6b8d2a437
+Create Date: 2026-10-17 20:41:08.553917
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e4c2f6b193'
+down_revision: Union[str, Sequence[str], None] = 'f1c6b8d2a437'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLAS = (('vehiculos_tracto', 'placa_tracto'), ('vehiculos_carreta', 'placa_carreta'))
+
+
+# Misma regla que app.utils.formatters.normalize_plate: MAYÚSCULAS y solo A-Z/0-9; NULL si queda vacío.
+def _norm_sql(columna: str) -> str:
+    return f"NULLIF(regexp_replace(upper({columna}), '[^A-Z0-9]', '', 'g'), '')"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for tabla, placa in TABLAS:
+        op.add_column(tabla, sa.Column('placa_norm', sa.String(length=20), nullable=True))
+        # Backfill: si dos placas normalizan igual ("ABC-123" y "ABC123") la clave queda en
+        # la de menor id, que es la que devolvía la búsqueda anterior; la otra queda en NULL.
+        op.execute(
+            f"""
+            UPDATE {tabla} t SET placa_norm = {_norm_sql('t.' + placa)}
+            WHERE t.id = (
+                SELECT MIN(o.id) FROM {tabla} o
+                WHERE {_norm_sql('o.' + placa)} = {_norm_sql('t.' + placa)}
+            )
+            """
+        )
+        op.create_index(op.f(f'ix_{tabla}_placa_norm'), tabla, ['placa_norm'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for tabla, _ in reversed(TABLAS):
+        op.drop_index(op.f(f'ix_{tabla}_placa_norm'), table_name=tabla)
+        op.drop_column(tabla, 'placa_norm')
@@ -0,0 +1,40 @@
+"""unique_booking_reporte_embarques
+
+Revision ID: b6d2e8f4c915
+Revises: 9e3b5d7f1a24
+Create Date: 2026-10-17 17:02:18.551903
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b6d2e8f4c915'
+down_revision: Union[str, Sequence[str], None] = '9e3b5d7f1a24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Depuración: un registro por booking. Se conserva el de menor id, que es el
+    # que hasta ahora usaban el PL y el correlativo (recorrían por id desc y el
+    # último asignado ganaba).
+    op.execute(
+        """
+        DELETE FROM reporte_embarques r
+        USING reporte_embarques o
+        WHERE r.booking = o.booking AND r.id > o.id
+        """
+    )
+    op.drop_index(op.f('ix_reporte_embarques_booking'), table_name='reporte_embarques')
+    op.create_index(op.f('ix_reporte_embarques_booking'), 'reporte_embarques', ['booking'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_reporte_embarques_booking'), table_name='reporte_embarques')
+    op.create_index(op.f('ix_reporte_embarques_booking'), 'reporte_embarques', ['booking'], unique=False)
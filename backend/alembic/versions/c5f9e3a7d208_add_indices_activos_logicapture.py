@@ -0,0 +1,36 @@
+"""add_indices_activos_logicapture
+
+Revision ID: c5f9e3a7d208
+Revises: a8e4c2f6b193
+Create Date: 2026-10-17 22:15:37.902641
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5f9e3a7d208'
+down_revision: Union[str, Sequence[str], None] = 'a8e4c2f6b193'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CAMPOS = ('booking', 'dam', 'contenedor')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Índices parciales: la validación de unicidad solo considera registros no anulados
+    for campo in CAMPOS:
+        op.create_index(
+            f'ix_logicapture_registros_{campo}_activo', 'logicapture_registros', [campo],
+            unique=False, postgresql_where=sa.text("status <> 'ANULADO'"),
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for campo in reversed(CAMPOS):
+        op.drop_index(f'ix_logicapture_registros_{campo}_activo', table_name='logicapture_registros')
@@ -0,0 +1,34 @@
+"""add_sync_version_tabla
+
+Revision ID: d3f7a1c9e852
+Revises: b6d2e8f4c915
+Create Date: 2026-10-17 18:11:07.264318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3f7a1c9e852'
+down_revision: Union[str, Sequence[str], None] = 'b6d2e8f4c915'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'sync_version_tabla',
+        sa.Column('tabla', sa.String(length=100), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('fecha_actualizacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('tabla'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('sync_version_tabla')
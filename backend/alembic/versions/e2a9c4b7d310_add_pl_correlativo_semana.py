@@ -0,0 +1,47 @@
+"""add_pl_correlativo_semana
+
+Revision ID: e2a9c4b7d310
+Revises: 8d4f2a6c1e37
+Create Date: 2026-10-17 11:20:48.903117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2a9c4b7d310'
+down_revision: Union[str, Sequence[str], None] = '8d4f2a6c1e37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('pl_correlativo_semana',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('semana', sa.Integer(), nullable=False),
+    sa.Column('cultivo', sa.String(length=50), nullable=False),
+    sa.Column('naves', sa.JSON(), nullable=False),
+    sa.Column('ids_usados', sa.JSON(), nullable=False),
+    sa.Column('fecha_actualizacion', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('semana', 'cultivo', name='uq_pl_correlativo_semana_cultivo')
+    )
+    op.create_index(op.f('ix_pl_correlativo_semana_id'), 'pl_correlativo_semana', ['id'], unique=False)
+    # Las emisiones existentes quedan sin pl_id/semana: el asignador las reconoce
+    # por el WK del nombre de archivo al sembrar cada semana.
+    op.add_column('emision_packing_list', sa.Column('pl_id', sa.String(length=20), nullable=True))
+    op.add_column('emision_packing_list', sa.Column('semana', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_emision_packing_list_pl_id'), 'emision_packing_list', ['pl_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_emision_packing_list_pl_id'), table_name='emision_packing_list')
+    op.drop_column('emision_packing_list', 'semana')
+    op.drop_column('emision_packing_list', 'pl_id')
+    op.drop_index(op.f('ix_pl_correlativo_semana_id'), table_name='pl_correlativo_semana')
+    op.drop_table('pl_correlativo_semana')
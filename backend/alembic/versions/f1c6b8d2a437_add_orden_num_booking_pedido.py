@@ -0,0 +1,83 @@
+"""add_orden_num_booking_pedido
+
+Revision ID: f1c6b8d2a437
+Revises: d3f7a1c9e852
+Create Date: 2026-10-17 19:02:44.180259
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c6b8d2a437'
+down_revision: Union[str, Sequence[str], None] = 'd3f7a1c9e852'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Misma regla que app.utils.formatters.normalize_orden_beta: con letras que no
+# son prefijos Beta se conserva el valor en mayúsculas; si no, solo dígitos y
+# sin ceros a la izquierda. NULL si no queda nada.
+def _orden_sql(columna: str) -> str:
+    u = f"upper(btrim({columna}, E' \\t\\r\\n'))"
+    digitos = f"regexp_replace({u}, '[^0-9]', '', 'g')"
+    return (
+        f"CASE WHEN {u} ~ '[[:alpha:]]' AND {u} !~ '(BG|CO|BP|BAM|BU|BAA)' THEN {u} "
+        f"WHEN {digitos} = '' THEN NULL "
+        f"ELSE COALESCE(NULLIF(ltrim({digitos}, '0'), ''), '0') END"
+    )
+
+
+# Misma regla que normalize_cultivo: MAYÚSCULAS sin espacios extremos, NULL si vacío o pendiente
+def _cultivo_sql(columna: str) -> str:
+    return f"CASE WHEN upper(btrim({columna})) IN ('', 'PENDIENTE', 'N/A', '-') THEN NULL ELSE upper(btrim({columna})) END"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for tabla in ('posicionamientos', 'pedidos_comerciales'):
+        op.add_column(tabla, sa.Column('orden_num', sa.String(length=50), nullable=True))
+        op.add_column(tabla, sa.Column('cultivo_key', sa.String(length=50), nullable=True))
+        # Backfill de los registros existentes
+        op.execute(f"UPDATE {tabla} SET orden_num = {_orden_sql('orden_beta')}, cultivo_key = {_cultivo_sql('cultivo')}")
+        op.create_index(f'ix_{tabla}_orden_cultivo', tabla, ['orden_num', 'cultivo_key'], unique=False)
+
+    op.create_table(
+        'booking_pedido',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('booking', sa.String(length=50), nullable=False),
+        sa.Column('pedido_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['pedido_id'], ['pedidos_comerciales.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('booking', 'pedido_id', name='uq_booking_pedido'),
+    )
+    op.create_index(op.f('ix_booking_pedido_id'), 'booking_pedido', ['id'], unique=False)
+    op.create_index(op.f('ix_booking_pedido_booking'), 'booking_pedido', ['booking'], unique=False)
+    op.create_index(op.f('ix_booking_pedido_pedido_id'), 'booking_pedido', ['pedido_id'], unique=False)
+
+    # Vínculos iniciales (misma consulta que services/booking_pedido.revincular)
+    op.execute(
+        """
+        INSERT INTO booking_pedido (booking, pedido_id)
+        SELECT p.booking, c.id
+        FROM posicionamientos p
+        JOIN pedidos_comerciales c
+          ON c.orden_num = p.orden_num AND (p.cultivo_key IS NULL OR c.cultivo_key = p.cultivo_key)
+        WHERE p.orden_num IS NOT NULL
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_booking_pedido_pedido_id'), table_name='booking_pedido')
+    op.drop_index(op.f('ix_booking_pedido_booking'), table_name='booking_pedido')
+    op.drop_index(op.f('ix_booking_pedido_id'), table_name='booking_pedido')
+    op.drop_table('booking_pedido')
+    for tabla in ('pedidos_comerciales', 'posicionamientos'):
+        op.drop_index(f'ix_{tabla}_orden_cultivo', table_name=tabla)
+        op.drop_column(tabla, 'cultivo_key')
+        op.drop_column(tabla, 'orden_num')
@@ -34,6 +34,19 @@ class Settings(BaseSettings):
     DB_MAX_OVERFLOW: int = 20
     DB_POOL_TIMEOUT: int = 30
 
+    # Cola de generación de Packing List (hilos fuera del event loop)
+    PL_JOB_WORKERS: int = 2
+    PL_JOB_MAX_PENDIENTES: int = 20
+    PL_JOB_TTL_MINUTOS: int = 60
+
+    # Cola de sincronización asíncrona (/sync/*/jobs). El TTL es lo que un
+    # trabajo terminado queda en memoria (con el detalle de filas con error);
+    # las claves de idempotencia se guardan en la BD durante la retención.
+    SYNC_JOB_WORKERS: int = 1
+    SYNC_JOB_MAX_PENDIENTES: int = 10
+    SYNC_JOB_TTL_MINUTOS: int = 180
+    SYNC_JOB_RETENCION_DIAS: int = 30
+
     # Carga primero .env (prod) y luego .env.local (dev)
     model_config = SettingsConfigDict(
         env_file=(".env", ".env.local"),
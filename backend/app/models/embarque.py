@@ -1,6 +1,7 @@
 from sqlalchemy import Column, Integer, String, DateTime
 from sqlalchemy.sql import func
 from app.database import Base
+from app.utils.formatters import normalize_vessel_name
 import re
 
 def clean_container_code(code: str) -> str:
@@ -47,6 +48,33 @@ class ReporteEmbarques(Base):
     __tablename__ = "reporte_embarques"
 
     id = Column(Integer, primary_key=True, index=True)
-    booking = Column(String(100), index=True)
+    # Un registro por booking: la sincronización hace upsert sobre este índice único
+    booking = Column(String(100), unique=True, index=True)
     nave_arribo = Column(String(200))
 
+    # Nave normalizada (MAYÚSCULAS, sin "/" ni espacios repetidos) para búsquedas indexadas.
+    # Se llena en la sincronización; NULL cuando el reporte no trae nave.
+    nave_arribo_norm = Column(String(200), index=True, nullable=True)
+
+    # Hash del contenido sincronizado (sync delta: filas sin cambios no se reescriben)
+    huella = Column(String(32), nullable=True)
+
+    def __init__(self, **kwargs):
+        if 'nave_arribo' in kwargs and 'nave_arribo_norm' not in kwargs:
+            kwargs['nave_arribo_norm'] = normalize_vessel_name(kwargs['nave_arribo']) or None
+        super(ReporteEmbarques, self).__init__(**kwargs)
+
+
+class AliasNave(Base):
+    """
+    Alias persistidos de nombres de nave (Smart Match).
+    Cada variante escrita de una nave (clave compacta A-Z0-9) apunta al ID canónico
+    de su grupo, para no repetir la comparación difusa en cada consulta de /naves.
+    """
+    __tablename__ = "alias_nave"
+
+    id = Column(Integer, primary_key=True, index=True)
+    alias = Column(String(200), unique=True, index=True, nullable=False)
+    canonico = Column(String(200), index=True, nullable=False)
+    nave_canonica = Column(String(200), nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
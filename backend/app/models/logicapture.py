@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Boolean, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, JSON, ForeignKey, Boolean, Numeric, Index, text
 from sqlalchemy.sql import func
 from app.database import Base
 
@@ -8,6 +8,11 @@ class LogiCaptureRegistro(Base):
     Contiene la cabecera de la operación y los datos de transporte.
     """
     __tablename__ = "logicapture_registros"
+    # Índices parciales para la validación de unicidad: solo cuentan los registros no anulados
+    __table_args__ = tuple(
+        Index(f"ix_logicapture_registros_{campo}_activo", campo, postgresql_where=text("status <> 'ANULADO'"))
+        for campo in ("booking", "dam", "contenedor")
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -2,6 +2,7 @@ from sqlalchemy import Column, Integer, String, Numeric, DateTime, Date, Foreign
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
+from app.utils.formatters import normalize_plate
 
 class Transportista(Base):
     __tablename__ = "transportistas"
@@ -27,6 +28,8 @@ class VehiculoTracto(Base):
     transportista_id = Column(Integer, ForeignKey("transportistas.id", ondelete="CASCADE"))
     
     placa_tracto = Column(String(20), unique=True, index=True, nullable=False)
+    # Placa normalizada para búsquedas indexadas (ver normalize_plate)
+    placa_norm = Column(String(20), unique=True, index=True, nullable=True)
     marca = Column(String(100), nullable=True)
     certificado_vehicular_tracto = Column(String(100), nullable=True)
     largo_tracto = Column(Numeric(10, 2), nullable=True)
@@ -46,6 +49,11 @@ class VehiculoTracto(Base):
     # Relación inversa
     transportista = relationship("Transportista", back_populates="tractos")
 
+    def __init__(self, **kwargs):
+        if 'placa_tracto' in kwargs and 'placa_norm' not in kwargs:
+            kwargs['placa_norm'] = normalize_plate(kwargs['placa_tracto']) or None
+        super(VehiculoTracto, self).__init__(**kwargs)
+
 class VehiculoCarreta(Base):
     __tablename__ = "vehiculos_carreta"
 
@@ -53,6 +61,8 @@ class VehiculoCarreta(Base):
     transportista_id = Column(Integer, ForeignKey("transportistas.id", ondelete="CASCADE"))
     
     placa_carreta = Column(String(20), unique=True, index=True, nullable=False)
+    # Placa normalizada para búsquedas indexadas (ver normalize_plate)
+    placa_norm = Column(String(20), unique=True, index=True, nullable=True)
     certificado_vehicular_carreta = Column(String(100), nullable=True)
     largo_carreta = Column(Numeric(10, 2), nullable=True)
     ancho_carreta = Column(Numeric(10, 2), nullable=True)
@@ -71,6 +81,11 @@ class VehiculoCarreta(Base):
     # Relación inversa
     transportista = relationship("Transportista", back_populates="carretas")
 
+    def __init__(self, **kwargs):
+        if 'placa_carreta' in kwargs and 'placa_norm' not in kwargs:
+            kwargs['placa_norm'] = normalize_plate(kwargs['placa_carreta']) or None
+        super(VehiculoCarreta, self).__init__(**kwargs)
+
 class Chofer(Base):
     __tablename__ = "choferes"
 
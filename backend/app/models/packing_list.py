@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Table
+from sqlalchemy import Boolean, Column, Integer, String, DateTime, ForeignKey, Table, JSON, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.database import Base
@@ -10,7 +10,7 @@ class EmisionPackingList(Base):
     __tablename__ = "emision_packing_list"
 
     id = Column(Integer, primary_key=True, index=True)
-    fecha_generacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_generacion = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     usuario = Column(String(100), nullable=True)
     nave = Column(String(200), index=True)
     estado = Column(String(20), default="ACTIVO", index=True) # ACTIVO, ANULADO
@@ -18,6 +18,12 @@ class EmisionPackingList(Base):
     usuario_anulacion = Column(String(100), nullable=True)
     archivo_nombre = Column(String(500), nullable=True)
     cultivo = Column(String(50), nullable=True)
+    pl_id = Column(String(20), nullable=True, index=True)   # WK ID asignado (ej. WK152)
+    semana = Column(Integer, nullable=True)                 # Semana ETA usada para el WK ID
+    # Metadatos del archivo en storage (NULL = emisión antigua aún no verificada)
+    archivo_bytes = Column(Integer, nullable=True)
+    archivo_sha256 = Column(String(64), nullable=True)
+    archivo_disponible = Column(Boolean, nullable=True)
     
     detalles = relationship("DetalleEmisionPackingList", back_populates="emision")
 
@@ -32,3 +38,20 @@ class DetalleEmisionPackingList(Base):
     booking = Column(String(100), index=True)
     
     emision = relationship("EmisionPackingList", back_populates="detalles")
+
+class CorrelativoSemanaPL(Base):
+    """
+    Asignador de WK IDs por semana ETA + cultivo.
+    - naves: {nave normalizada: ETD ISO} → orden de salida de las naves de la semana
+      (lo mantiene la sincronización de posicionamiento/pedidos/reporte de embarques).
+    - ids_usados: WK IDs de PLs ACTIVOS (lo mantienen la emisión y la anulación).
+    """
+    __tablename__ = "pl_correlativo_semana"
+    __table_args__ = (UniqueConstraint("semana", "cultivo", name="uq_pl_correlativo_semana_cultivo"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    semana = Column(Integer, nullable=False)
+    cultivo = Column(String(50), nullable=False, default="")
+    naves = Column(JSON, nullable=False, default=dict)
+    ids_usados = Column(JSON, nullable=False, default=list)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,15 +1,20 @@
-from sqlalchemy import Column, Integer, String, Numeric, DateTime
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, Numeric, DateTime, UniqueConstraint
 from sqlalchemy.sql import func
 from app.database import Base
+from app.utils.formatters import normalize_cultivo, normalize_orden_beta
 
 class PedidoComercial(Base):
     __tablename__ = "pedidos_comerciales"
+    __table_args__ = (Index("ix_pedidos_comerciales_orden_cultivo", "orden_num", "cultivo_key"),)
 
     id = Column(Integer, primary_key=True, index=True)
     planta = Column(String(100), nullable=True)
     orden_beta = Column(String(50), index=True, nullable=True)
     po = Column(String(100), nullable=True)
     cultivo = Column(String(50), nullable=True)
+    # Claves normalizadas para cruzar con posicionamientos (ver normalize_orden_beta / normalize_cultivo)
+    orden_num = Column(String(50), nullable=True)
+    cultivo_key = Column(String(50), nullable=True)
     cliente = Column(String(200), nullable=True)
     consignatario = Column(String(200), nullable=True)
     recibidor = Column(String(200), nullable=True)
@@ -28,4 +33,26 @@ class PedidoComercial(Base):
     incoterm = Column(String(50), nullable=True)
     tipo_precio = Column(String(50), nullable=True)
     semana_eta = Column(Integer, nullable=True)
+    # Hash del contenido sincronizado (sync delta: filas sin cambios no se reescriben)
+    huella = Column(String(32), nullable=True)
     fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __init__(self, **kwargs):
+        if 'orden_beta' in kwargs and 'orden_num' not in kwargs:
+            kwargs['orden_num'] = normalize_orden_beta(kwargs['orden_beta'])
+        if 'cultivo' in kwargs and 'cultivo_key' not in kwargs:
+            kwargs['cultivo_key'] = normalize_cultivo(kwargs['cultivo'])
+        super(PedidoComercial, self).__init__(**kwargs)
+
+class BookingPedido(Base):
+    """
+    Vínculo booking → pedido comercial: pedidos cuya orden normalizada coincide
+    con la del posicionamiento (y su cultivo, si el posicionamiento lo tiene).
+    Lo mantiene la sincronización (ver services/booking_pedido.revincular).
+    """
+    __tablename__ = "booking_pedido"
+    __table_args__ = (UniqueConstraint("booking", "pedido_id", name="uq_booking_pedido"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    booking = Column(String(50), index=True, nullable=False)
+    pedido_id = Column(Integer, ForeignKey("pedidos_comerciales.id", ondelete="CASCADE"), index=True, nullable=False)
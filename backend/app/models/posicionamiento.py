@@ -1,19 +1,26 @@
-from sqlalchemy import Column, Integer, String, Date, Time, DateTime
+from sqlalchemy import Column, Index, Integer, String, Date, Time, DateTime
 from sqlalchemy.sql import func
 from app.database import Base
+from app.utils.formatters import normalize_cultivo, normalize_orden_beta, normalize_vessel_name
 
 class Posicionamiento(Base):
     __tablename__ = "posicionamientos"
+    __table_args__ = (Index("ix_posicionamientos_orden_cultivo", "orden_num", "cultivo_key"),)
 
     ID = Column("id", Integer, primary_key=True, index=True)
     PLANTA_LLENADO = Column("planta_llenado", String(100), nullable=True)
     CULTIVO = Column("cultivo", String(50), nullable=True)
     BOOKING = Column("booking", String(50), unique=True, index=True, nullable=False)
     NAVE = Column("nave", String(100), nullable=True)
+    # Nave normalizada para búsquedas indexadas (ver normalize_vessel_name)
+    NAVE_NORM = Column("nave_norm", String(100), index=True, nullable=True)
     ETD = Column("etd", Date, nullable=True)
     ETA = Column("eta", Date, nullable=True)
     POL = Column("pol", String(50), nullable=True)
     ORDEN_BETA = Column("orden_beta", String(50), nullable=True)
+    # Claves normalizadas para cruzar con pedidos (ver normalize_orden_beta / normalize_cultivo)
+    ORDEN_NUM = Column("orden_num", String(50), nullable=True)
+    CULTIVO_KEY = Column("cultivo_key", String(50), nullable=True)
     PRECINTO_SENASA = Column("precinto_senasa", String(100), nullable=True)
     OPERADOR_LOGISTICO = Column("operador_logistico", String(100), nullable=True)
     NAVIERA = Column("naviera", String(100), nullable=True)
@@ -36,5 +43,17 @@ class Posicionamiento(Base):
     ETIQUETA_CAJA = Column("etiqueta_caja", String(100), nullable=True)
     PAIS_BOOKING = Column("pais_booking", String(100), nullable=True)
     
+    # Hash del contenido sincronizado (sync delta: filas sin cambios no se reescriben)
+    HUELLA = Column("huella", String(32), nullable=True)
+
     ESTADO = Column("estado", String(20), default="PROGRAMADO")
     FECHA_CREACION = Column("fecha_creacion", DateTime(timezone=True), server_default=func.now())
+
+    def __init__(self, **kwargs):
+        if 'NAVE' in kwargs and 'NAVE_NORM' not in kwargs:
+            kwargs['NAVE_NORM'] = normalize_vessel_name(kwargs['NAVE']) or None
+        if 'ORDEN_BETA' in kwargs and 'ORDEN_NUM' not in kwargs:
+            kwargs['ORDEN_NUM'] = normalize_orden_beta(kwargs['ORDEN_BETA'])
+        if 'CULTIVO' in kwargs and 'CULTIVO_KEY' not in kwargs:
+            kwargs['CULTIVO_KEY'] = normalize_cultivo(kwargs['CULTIVO'])
+        super(Posicionamiento, self).__init__(**kwargs)
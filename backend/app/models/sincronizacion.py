@@ -0,0 +1,39 @@
+from sqlalchemy import Column, Integer, String, DateTime, JSON, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+class VersionTablaSync(Base):
+    """
+    Versión de datos de las tablas que alimenta la sincronización
+    (posicionamientos, pedidos_comerciales, reporte_embarques).
+    Sube en la misma transacción que cada escritura de /sync: es la base del
+    ETag de /sync/*/list.
+    """
+    __tablename__ = "sync_version_tabla"
+
+    tabla = Column(String(100), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class ClaveIdempotenciaSync(Base):
+    """
+    Clave de idempotencia de /sync/*/jobs y el estado del trabajo que la usó.
+    Persistida para que un reintento con la misma clave se reconozca aunque el
+    proceso se haya reiniciado o el trabajo ya no esté en la cola en memoria.
+    `proceso` identifica al proceso que lo encoló: si quedó PENDIENTE/EN_PROCESO
+    en otro proceso (reinicio), el trabajo se considera interrumpido.
+    """
+    __tablename__ = "sync_claves_idempotencia"
+
+    clave = Column(String(200), primary_key=True)
+    tipo = Column(String(50), nullable=False)
+    huella = Column(String(64), nullable=False)
+    job_id = Column(String(32), unique=True, index=True, nullable=False)
+    estado = Column(String(20), nullable=False)
+    proceso = Column(String(32), nullable=False)
+    descripcion = Column(String(200), nullable=True)
+    resultado = Column(JSON, nullable=True)
+    error = Column(Text, nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
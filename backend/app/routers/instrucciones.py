@@ -6,6 +6,7 @@ from app.models.posicionamiento import Posicionamiento
 from app.models.pedido import PedidoComercial
 from app.models.maestros import ClienteIE, MaestroFito
 from app.models.instruccion import EmisionInstruccion
+from app.services.booking_pedido import pedidos_de_booking
 from app.services.pdf_service import instruction_pdf_service
 from pydantic import BaseModel
 from sqlalchemy import func, desc, or_, literal
@@ -96,22 +97,12 @@ def lookup_booking_data(booking: str, db: Session = Depends(get_db)):
         raw_orden = pos.ORDEN_BETA or ""
         match = re.search(r'\d+', raw_orden)
         normalized_orden = match.group(0) if match else raw_orden
-        
+
         pedido = None
         pedidos = []
-        if normalized_orden and len(normalized_orden) > 1 and normalized_orden.upper() != "PENDIENTE":
-            # Búsqueda optimizada por índice (exacta o con padding de ceros)
-            query_pedidos = db.query(PedidoComercial).filter(
-                or_(
-                    PedidoComercial.orden_beta == normalized_orden,
-                    PedidoComercial.orden_beta == f"0{normalized_orden}",
-                    PedidoComercial.orden_beta == f"00{normalized_orden}"
-                )
-            )
-            
-            if pos.CULTIVO and pos.CULTIVO.strip().upper() not in ["", "PENDIENTE", "N/A", "-"]:
-                query_pedidos = query_pedidos.filter(PedidoComercial.cultivo.ilike(pos.CULTIVO))
-                
+        if pos.ORDEN_NUM and len(normalized_orden) > 1 and normalized_orden.upper() != "PENDIENTE":
+            # Pedidos del booking por el vínculo booking → pedido (orden + cultivo normalizados)
+            query_pedidos = pedidos_de_booking(db, booking)
             if pos.PLANTA_LLENADO and pos.PLANTA_LLENADO.strip().upper() not in ["", "PENDIENTE", "N/A", "-"]:
                 query_pedidos = query_pedidos.filter(PedidoComercial.planta.ilike(pos.PLANTA_LLENADO))
             
@@ -1,7 +1,7 @@
 from app.utils.formatters import clean_booking, clean_plate, clean_container, clean_dni
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from typing import Optional
 from sqlalchemy.exc import IntegrityError
 from app.database import get_db
@@ -14,6 +14,10 @@ from app.models.posicionamiento import Posicionamiento
 from app.models.maestros import Chofer, VehiculoTracto, VehiculoCarreta, Transportista
 from app.models.logicapture import LogiCaptureRegistro, LogiCaptureDetalle
 from app.models.embarque import ControlEmbarque
+from app.services.logicapture_bundle import (
+    VALORES_SIN_VALIDAR, buscar_carreta, buscar_tracto, payload_booking, payload_carreta, payload_chofer,
+    payload_tracto, resolver_captura, unicidad_codigos, validar_captura
+)
 from pydantic import BaseModel
 import os
 import logging
@@ -107,6 +111,18 @@ class LogiCaptureUpdateRequest(BaseModel):
     filtros: Optional[str] = None
     ct: Optional[str] = None
 
+class LogiCaptureUniqueBatchRequest(BaseModel):
+    booking: Optional[str] = None
+    dam: Optional[str] = None
+    contenedor: Optional[str] = None
+    tratamientoBuque: bool = False
+    precintoAduana: list[str] = []
+    precintoOperador: list[str] = []
+    precintoSenasa: list[str] = []
+    precintoLinea: list[str] = []
+    precintosBeta: list[str] = []
+    termografos: list[str] = []
+
 class Anexo1Request(BaseModel):
     peso_bruto: float
     peso_tara_contenedor: float
@@ -132,25 +148,7 @@ def lookup_booking_data(booking: str, db: Session = Depends(get_db)):
     # Buscar en Control de Embarque para obtener DAM y Contenedor
     ctrl = db.query(ControlEmbarque).filter(ControlEmbarque.booking == clean_booking_val).first()
 
-    return {
-        "booking": clean_booking_val,
-        "orden_beta": pos.ORDEN_BETA or "PENDIENTE",
-        "planta": pos.PLANTA_LLENADO,
-        "cultivo": pos.CULTIVO,
-        "dam": ctrl.dam if ctrl else None,
-        "contenedor": ctrl.contenedor if ctrl else None,
-        "status": "success",
-        # New fields for premium pre-fill
-        "naviera": pos.NAVIERA,
-        "nave": pos.NAVE,
-        "temperatura": pos.TEMPERATURA,
-        "ventilacion": pos.VENTILACION,
-        "humedad": pos.HUMEDAD,
-        "ac": pos.AC,
-        "ct": pos.CT,
-        "filtros": pos.FILTROS,
-        "tipo_tecnologia": getattr(pos, 'TIPO_TECNOLOGIA', None)
-    }
+    return payload_booking(clean_booking_val, pos, ctrl)
 
 @router.get("/driver/{dni}")
 def get_driver_data(dni: str, db: Session = Depends(get_db)):
@@ -161,71 +159,25 @@ def get_driver_data(dni: str, db: Session = Depends(get_db)):
     if not driver:
         raise HTTPException(status_code=404, detail=f"Chofer con DNI {clean_dni_val} no registrado")
         
-    hoy = date.today()
-    licencia_vencida = False
-    venc_lic_str = None
-    if driver.vencimiento_licencia:
-        licencia_vencida = driver.vencimiento_licencia < hoy
-        venc_lic_str = driver.vencimiento_licencia.isoformat()
-        
-    return {
-        "dni": driver.dni,
-        "nombres": driver.nombres,
-        "apellido_paterno": driver.apellido_paterno,
-        "apellido_materno": driver.apellido_materno,
-        "licencia": driver.licencia,
-        "nombre_operativo": driver.nombre_operativo,
-        "estado": driver.estado,
-        "vencimiento_licencia": venc_lic_str,
-        "licencia_vencida": licencia_vencida
-    }
+    return payload_chofer(driver)
 
 @router.get("/vehicle/{placa}")
 def get_vehicle_data(placa: str, db: Session = Depends(get_db)):
     """Busca vehículo y su transportista por placa."""
     clean_placa_val = clean_plate(placa)
-    all_vehicles = db.query(VehiculoTracto).all()
-    vehicle = next((v for v in all_vehicles if clean_plate(v.placa_tracto) == clean_placa_val), None)
+    vehicle = buscar_tracto(db, placa)
     
     if not vehicle:
         raise HTTPException(status_code=404, detail=f"Vehículo con Placa {clean_placa_val} no registrado")
         
-    hoy = date.today()
-    tarjeta_circulacion_vencida = False
-    venc_tarjeta_str = None
-    if vehicle.vencimiento_tarjeta_circulacion:
-        tarjeta_circulacion_vencida = vehicle.vencimiento_tarjeta_circulacion < hoy
-        venc_tarjeta_str = vehicle.vencimiento_tarjeta_circulacion.isoformat()
-        
-    soat_vencido = False
-    venc_soat_str = None
-    if vehicle.vencimiento_soat:
-        soat_vencido = vehicle.vencimiento_soat < hoy
-        venc_soat_str = vehicle.vencimiento_soat.isoformat()
-        
-    return {
-        "placa": vehicle.placa_tracto,
-        "marca": vehicle.marca,
-        "transportista": vehicle.transportista.nombre_transportista if vehicle.transportista else "S/N",
-        "ruc_transportista": vehicle.transportista.ruc if vehicle.transportista else None,
-        "codigo_sap": vehicle.transportista.codigo_sap if vehicle.transportista else None,
-        "partida_registral": vehicle.transportista.partida_registral if vehicle.transportista else None,
-        "configuracion_vehicular": vehicle.certificado_vehicular_tracto,
-        "peso_neto": vehicle.peso_neto_tracto,
-        "numero_ejes": vehicle.numero_ejes,
-        "vencimiento_tarjeta_circulacion": venc_tarjeta_str,
-        "tarjeta_circulacion_vencida": tarjeta_circulacion_vencida,
-        "vencimiento_soat": venc_soat_str,
-        "soat_vencido": soat_vencido
-    }
+    return payload_tracto(vehicle)
 
 @router.get("/check_unique")
 def check_data_unique(field: str, value: str, treatment_buque: bool = False, db: Session = Depends(get_db)):
     """Verifica si un dato ya existe en la tabla de registros operativos."""
     clean_val = clean_container(value) if "contenedor" in field else value.strip().upper()
     
-    ignore_values = ["**", "***", "****", "-", "S/P", "N/A", "PENDIENTE", ""]
-    if clean_val in ignore_values:
+    if clean_val in VALORES_SIN_VALIDAR:
         return {"field": field, "exists": False, "id": None}
 
     if field == "booking" and not treatment_buque:
@@ -244,11 +196,8 @@ def check_data_unique(field: str, value: str, treatment_buque: bool = False, db:
             LogiCaptureRegistro.status != "ANULADO"
         ).first()
     elif field in ["precinto", "termografo"]:
-        det = db.query(LogiCaptureDetalle).filter(LogiCaptureDetalle.codigo == clean_val).first()
-        if det:
-            exists = db.query(LogiCaptureRegistro).filter(LogiCaptureRegistro.id == det.registro_id).first()
-        else:
-            exists = None
+        estado, _ = unicidad_codigos(db, {field: [clean_val]})
+        return {"field": field, **estado[clean_val]}
     else:
         exists = None
 
@@ -258,39 +207,51 @@ def check_data_unique(field: str, value: str, treatment_buque: bool = False, db:
         "id": exists.id if exists else None
     }
 
+@router.post("/check_unique/batch")
+def check_data_unique_batch(req: LogiCaptureUniqueBatchRequest, db: Session = Depends(get_db)):
+    """
+    Valida de una vez booking, DAM, contenedor y todos los precintos/termógrafos
+    de una captura: una consulta por tabla. Devuelve el estado de cada dato y la
+    lista de conflictos con el ID del registro que ya lo usa.
+    """
+    codigos = req.model_dump(include={
+        "precintoAduana", "precintoOperador", "precintoSenasa", "precintoLinea", "precintosBeta", "termografos"
+    })
+    return validar_captura(
+        db, booking=req.booking, dam=req.dam, contenedor=req.contenedor,
+        tratamiento_buque=req.tratamientoBuque, codigos=codigos,
+    )
+
 @router.get("/trailer/{placa}")
 def get_trailer_data(placa: str, db: Session = Depends(get_db)):
     """Busca carreta en maestros por placa."""
     clean_placa = clean_plate(placa)
-    all_trailers = db.query(VehiculoCarreta).all()
-    trailer = next((t for t in all_trailers if clean_plate(t.placa_carreta) == clean_placa), None)
+    trailer = buscar_carreta(db, placa)
     
     if not trailer:
         raise HTTPException(status_code=404, detail=f"Carreta con Placa {clean_placa} no registrada")
         
-    hoy = date.today()
-    tarjeta_circulacion_vencida = False
-    venc_tarjeta_str = None
-    if trailer.vencimiento_tarjeta_circulacion:
-        tarjeta_circulacion_vencida = trailer.vencimiento_tarjeta_circulacion < hoy
-        venc_tarjeta_str = trailer.vencimiento_tarjeta_circulacion.isoformat()
-        
-    soat_vencido = False
-    venc_soat_str = None
-    if trailer.vencimiento_soat:
-        soat_vencido = trailer.vencimiento_soat < hoy
-        venc_soat_str = trailer.vencimiento_soat.isoformat()
-        
-    return {
-        "placa": trailer.placa_carreta,
-        "configuracion_vehicular": trailer.certificado_vehicular_carreta,
-        "peso_neto": trailer.peso_neto_carreta,
-        "numero_ejes": trailer.numero_ejes,
-        "vencimiento_tarjeta_circulacion": venc_tarjeta_str,
-        "tarjeta_circulacion_vencida": tarjeta_circulacion_vencida,
-        "vencimiento_soat": venc_soat_str,
-        "soat_vencido": soat_vencido
-    }
+    return payload_carreta(trailer)
+
+@router.get("/bundle")
+async def get_capture_bundle(
+    booking: Optional[str] = None,
+    dni: Optional[str] = None,
+    placa_tracto: Optional[str] = None,
+    placa_carreta: Optional[str] = None,
+    treatment_buque: bool = False,
+    dam: Optional[str] = None,
+    contenedor: Optional[str] = None,
+):
+    """
+    Booking, chofer, tracto, carreta y unicidad (booking/DAM/contenedor) en un
+    solo request, con las búsquedas independientes en paralelo. Lo no encontrado
+    se informa en `errores` en lugar de un 404.
+    """
+    return await resolver_captura(
+        booking=booking, dni=dni, placa_tracto=placa_tracto, placa_carreta=placa_carreta,
+        tratamiento_buque=treatment_buque, dam=dam, contenedor=contenedor,
+    )
 
 @router.get("/drivers/search")
 def search_drivers(q: str, db: Session = Depends(get_db)):
@@ -313,7 +274,7 @@ def search_drivers(q: str, db: Session = Depends(get_db)):
 @router.get("/vehicles/tracto/search")
 def search_tractos(q: str, db: Session = Depends(get_db)):
     """Busca tractos por placa."""
-    results = db.query(VehiculoTracto).filter(
+    results = db.query(VehiculoTracto).options(joinedload(VehiculoTracto.transportista)).filter(
         VehiculoTracto.placa_tracto.ilike(f"%{q}%")
     ).limit(10).all()
     
@@ -30,8 +30,9 @@ class PaginatedPlantaResponse(BaseModel):
     total: int
 from app.models.embarque import ControlEmbarque, clean_container_code
 from app.utils.logging import logger
-from app.utils.formatters import clean_booking
+from app.utils.formatters import clean_booking, normalize_plate
 from app.services.ocr import ocr_service
+from app.services import pl_cache
 
 class TransportistaCreate(BaseModel):
     ruc: str
@@ -100,9 +101,8 @@ router = APIRouter(
 )
 
 def clean_plate(plate: str) -> str:
-    """Elimina guiones y espacios de una placa, convirtiéndola a mayúsculas."""
-    if not plate: return ""
-    return re.sub(r'[^A-Z0-9]', '', str(plate).upper())
+    """Elimina guiones y espacios de una placa, convirtiéndola a mayúsculas (ver normalize_plate)."""
+    return normalize_plate(plate)
 
 @router.post("/bulk-upload")
 async def bulk_upload_transportistas(
@@ -261,7 +261,7 @@ async def bulk_upload_transportistas(
 
                 # Registrar Tracto
                 if placa_t:
-                    tracto = db.query(VehiculoTracto).filter(VehiculoTracto.placa_tracto == placa_t).first()
+                    tracto = db.query(VehiculoTracto).filter(VehiculoTracto.placa_norm == placa_t).first()
                     if not tracto:
                         tracto = VehiculoTracto(
                             transportista_id=transportista.id,
@@ -274,7 +274,7 @@ async def bulk_upload_transportistas(
 
                 # Registrar Carreta
                 if placa_c:
-                    carreta = db.query(VehiculoCarreta).filter(VehiculoCarreta.placa_carreta == placa_c).first()
+                    carreta = db.query(VehiculoCarreta).filter(VehiculoCarreta.placa_norm == placa_c).first()
                     if not carreta:
                         carreta = VehiculoCarreta(
                             transportista_id=transportista.id,
@@ -291,6 +291,7 @@ async def bulk_upload_transportistas(
                 errors.append(f"Error en fila {index + 5}: {str(e)}")
 
         db.commit()
+        pl_cache.invalidar("carga masiva de transportistas / control de embarque")
         return {
             "status": "success",
             "mensaje": f"Se procesaron {processed_count} filas exitosamente.",
@@ -593,6 +594,7 @@ def create_embarque(data: EmbarqueCreate, db: Session = Depends(get_db)):
         new_e = ControlEmbarque(**new_data)
         db.add(new_e)
         db.commit()
+        pl_cache.invalidar("control de embarque creado")
         db.refresh(new_e)
         return new_e
     except Exception as e:
@@ -615,6 +617,7 @@ def update_embarque(id: int, data: EmbarqueCreate, db: Session = Depends(get_db)
         setattr(e, key, value)
     
     db.commit()
+    pl_cache.invalidar("control de embarque actualizado")
     return e
 
 @router.delete("/embarques/{id}")
@@ -625,6 +628,7 @@ def delete_embarque(id: int, db: Session = Depends(get_db)):
     
     db.delete(e)
     db.commit()
+    pl_cache.invalidar("control de embarque eliminado")
     return {"status": "success"}
 
 # --- ENDPOINTS PLANTAS ---
@@ -6,26 +6,29 @@ Autor: AgroFlow Dev Team
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Request, Response
 from fastapi.responses import StreamingResponse, FileResponse
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, selectinload
 from sqlalchemy import or_, func
-from typing import Optional, List, Dict, Any
-from app.database import get_db
+from typing import Optional, List, Dict, Any, Callable, Iterable, Tuple
+from app.database import SessionLocal, get_db
 from app.utils.logging import logger
-from app.models.pedido import PedidoComercial
 from app.models.posicionamiento import Posicionamiento
 from app.models.embarque import ControlEmbarque, ReporteEmbarques
 from app.models.packing_list import EmisionPackingList, DetalleEmisionPackingList
-from app.utils.formatters import get_peru_time
+from app.utils.formatters import get_peru_time, normalize_orden_beta, normalize_vessel_name, strip_orden_beta
 from app.dependencies.auth import OptionalUser, CurrentUser
+from app.services.booking_context import BookingContext
+from app.services.booking_pedido import pedidos_por_booking
+from app.services.pl_correlativo import consultar_pl_id, devolver_pl_id, liberar_pl_id, reservar_pl_id_confirmado
+from app.services.naves_service import ClusterNaves, SIN_NAVE, bookings_en_nave
+from app.services.packing_list_writer import TEMPLATE_PATH, PackingListWriter, VistaPreviaPL, fila_pallet_ogl
+from app.services import pl_cache, pl_jobs, termografos_parser
+from app.services.confirmacion_parser import ConfirmacionOGL, parse_confirmacion, texto_celda, format_date_ogl
 from pydantic import BaseModel
-import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, Alignment
-from copy import copy
+import hashlib
 import io
 import os
 import re
-import difflib
+import zipfile
 from datetime import datetime
 
 # Directorio de almacenamiento (Asegurando ruta absoluta en el workspace actual)
@@ -66,52 +69,6 @@ RECIPIENTS_DATA = {
 # ---------------------------------------------------------------------------
 OGL_KEYWORD = "OGL"
 
-# ---------------------------------------------------------------------------
-# Helper: normalizar ORDEN_BETA para el JOIN con pedidos_comerciales
-# ---------------------------------------------------------------------------
-def strip_orden_beta(orden_beta: Optional[str]) -> Optional[str]:
-    """Extrae la orden numérica pero evadiendo cruces con clientes que usan otros prefijos (ej. PE004)."""
-    if not orden_beta:
-        return None
-    
-    val_upper = orden_beta.strip().upper()
-    
-    # Si tiene letras, nos aseguramos de que sea solo BG, CO, BP, BAM, BU o BAA (prefijos de Beta)
-    has_letters = any(c.isalpha() for c in val_upper)
-    if has_letters:
-        allowed_prefixes = ["BG", "CO", "BP", "BAM", "BU", "BAA"]
-        if not any(prefix in val_upper for prefix in allowed_prefixes):
-            # Si tiene letras y no es de Beta, devolvemos el valor original crudo.
-            return val_upper
-            
-    # Si es puramente numérico o tiene prefijos autorizados, le quitamos las letras
-    numeric = re.sub(r'[^0-9]', '', val_upper)
-    return numeric if numeric else None
-
-TEMPLATE_PATH = os.path.join(
-    os.path.dirname(__file__),  # app/routers/
-    "..", "..",                  # backend/
-    "assets", "templates",
-    "FORMATO PL - OGL.xlsx"
-)
-
-# ---------------------------------------------------------------------------
-# Helper: Detectar si dos nombres de nave son la misma (Smart Match)
-# ---------------------------------------------------------------------------
-def is_same_ship(name1: str, name2: str, threshold: float = 0.95) -> bool:
-    if not name1 or not name2: return False
-    if name1 == "SIN NAVE" or name2 == "SIN NAVE": return False
-    
-    n1 = re.sub(r'[^A-Z0-9]', '', name1.upper())
-    n2 = re.sub(r'[^A-Z0-9]', '', name2.upper())
-    
-    # 1. Identidad exacta normalizada
-    if n1 == n2: return True
-    
-    # 2. Similitud difusa con umbral alto para no confundir voyages diferentes
-    # (ej. NX616A vs NX612R son la misma nave pero viajes distintos → NO es lo mismo)
-    return difflib.SequenceMatcher(None, n1, n2).ratio() >= threshold
-
 # ---------------------------------------------------------------------------
 # Schemas de respuesta
 # ---------------------------------------------------------------------------
@@ -128,8 +85,11 @@ class NaveInfo(BaseModel):
 def listar_naves_ogl(db: Session = Depends(get_db)):
     """
     Retorna naves únicas basándose en la unión de ReporteEmbarques y Posicionamiento.
-    Optimizado para evitar el problema N+1 mediante JOINs estratégicos.
+    La lista se cachea por versión de datos (ver services/pl_cache.py).
     """
+    return pl_cache.obtener("naves", None, lambda: _calcular_naves(db))
+
+def _calcular_naves(db: Session) -> List[NaveInfo]:
     # Subquery para identificar bookings ya bloqueados por un PL activo
     blocked_sq = db.query(DetalleEmisionPackingList.booking).join(
         EmisionPackingList, DetalleEmisionPackingList.emision_id == EmisionPackingList.id
@@ -141,45 +101,25 @@ def listar_naves_ogl(db: Session = Depends(get_db)):
     # Traer todos los posicionamientos que tienen booking
     posicionamientos = db.query(Posicionamiento).filter(
         Posicionamiento.BOOKING != None,
-        ~Posicionamiento.BOOKING.in_(blocked_sq)
+        ~Posicionamiento.BOOKING.in_(blocked_sq.select())
     ).all()
 
-    pedidos_ogl = db.query(PedidoComercial).filter(
-        PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%")
-    ).all()
-    
-    # Mapa clave compuesta: (num_stripped, cultivo) para evitar colisión BG017 vs BP017
-    pedidos_map = {}
-    for p in pedidos_ogl:
-        ord_num = strip_orden_beta(p.orden_beta)
-        if ord_num:
-            cultivo_key = (p.cultivo or "").strip().upper()
-            pedidos_map[(ord_num, cultivo_key)] = p
-            # También guardamos solo el num como fallback
-            if ord_num not in pedidos_map:
-                pedidos_map[ord_num] = p
+    # Pedido OGL de cada booking por el vínculo booking → pedido (orden + cultivo
+    # normalizados: evita la colisión BG017 vs BP017 sin normalizar en Python)
+    pedidos_ogl = pedidos_por_booking(db, cliente_keyword=OGL_KEYWORD)
 
     # Traer todos los reportes para la nave final
     reportes = db.query(ReporteEmbarques.booking, ReporteEmbarques.nave_arribo).all()
     reporte_naves = {r.booking: r.nave_arribo for r in reportes if r.booking}
 
+    # Smart Match: cada nombre se resuelve a su ID canónico (alias persistidos + bloqueo).
+    # Solo lectura: los alias nuevos los persiste la sincronización (registrar_naves).
+    cluster = ClusterNaves.desde_bd(db)
     nave_stats = {}
 
     for pos in posicionamientos:
         b = pos.BOOKING
-        if not pos.ORDEN_BETA: continue
-        
-        ord_num = strip_orden_beta(pos.ORDEN_BETA)
-        if not ord_num: continue
-        
-        cultivo_pos = (pos.CULTIVO or "").strip().upper()
-        # Si el posicionamiento tiene cultivo, exigimos match exacto (num+cultivo)
-        # para evitar que bookings de otros clientes con el mismo num se cuenten como OGL
-        if cultivo_pos:
-            pedido_ogl = pedidos_map.get((ord_num, cultivo_pos))
-        else:
-            # Sin cultivo en posicionamiento: fallback al primer OGL con ese num
-            pedido_ogl = pedidos_map.get(ord_num)
+        pedido_ogl = pedidos_ogl.get(b)
         if not pedido_ogl: continue
         
         # Determinar Nave Final (Reporte > Posicionamiento)
@@ -187,33 +127,27 @@ def listar_naves_ogl(db: Session = Depends(get_db)):
         if not nave_final and pos.NAVE:
             nave_final = pos.NAVE.strip().upper()
             
-        nave_final = nave_final if nave_final else "SIN NAVE"
-        
-        # Smart Match
-        target_nave = nave_final
-        if nave_final != "SIN NAVE":
-            for existing_nave in nave_stats.keys():
-                if existing_nave != "SIN NAVE" and is_same_ship(nave_final, existing_nave):
-                    target_nave = existing_nave
-                    break
+        nave_id, nave_nombre = cluster.resolver(nave_final) if nave_final else (SIN_NAVE, SIN_NAVE)
         
-        if target_nave not in nave_stats:
-            nave_stats[target_nave] = {"bookings": [], "cultivos": set()}
+        stats = nave_stats.get(nave_id)
+        if stats is None:
+            stats = nave_stats[nave_id] = {"nave": nave_nombre, "bookings": [], "vistos": set(), "cultivos": set()}
         
-        if b not in nave_stats[target_nave]["bookings"]:
-            nave_stats[target_nave]["bookings"].append(b)
+        if b not in stats["vistos"]:
+            stats["vistos"].add(b)
+            stats["bookings"].append(b)
             # Determinar Cultivo
             c_final = pos.CULTIVO.strip().upper() if pos.CULTIVO else None
             if not c_final and pedido_ogl.cultivo:
                 c_final = pedido_ogl.cultivo.strip().upper()
             if c_final:
-                nave_stats[target_nave]["cultivos"].add(c_final)
+                stats["cultivos"].add(c_final)
 
     result = []
-    for nave_name, stats in sorted(nave_stats.items()):
+    for stats in sorted(nave_stats.values(), key=lambda s: s["nave"]):
         if stats["bookings"]:
             result.append(NaveInfo(
-                nave=nave_name,
+                nave=stats["nave"],
                 fuente="consolidada",
                 bookings=stats["bookings"],
                 cultivos=sorted(list(stats["cultivos"]))
@@ -224,58 +158,27 @@ def listar_naves_ogl(db: Session = Depends(get_db)):
 def listar_bookings_ogl(nave: str, db: Session = Depends(get_db)):
     """
     Lista todos los bookings cuya nave ACTUAL es la solicitada.
-    Optimizado para evitar el problema N+1.
+    Cacheado por nave y versión de datos (ver services/pl_cache.py).
     """
-    nave_upper = nave.strip().upper()
-    # Normalizar variantes con slash: "ALBEMARLE ISLAND / SR26015" == "ALBEMARLE ISLAND SR26015"
-    nave_normalized = nave_upper.replace(" / ", " ").replace("/", " ")
-    
+    return pl_cache.obtener("bookings", normalize_vessel_name(nave), lambda: _calcular_bookings(db, nave))
+
+@router.get("/cache/stats")
+def estadisticas_cache_pl():
+    """Versión de datos y contadores hit/miss de la caché de /naves y /bookings (y de termógrafos)."""
+    return {**pl_cache.estadisticas(), "termografos": termografos_parser.estadisticas()}
+
+def _calcular_bookings(db: Session, nave: str) -> List[Dict[str, Any]]:
     # Subquery de bloqueos
     blocked_sq = db.query(DetalleEmisionPackingList.booking).join(
         EmisionPackingList, DetalleEmisionPackingList.emision_id == EmisionPackingList.id
     ).filter(EmisionPackingList.estado == "ACTIVO").subquery()
 
-    # 1. Bookings confirmados en esta nave por el reporte (con y sin slash)
-    bk_reporte = {r.booking for r in db.query(ReporteEmbarques.booking).filter(
-        or_(
-            func.upper(func.trim(ReporteEmbarques.nave_arribo)) == nave_upper,
-            func.upper(func.replace(func.replace(func.trim(ReporteEmbarques.nave_arribo), " / ", " "), "/", " ")) == nave_normalized
-        )
-    ).all() if r.booking}
-
-    # 2. Bookings que dicen estar aquí en posicionamiento (con y sin slash)
-    bk_pos_data = db.query(Posicionamiento).filter(
-        or_(
-            func.upper(func.trim(Posicionamiento.NAVE)) == nave_upper,
-            func.upper(func.replace(func.replace(func.trim(Posicionamiento.NAVE), " / ", " "), "/", " ")) == nave_normalized
-        )
-    ).all()
-    bk_pos = {p.BOOKING for p in bk_pos_data if p.BOOKING}
-
-    # 3. Fusión
-    bookings_actuales = set(bk_reporte)
-    for b in bk_pos:
-        if b in bookings_actuales: continue
-        movido = db.query(ReporteEmbarques).filter(
-            ReporteEmbarques.booking == b,
-            ReporteEmbarques.nave_arribo != None,
-            func.upper(func.replace(func.replace(func.trim(ReporteEmbarques.nave_arribo), " / ", " "), "/", " ")) != nave_normalized
-        ).first()
-        if not movido:
-            bookings_actuales.add(b)
+    # 1-3. Bookings en la nave (Reporte > Posicionamiento no movido), una sola consulta indexada
+    bookings_actuales = bookings_en_nave(db, nave)
 
     # 4. Enriquecimiento Optimizado
-    pedidos_ogl = db.query(PedidoComercial).filter(PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%")).all()
-    # Mapa clave compuesta: (num_stripped, cultivo) para evitar colisión BG vs BP
-    pedidos_map = {}
-    for p in pedidos_ogl:
-        k = strip_orden_beta(p.orden_beta)
-        if k:
-            cultivo_key = (p.cultivo or "").strip().upper()
-            pedidos_map[(k, cultivo_key)] = p
-            if k not in pedidos_map:
-                pedidos_map[k] = p
-    
+    pedidos_ogl = pedidos_por_booking(db, bookings_actuales, OGL_KEYWORD)
+
     pos_details = db.query(Posicionamiento).filter(
         Posicionamiento.BOOKING.in_(bookings_actuales),
         ~Posicionamiento.BOOKING.in_(blocked_sq.select())
@@ -289,16 +192,7 @@ def listar_bookings_ogl(nave: str, db: Session = Depends(get_db)):
 
     resultado = []
     for pos in pos_details:
-        ord_num = strip_orden_beta(pos.ORDEN_BETA)
-        if not ord_num: continue
-        
-        cultivo_pos = (pos.CULTIVO or "").strip().upper()
-        # Si el posicionamiento tiene cultivo, exigimos match exacto (num+cultivo)
-        # para no mezclar bookings de otros clientes que coincidan en número
-        if cultivo_pos:
-            pedido = pedidos_map.get((ord_num, cultivo_pos))
-        else:
-            pedido = pedidos_map.get(ord_num)
+        pedido = pedidos_ogl.get(pos.BOOKING)
         if not pedido: continue
         cont, dam = cont_map.get(pos.BOOKING, (None, None))
 
@@ -324,594 +218,618 @@ def listar_bookings_ogl(nave: str, db: Session = Depends(get_db)):
 
 # ---------------------------------------------------------------------------
 # POST /generate/ogl  ─  Genera el Packing List CONSOLIDADO por NAVE
+# (también disponible como trabajo en cola: POST /jobs/ogl)
 # ---------------------------------------------------------------------------
-@router.post("/generate/ogl")
-async def generate_packing_list_ogl(
-    current_user: OptionalUser,
-    nave: str = Form(...),
-    confirmaciones: List[UploadFile] = File(...),
-    termografos: Optional[UploadFile] = File(None),
-    recibidor: Optional[str] = Form(None),
-    semana_eta: Optional[int] = Form(None),
-    db: Session = Depends(get_db)
-):
-    try:
-        nave_clean = nave.strip().upper()
-        # Normalizar variantes con slash: "ALBEMARLE ISLAND / SR26015" == "ALBEMARLE ISLAND SR26015"
-        nave_normalized = nave_clean.replace(" / ", " ").replace("/", " ")
-        
-        # 1. Obtener bookings (Reporte > Posicionamiento)
-        # Buscar coincidencia exacta Y la variante con/sin slash
-        bookings_reporte = db.query(ReporteEmbarques.booking).filter(
-            or_(
-                func.upper(func.trim(ReporteEmbarques.nave_arribo)) == nave_clean,
-                func.upper(func.replace(func.replace(func.trim(ReporteEmbarques.nave_arribo), " / ", " "), "/", " ")) == nave_normalized
-            )
-        ).all()
-        bookings_reporte_set = {r.booking for r in bookings_reporte if r.booking}
+async def _leer_archivos(
+    confirmaciones: List[UploadFile], termografos: Optional[UploadFile]
+) -> Tuple[List[Tuple[Optional[str], bytes]], Optional[bytes]]:
+    """Lee los archivos subidos en el event loop; el armado del PL trabaja solo con bytes."""
+    archivos = [(conf_file.filename, await conf_file.read()) for conf_file in confirmaciones]
+    t_content = await termografos.read() if termografos else None
+    return archivos, t_content
+
+
+def _parsear_confirmaciones(
+    confirmaciones: List[Tuple[Optional[str], bytes]], avisar: Callable[[int, str], None]
+) -> List[ConfirmacionOGL]:
+    """
+    Lectura ÚNICA de cada confirmación (streaming). El resultado columnar
+    sirve tanto para el pre-scan como para la carga de pallets.
+    """
+    confirmaciones_parseadas: List[ConfirmacionOGL] = []
+    for i, (conf_nombre, content) in enumerate(confirmaciones):
+        avisar(10 + 30 * i // max(1, len(confirmaciones)), f"Leyendo confirmación {conf_nombre or i + 1}")
+        try:
+            confirmaciones_parseadas.append(parse_confirmacion(content, conf_nombre))
+        except Exception as e:
+            logger.error(f"Error al procesar archivo {conf_nombre}: {e}")
+    return confirmaciones_parseadas
 
-        bookings_pos = db.query(Posicionamiento.BOOKING).filter(
-            or_(
-                func.upper(func.trim(Posicionamiento.NAVE)) == nave_clean,
-                func.upper(func.replace(func.replace(func.trim(Posicionamiento.NAVE), " / ", " "), "/", " ")) == nave_normalized
-            )
-        ).all()
-        bookings_pos_set = {r.BOOKING for r in bookings_pos if r.BOOKING}
-
-        bookings_set = set(bookings_reporte_set)
-        for b in bookings_pos_set:
-            if b in bookings_set: continue
-            otra_nave = db.query(ReporteEmbarques).filter(
-                ReporteEmbarques.booking == b,
-                ReporteEmbarques.nave_arribo != None,
-                func.upper(func.replace(func.replace(func.trim(ReporteEmbarques.nave_arribo), " / ", " "), "/", " ")) != nave_normalized
-            ).first()
-            if not otra_nave:
-                bookings_set.add(b)
 
-        if not bookings_set:
-            raise HTTPException(status_code=404, detail=f"No se encontraron bookings para la nave '{nave}'")
+def _restringir_a_archivos(
+    bookings_set: set, ctx: BookingContext, confirmaciones_parseadas: List[ConfirmacionOGL], estricto: bool = False
+) -> set:
+    """
+    PRE-SCAN de confirmaciones para saber qué bookings/órdenes están en los archivos.
+    Esto evita que bookings viejos (de PLs anulados) se cuelen cuando el usuario solo sube 4 archivos.
+    Sin coincidencias se conservan todos los bookings, salvo `estricto` (lote).
+    """
+    bookings_en_archivos: set = set()
+    ordenes_en_archivos: set = set()
+    for conf in confirmaciones_parseadas:
+        bookings_en_archivos |= conf.bookings()
+        for v in conf.valores_por_keyword(["ORDEN"]):
+            n = normalize_orden_beta(texto_celda(v))
+            if n:
+                ordenes_en_archivos.add(n)
+
+    # Si encontramos bookings en los archivos, restringimos bookings_set a esos
+    if bookings_en_archivos:
+        return bookings_set.intersection(bookings_en_archivos)
+    if ordenes_en_archivos:
+        # Fallback: filtrar por número de orden
+        bk_filtrados = set()
+        for bk in bookings_set:
+            pos_chk = ctx.pos(bk)
+            if pos_chk and pos_chk.ORDEN_NUM in ordenes_en_archivos:
+                bk_filtrados.add(bk)
+        if bk_filtrados or estricto:
+            return bk_filtrados
+    return set() if estricto else bookings_set
+
+
+def _leer_termografos(content: Optional[bytes]) -> Dict[str, str]:
+    """{ID pallet: código de termógrafo} del archivo de termógrafos (cacheado por contenido)."""
+    return termografos_parser.leer_termografos(content) if content else {}
+
+
+def _orden_a_booking(bookings: Iterable[str], ctx: BookingContext) -> Dict[str, str]:
+    """{número de orden sin prefijo ni ceros: booking} para rutear filas sin booking."""
+    orden_to_bk = {}
+    for bk in bookings:
+        pos = ctx.pos(bk)
+        num_obj = pos.ORDEN_NUM if pos else None  # ya normalizada (sin prefijo ni ceros)
+        if num_obj and num_obj.isdigit():
+            orden_to_bk[num_obj] = bk
+    return orden_to_bk
+
+
+def _agrupar_pallets(
+    confirmaciones_parseadas: List[ConfirmacionOGL],
+    bookings: Iterable[str],
+    orden_to_bk: Dict[str, str],
+    por_defecto: str,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Pallets de las confirmaciones agrupados por booking, en el orden de los archivos.
+    Cada fila se asigna por su booking, si no por su orden, si no por la última fila
+    válida anterior; las que no se resuelven van a `por_defecto`.
+    """
+    bookings = set(bookings)
+    agrupado: Dict[str, List[Dict[str, Any]]] = {}
+    for conf in confirmaciones_parseadas:
+        if not conf.campos.get("pallet"):
+            raise Exception(f"El archivo {conf.archivo} no tiene columna de Pallets.")
+
+        col_pallet       = conf.columna("pallet")
+        col_booking      = conf.columna("booking")
+        col_orden_beta   = conf.columna("orden_beta")
+        col_calibre      = conf.columna("calibre")
+        col_kilos        = conf.columna("kilos")
+        col_cosecha      = conf.columna("cosecha")
+        col_proceso      = conf.columna("proceso")
+        col_lote_ogl     = conf.columna("lote_ogl")
+        col_cajas        = conf.columna("cajas")
+        col_total_kilos  = conf.columna("total_kilos")
+        col_trazabilidad = conf.columna("trazabilidad")
+
+        last_valid_bk = None
+        for i in range(conf.total_filas):
+            current_bk = ""
+            c_val = texto_celda(col_booking[i]).upper()
+            if c_val in bookings: current_bk = c_val
+            if not current_bk:
+                o_val = strip_orden_beta(texto_celda(col_orden_beta[i]))
+                if o_val:
+                    try:
+                        n_val = str(int(o_val))
+                        if n_val in orden_to_bk: current_bk = orden_to_bk[n_val]
+                    except: pass
+            if current_bk: last_valid_bk = current_bk
+            elif not current_bk and last_valid_bk: current_bk = last_valid_bk
 
-        # PRE-SCAN de confirmaciones para saber qué bookings/órdenes están en los archivos
-        # Esto evita que bookings viejos (de PLs anulados) se cuelen cuando el usuario solo sube 4 archivos
-        bookings_en_archivos: set = set()
-        ordenes_en_archivos: set = set()
-        for conf_file in confirmaciones:
-            try:
-                content_scan = await conf_file.read()
-                await conf_file.seek(0)  # reset para que se pueda leer de nuevo
-                df_scan_raw = pd.read_excel(io.BytesIO(content_scan), engine="openpyxl", header=None)
-                header_index_scan = 0
-                for i in range(min(20, len(df_scan_raw))):
-                    row_values = [str(x).upper() for x in df_scan_raw.iloc[i].values]
-                    if any("PALLET" in val or "HU" in val for val in row_values):
-                        header_index_scan = i
-                        break
-                df_scan = pd.read_excel(io.BytesIO(content_scan), engine="openpyxl", header=header_index_scan)
-                df_scan.columns = df_scan.columns.str.strip().str.upper()
-                # Buscar columna BOOKING
-                for col in df_scan.columns:
-                    if "BOOKING" in col or "DESPACHO" in col:
-                        for v in df_scan[col].dropna():
-                            val = str(v).strip().upper()
-                            if val and val != "NAN":
-                                bookings_en_archivos.add(val)
-                # Buscar columna ORDEN BETA
-                for col in df_scan.columns:
-                    if "ORDEN" in col:
-                        for v in df_scan[col].dropna():
-                            n = strip_orden_beta(str(v))
-                            if n:
-                                ordenes_en_archivos.add(n)
-            except Exception as e:
-                logger.warning(f"Pre-scan fallo para {conf_file.filename}: {e}")
-
-        # Si encontramos bookings en los archivos, restringimos bookings_set a esos
-        if bookings_en_archivos:
-            bookings_set = bookings_set.intersection(bookings_en_archivos)
-        elif ordenes_en_archivos:
-            # Fallback: filtrar por número de orden
-            bk_filtrados = set()
-            for bk in bookings_set:
-                pos_chk = db.query(Posicionamiento).filter(Posicionamiento.BOOKING == bk).first()
-                if pos_chk and strip_orden_beta(pos_chk.ORDEN_BETA) in ordenes_en_archivos:
-                    bk_filtrados.add(bk)
-            if bk_filtrados:
-                bookings_set = bk_filtrados
+            bk_f = current_bk if current_bk in bookings else por_defecto
 
-        if not bookings_set:
-            raise HTTPException(status_code=404, detail="No se encontraron bookings OGL para consolidar con los archivos subidos")
-
-        booking_data_map: Dict[str, Dict] = {}
-        primer_pedido = None
-        primer_pos = None
-
-        for booking in sorted(bookings_set):
-            pos = db.query(Posicionamiento).filter(Posicionamiento.BOOKING == booking).first()
-            if not pos: continue
-
-            pedido = None
-            if pos.ORDEN_BETA:
-                orden_numeric = strip_orden_beta(pos.ORDEN_BETA)
-                if orden_numeric:
-                    # Usamos ilike para manejar variantes: "BG001", "001", "CO001", etc.
-                    query_pedido = db.query(PedidoComercial).filter(
-                        or_(
-                            PedidoComercial.orden_beta == orden_numeric,
-                            PedidoComercial.orden_beta.ilike(f"%{orden_numeric}")
-                        ),
-                        PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%")
-                    )
-                    if pos.CULTIVO:
-                        query_pedido = query_pedido.filter(PedidoComercial.cultivo.ilike(f"%{pos.CULTIVO.strip()}%"))
-                    pedido = query_pedido.first()
-            
-            if not pedido: continue
+            p_id = texto_celda(col_pallet[i])
+            if not p_id or p_id.lower() == "nan": continue
 
-            if recibidor and recibidor.strip():
-                ped_recibidor = str(getattr(pedido, "recibidor", "") or "").strip().upper()
-                if ped_recibidor != recibidor.strip().upper():
-                    continue
+            agrupado.setdefault(bk_f, []).append({
+                "pallet": p_id,
+                "calibre": texto_celda(col_calibre[i]),
+                "kilos": col_kilos[i] if conf.campos.get("kilos") else 0,
+                "total_kilos": col_total_kilos[i] if conf.campos.get("total_kilos") else 0,
+                "cajas": col_cajas[i] if conf.campos.get("cajas") else 0,
+                "cosecha": format_date_ogl(col_cosecha[i]),
+                "proceso": format_date_ogl(col_proceso[i]),
+                "lote_ogl": texto_celda(col_lote_ogl[i]),
+                "trazabilidad": texto_celda(col_trazabilidad[i]),
+            })
+    return agrupado
 
-            if semana_eta is not None and getattr(pedido, "semana_eta", None) != semana_eta:
-                continue
 
-            emb = db.query(ControlEmbarque).filter(ControlEmbarque.booking == booking).first()
-            contenedor_fmt = format_container_ogl(emb.contenedor if emb else "")
-            prog_date = getattr(pos, "FECHA_PROGRAMADA", None) or getattr(pos, "ETA", None) or datetime.now().date()
-
-            booking_data_map[booking] = {
-                "contenedor": contenedor_fmt, 
-                "pedido": pedido, 
-                "pos": pos,
-                "fecha_prog": prog_date
-            }
-            if primer_pedido is None:
-                primer_pedido = pedido; primer_pos = pos
-
-        if not booking_data_map:
-            raise HTTPException(status_code=404, detail="No se encontraron bookings OGL para consolidar")
-
-        # Termógrafos
-        termografos_map = {}
-        if termografos:
-            try:
-                t_content = await termografos.read()
-                t_df = pd.read_excel(io.BytesIO(t_content), engine="openpyxl", header=None)
-                for _, t_row in t_df.iterrows():
-                    if len(t_row) >= 14:
-                        p_id_raw = str(t_row.iloc[13]).strip().upper() if pd.notna(t_row.iloc[13]) else ""
-                        t_code_raw = str(t_row.iloc[12]).strip() if pd.notna(t_row.iloc[12]) else ""
-                        if p_id_raw and t_code_raw and p_id_raw != "ID PALLET":
-                            termografos_map[p_id_raw] = t_code_raw
-            except Exception as e:
-                logger.error(f"Error procesando termógrafos: {e}")
+class LotePL:
+    """
+    Estado compartido por las naves de una generación en lote (semana ETA + cultivo):
+    contexto de bookings, termógrafos y pallets ruteados a su booking se cargan una vez.
+    """
 
-        # Cargar pallets
-        agrupado_por_booking: Dict[str, List] = {b: [] for b in booking_data_map.keys()}
-        contenedor_default = next(iter(booking_data_map.values()))["contenedor"]
+    def __init__(self, ctx: BookingContext, bookings_por_nave: Dict[str, set],
+                 pallets_por_booking: Dict[str, List[Dict[str, Any]]], termografos: Dict[str, str]):
+        self.ctx = ctx
+        self.bookings_por_nave = bookings_por_nave
+        self.pallets_por_booking = pallets_por_booking
+        self.termografos = termografos
+        # WK IDs ya confirmados por las naves del lote: (semana, cultivo, pl_id)
+        self.reservas: List[Tuple[int, str, str]] = []
 
-        for conf_file in confirmaciones:
-            content = await conf_file.read()
-            try:
-                df_raw = pd.read_excel(io.BytesIO(content), engine="openpyxl", header=None)
-                header_index = 0
-                for i in range(min(20, len(df_raw))):
-                    row_values = [str(x).upper() for x in df_raw.iloc[i].values]
-                    if any("PALLET" in val or "HU" in val for val in row_values):
-                        header_index = i
-                        break
-                df = pd.read_excel(io.BytesIO(content), engine="openpyxl", header=header_index)
-                df.columns = df.columns.str.strip().str.upper()
-            except Exception as e:
-                logger.error(f"Error al procesar archivo {conf_file.filename}: {e}")
-                continue
 
-            def find_col(df, kws):
-                for c in [str(col) for col in df.columns]:
-                    for kw in kws:
-                        if kw.upper() in c.upper(): return c
-                return None
+def _devolver_reservas(reservas: List[Tuple[int, str, str]]) -> None:
+    """Devuelve al asignador los WK IDs de emisiones que no llegaron a registrarse."""
+    for semana, cultivo, pl_id in reservas:
+        try:
+            devolver_pl_id(semana, cultivo, pl_id)
+        except Exception as e:
+            logger.error(f"No se pudo devolver el WK ID {pl_id} (semana {semana}, {cultivo or 'sin cultivo'}): {e}")
+
+
+def construir_pl_ogl(
+    db: Session,
+    usuario: str,
+    nave: str,
+    confirmaciones: List[Tuple[Optional[str], bytes]],
+    termografos: Optional[bytes] = None,
+    recibidor: Optional[str] = None,
+    semana_eta: Optional[int] = None,
+    progreso: Optional[Callable[[int, str], None]] = None,
+    lote: Optional[LotePL] = None,
+    vista_previa: bool = False,
+) -> Dict[str, Any]:
+    """
+    Arma el Packing List consolidado de la nave, lo guarda en disco y registra la emisión.
+    Es bloqueante (pandas/openpyxl/SQLAlchemy): se ejecuta en el pool de `pl_jobs`.
+    `progreso(porcentaje, etapa)` se invoca al pasar por cada etapa.
+    Con `lote` usa el estado compartido del lote y NO confirma la transacción
+    (la emisión queda en flush; confirma `construir_lote_pl_ogl`).
+    Con `vista_previa` devuelve cabecera y grilla como JSON: sin openpyxl, sin
+    archivo, sin emisión y sin reservar el WK ID (solo se consulta).
+    El WK ID se reserva en una transacción propia y corta; si el PL falla después
+    de reservarlo, se devuelve al asignador.
+    """
+    reservas = lote.reservas if lote is not None else []
+    previas = len(reservas)
+    try:
+        return _armar_pl_ogl(
+            db, usuario, nave, confirmaciones, termografos, recibidor, semana_eta, progreso, lote, vista_previa, reservas
+        )
+    except Exception:
+        _devolver_reservas(reservas[previas:])
+        del reservas[previas:]
+        raise
+
+
+def _armar_pl_ogl(
+    db: Session,
+    usuario: str,
+    nave: str,
+    confirmaciones: List[Tuple[Optional[str], bytes]],
+    termografos: Optional[bytes],
+    recibidor: Optional[str],
+    semana_eta: Optional[int],
+    progreso: Optional[Callable[[int, str], None]],
+    lote: Optional[LotePL],
+    vista_previa: bool,
+    reservas: List[Tuple[int, str, str]],
+) -> Dict[str, Any]:
+    avisar = progreso or (lambda _p, _e: None)
+    nave_clean = nave.strip().upper()
+
+    if lote is None:
+        # 1. Obtener bookings (Reporte > Posicionamiento no movido a otra nave)
+        avisar(5, "Buscando bookings de la nave")
+        bookings_set = bookings_en_nave(db, nave_clean)
 
-            col_pallet  = find_col(df, ["PALLET", "HU", "ID PALLET"])
-            col_booking = find_col(df, ["BOOKING", "DESPACHO"])
-            col_orden_beta = find_col(df, ["ORDEN BETA", "ORDEN"])
-            
-            if not col_pallet:
-                raise Exception(f"El archivo {conf_file.filename} no tiene columna de Pallets.")
-
-            col_calibre = find_col(df, ["CALIBRE", "CALIDAD"])
-            col_kilos   = find_col(df, ["KILOS", "PESO NETO", "NET"])
-            col_cosecha = find_col(df, ["COSECHA", "HARVEST", "FECHA COSECHA"])
-            col_proceso = find_col(df, ["PROCESO", "PROCESS", "FECHA PROCESO"])
-            col_lote_ogl = find_col(df, ["LOTE CLIENTE (OGL)", "LOTE OGL", "CLIENT LOT"])
-            col_cajas   = find_col(df, ["TOTAL DE CAJAS", "CAJAS", "BOXES", "QTY"])
-            col_total_kilos = find_col(df, ["TOTAL KILOS", "NET WEIGHT", "PESO NETO TOTAL"])
-            col_trazabilidad = find_col(df, ["CODIGO TRAZABILIDAD", "TRAZABILIDAD", "TRACEABILITY"])
-
-            orden_to_bk = {}
-            for bk, data in booking_data_map.items():
-                num_obj = strip_orden_beta(data["pos"].ORDEN_BETA)
-                if num_obj:
-                    try:
-                        n_str = str(int(num_obj))
-                        orden_to_bk[n_str] = bk
-                    except: pass
+        if not bookings_set:
+            raise HTTPException(status_code=404, detail=f"No se encontraron bookings para la nave '{nave}'")
 
-            last_valid_bk = None
-            for _, row in df.iterrows():
-                current_bk = ""
-                if col_booking and pd.notna(row.get(col_booking)):
-                    c_val = str(row.get(col_booking)).strip().upper()
-                    if c_val in booking_data_map: current_bk = c_val
-                if not current_bk and col_orden_beta and pd.notna(row.get(col_orden_beta)):
-                    o_val = strip_orden_beta(str(row.get(col_orden_beta)))
-                    if o_val:
-                        try:
-                            n_val = str(int(o_val))
-                            if n_val in orden_to_bk: current_bk = orden_to_bk[n_val]
-                        except: pass
-                if current_bk: last_valid_bk = current_bk
-                elif not current_bk and last_valid_bk: current_bk = last_valid_bk
-                
-                bk_f = current_bk
-                if not bk_f or bk_f not in booking_data_map:
-                    bk_f = next(iter(booking_data_map)) if len(booking_data_map) == 1 else "DESCONOCIDO"
-
-                p_id = str(row.get(col_pallet)).strip() if pd.notna(row.get(col_pallet)) else ""
-                if not p_id or p_id.lower() == "nan": continue
-
-                if bk_f not in agrupado_por_booking: agrupado_por_booking[bk_f] = []
-
-                def format_date_ogl(val):
-                    if pd.isna(val) or str(val).strip() == "": return ""
-                    try:
-                        dt = pd.to_datetime(str(val).strip())
-                        return dt.strftime("%d/%m/%Y")
-                    except:
-                        raw_str = str(val).strip()
-                        if " " in raw_str: raw_str = raw_str.split(" ")[0]
-                        if "-" in raw_str and len(raw_str.split("-")[0]) == 4:
-                            parts = raw_str.split("-")
-                            if len(parts) == 3: return f"{parts[2]}/{parts[1]}/{parts[0]}"
-                        return raw_str
-
-                agrupado_por_booking[bk_f].append({
-                    "pallet": p_id,
-                    "calibre": str(row.get(col_calibre, "")).strip() if col_calibre and pd.notna(row.get(col_calibre)) else "",
-                    "kilos": row.get(col_kilos) if col_kilos else 0,
-                    "total_kilos": row.get(col_total_kilos) if col_total_kilos else 0,
-                    "cajas": row.get(col_cajas) if col_cajas else 0,
-                    "cosecha": format_date_ogl(row.get(col_cosecha)),
-                    "proceso": format_date_ogl(row.get(col_proceso)),
-                    "lote_ogl": str(row.get(col_lote_ogl, "")).strip() if col_lote_ogl and pd.notna(row.get(col_lote_ogl)) else "",
-                    "trazabilidad": str(row.get(col_trazabilidad, "")).strip() if col_trazabilidad and pd.notna(row.get(col_trazabilidad)) else "",
-                })
-
-        # 3. Escribir Excel
-        lista_ordenada = sorted(booking_data_map.items(), key=lambda x: x[1]["fecha_prog"])
-        template_path = os.path.normpath(TEMPLATE_PATH)
-        wb = openpyxl.load_workbook(template_path, keep_vba=False)
-        ws = wb.active
-
-        def safe_write(ws, cell_ref, value):
-            try:
-                cell = ws[cell_ref]
-                if not (isinstance(cell.value, str) and cell.value.startswith("=")):
-                    cell.value = value
-            except: pass
+        confirmaciones_parseadas = _parsear_confirmaciones(confirmaciones, avisar)
+
+        # Contexto completo de los bookings de la nave en un número fijo de consultas
+        # (posicionamiento, pedido OGL, control de embarque y reporte de embarques)
+        avisar(40, "Cargando datos de los bookings")
+        ctx = BookingContext.cargar(db, bookings_set, cliente_keyword=OGL_KEYWORD)
+        bookings_set = _restringir_a_archivos(bookings_set, ctx, confirmaciones_parseadas)
+    else:
+        # Lote: archivos, contexto y ruteo de pallets ya resueltos para todas las naves
+        ctx = lote.ctx
+        bookings_set = set(lote.bookings_por_nave.get(nave_clean, ()))
 
-        ahora = get_peru_time()
+    if not bookings_set:
+        raise HTTPException(status_code=404, detail="No se encontraron bookings OGL para consolidar con los archivos subidos")
+
+    booking_data_map: Dict[str, Dict] = {}
+    primer_pedido = None
+    primer_pos = None
+
+    for booking in sorted(bookings_set):
+        pos = ctx.pos(booking)
+        if not pos: continue
+
+        # Pedido OGL resuelto por orden ("BG001", "001", "CO001", etc.) + cultivo
+        pedido = ctx.pedido(booking)
+        if not pedido: continue
+
+        if recibidor and recibidor.strip():
+            ped_recibidor = str(getattr(pedido, "recibidor", "") or "").strip().upper()
+            if ped_recibidor != recibidor.strip().upper():
+                continue
+
+        if semana_eta is not None and getattr(pedido, "semana_eta", None) != semana_eta:
+            continue
+
+        emb = ctx.embarque(booking)
+        contenedor_fmt = format_container_ogl(emb.contenedor if emb else "")
+        prog_date = getattr(pos, "FECHA_PROGRAMADA", None) or getattr(pos, "ETA", None) or datetime.now().date()
+
+        booking_data_map[booking] = {
+            "contenedor": contenedor_fmt, 
+            "pedido": pedido, 
+            "pos": pos,
+            "fecha_prog": prog_date
+        }
+        if primer_pedido is None:
+            primer_pedido = pedido; primer_pos = pos
+
+    if not booking_data_map:
+        raise HTTPException(status_code=404, detail="No se encontraron bookings OGL para consolidar")
+
+    # Termógrafos
+    if lote is None:
+        avisar(50, "Leyendo termógrafos")
+        termografos_map = _leer_termografos(termografos)
+    else:
+        termografos_map = lote.termografos
+
+    # Cargar pallets
+    avisar(55, "Cargando pallets")
+    if lote is None:
+        orden_to_bk = _orden_a_booking(booking_data_map, ctx)
+        # Filas sin booking/orden reconocible: al único booking o a DESCONOCIDO
+        por_defecto = next(iter(booking_data_map)) if len(booking_data_map) == 1 else "DESCONOCIDO"
+        pallets = _agrupar_pallets(confirmaciones_parseadas, booking_data_map, orden_to_bk, por_defecto)
+    else:
+        pallets = lote.pallets_por_booking
+    agrupado_por_booking: Dict[str, List] = {b: pallets.get(b, []) for b in booking_data_map.keys()}
+    if lote is None and pallets.get("DESCONOCIDO"):
+        agrupado_por_booking["DESCONOCIDO"] = pallets["DESCONOCIDO"]
+    contenedor_default = next(iter(booking_data_map.values()))["contenedor"]
+
+    # 3. Escribir Excel
+    avisar(65, "Escribiendo Packing List")
+    lista_ordenada = sorted(booking_data_map.items(), key=lambda x: x[1]["fecha_prog"])
+    writer = VistaPreviaPL() if vista_previa else PackingListWriter(TEMPLATE_PATH)
+
+    ahora = get_peru_time()
+    
+    # WK ID logic
+    cultivo_check = (primer_pedido.cultivo or "").strip().upper() if primer_pedido else ""
+    pl_id = f"WK{ahora.isocalendar()[1]}1"
+    semana_pl = None
+    if primer_pedido and getattr(primer_pedido, "semana_eta", None):
+        # Asignador persistido por semana+cultivo: lectura indexada + reserva atómica.
+        # La reserva se confirma aparte (el bucket no queda bloqueado durante el armado).
+        semana_pl = int(primer_pedido.semana_eta)
+        etd_defecto = primer_pos.ETD if (primer_pos and primer_pos.ETD) else ahora.date()
+        if vista_previa:
+            pl_id = consultar_pl_id(db, semana_pl, cultivo_check, nave_clean, etd_defecto)
+        else:
+            pl_id = reservar_pl_id_confirmado(semana_pl, cultivo_check, nave_clean, etd_defecto)
+            reservas.append((semana_pl, cultivo_check, pl_id))
+
+    elif primer_pos and primer_pos.ETA:
+        semana_eta = primer_pos.ETA.isocalendar()[1]
+        anio_eta = primer_pos.ETA.year
+        pos_semana = [p for p in db.query(Posicionamiento).filter(
+            func.extract('week', Posicionamiento.ETA) == semana_eta,
+            func.extract('year', Posicionamiento.ETA) == anio_eta
+        ).all() if p.NAVE and p.ETA and p.ORDEN_BETA]
         
-        # WK ID logic
-        cultivo_check = (primer_pedido.cultivo or "").strip().upper() if primer_pedido else ""
-        pl_id = f"WK{ahora.isocalendar()[1]}1"
-        if primer_pedido and getattr(primer_pedido, "semana_eta", None):
-            semana_eta = int(primer_pedido.semana_eta)
-            query_pedidos = db.query(PedidoComercial).filter(
-                PedidoComercial.semana_eta == semana_eta,
-                PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%")
-            )
-            if primer_pedido.cultivo:
-                query_pedidos = query_pedidos.filter(PedidoComercial.cultivo.ilike(f"%{primer_pedido.cultivo}%"))
-            pedidos_semana = query_pedidos.all()
-            
-            ordenes_semana = set(strip_orden_beta(p.orden_beta) for p in pedidos_semana if p.orden_beta)
-            
-            query_pos = db.query(Posicionamiento).filter(Posicionamiento.ORDEN_BETA.isnot(None))
-            if primer_pos and primer_pos.CULTIVO:
-                query_pos = query_pos.filter(Posicionamiento.CULTIVO.ilike(f"%{primer_pos.CULTIVO}%"))
-            pos_todas = query_pos.all()
-            
-            pos_semana = [p for p in pos_todas if strip_orden_beta(p.ORDEN_BETA) in ordenes_semana]
-            
-            nave_etas = {}
-            for p in pos_semana:
-                if not p.NAVE: continue
-                rep = db.query(ReporteEmbarques).filter(ReporteEmbarques.booking == p.BOOKING).first()
-                n_name_raw = (rep.nave_arribo if rep and rep.nave_arribo else p.NAVE).strip().upper()
-                # Normalizar slash para unificar "ALBEMARLE ISLAND / SR26015" con "ALBEMARLE ISLAND SR26015"
-                n_name = n_name_raw.replace(" / ", " ").replace("/", " ")
-                etd_val = p.ETD if p.ETD else p.ETA
-                if etd_val:
-                    if n_name not in nave_etas or etd_val < nave_etas[n_name]:
-                        nave_etas[n_name] = etd_val
-
-            # Normalizar nave_clean también para la comparación
-            nave_clean_norm = nave_clean.replace(" / ", " ").replace("/", " ")
-            if nave_clean_norm not in nave_etas:
-                nave_etas[nave_clean_norm] = primer_pos.ETD if (primer_pos and primer_pos.ETD) else ahora.date()
-            naves_ordenadas = sorted(nave_etas.items(), key=lambda x: (x[1], x[0]))
-            correlativo = 1
-            for i, (n_name, _) in enumerate(naves_ordenadas):
-                if n_name == nave_clean_norm:
-                    correlativo = i + 1
-                    break
-            
-            # Ajustar correlativo sumando PLs activos ya emitidos esta semana+cultivo
-            # Ejemplo: si WK222 ya fue emitido, el siguiente PL debe ser WK223
-            pl_prefix = f"WK{str(semana_eta).zfill(2)}"
-            emisiones_semana = db.query(EmisionPackingList).filter(
-                EmisionPackingList.estado == "ACTIVO",
-                EmisionPackingList.pl_id.like(f"{pl_prefix}%") if hasattr(EmisionPackingList, "pl_id") else True
-            ).all()
-            # Contar PLs activos cuyo WK ID empieza con el mismo prefijo de semana
-            ids_usados = set()
-            for em in emisiones_semana:
-                em_cultivo = getattr(em, "cultivo", None)
-                if not em_cultivo:
-                    # Backward compatibility para registros antiguos
-                    detalle = db.query(DetalleEmisionPackingList).filter(DetalleEmisionPackingList.emision_id == em.id).first()
-                    if detalle:
-                        pos_bk = db.query(Posicionamiento).filter(Posicionamiento.BOOKING == detalle.booking).first()
-                        if pos_bk and pos_bk.CULTIVO:
-                            em_cultivo = pos_bk.CULTIVO.strip().upper()
-                
-                if em_cultivo and cultivo_check and em_cultivo != cultivo_check:
-                    continue # Ignorar emisiones de otros cultivos
-                
-                em_id = getattr(em, "pl_id", None) or getattr(em, "archivo_nombre", "")
-                # Extraer el WK del nombre del archivo si no hay campo pl_id
-                import re as _re
-                m = _re.search(r'WK(\d+)', em_id or "")
-                if m:
-                    full_wk = m.group(0)  # e.g. "WK222"
-                    if full_wk.startswith(pl_prefix):
-                        ids_usados.add(full_wk)
-            # El correlativo final es el primer número libre
-            final_correlativo = correlativo
-            while f"{pl_prefix}{final_correlativo}" in ids_usados:
-                final_correlativo += 1
-            pl_id = f"WK{str(semana_eta).zfill(2)}{final_correlativo}"
-            
-        elif primer_pos and primer_pos.ETA:
-            semana_eta = primer_pos.ETA.isocalendar()[1]
-            anio_eta = primer_pos.ETA.year
-            pos_semana = db.query(Posicionamiento).filter(
-                func.extract('week', Posicionamiento.ETA) == semana_eta,
-                func.extract('year', Posicionamiento.ETA) == anio_eta
-            ).all()
-            nave_etas = {}
-            for p in pos_semana:
-                if not p.NAVE or not p.ETA or not p.ORDEN_BETA: continue
-                num_ord = strip_orden_beta(p.ORDEN_BETA)
-                if num_ord:
-                    pedido_ogl = db.query(PedidoComercial).filter(
-                        PedidoComercial.orden_beta == num_ord,
-                        PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%")
-                    ).first()
-                    if pedido_ogl:
-                        rep = db.query(ReporteEmbarques).filter(ReporteEmbarques.booking == p.BOOKING).first()
-                        n_name = (rep.nave_arribo if rep and rep.nave_arribo else p.NAVE).strip().upper()
-                        etd_val = p.ETD if p.ETD else p.ETA
-                        if n_name not in nave_etas or etd_val < nave_etas[n_name]:
-                            nave_etas[n_name] = etd_val
-            if nave_clean not in nave_etas:
-                nave_etas[nave_clean] = primer_pos.ETD if primer_pos else (ahora.date())
-            naves_ordenadas = sorted(nave_etas.items(), key=lambda x: (x[1], x[0]))
-            correlativo = 1
-            for i, (n_name, _) in enumerate(naves_ordenadas):
-                if n_name == nave_clean:
-                    correlativo = i + 1
-                    break
-            pl_id = f"WK{str(semana_eta).zfill(2)}{correlativo}"
-
-        # Cabecera
-        ws['C2'].value = "1101613"
-        ws['C2'].alignment = Alignment(horizontal='center', vertical='center')
-        safe_write(ws, "C3", "COMPLEJO AGROINDUSTRIAL BETA S.A.")
-        safe_write(ws, "C4", pl_id)
-        safe_write(ws, "C5", ahora.strftime("%d/%m/%Y"))
-        safe_write(ws, "C6", "CIF")
-        safe_write(ws, "C7", "VESSEL")
-        nave_final = primer_pos.NAVE if primer_pos else nave_clean
-        reporte_n = db.query(ReporteEmbarques).filter(ReporteEmbarques.booking == next(iter(bookings_set))).first()
-        if reporte_n and reporte_n.nave_arribo: nave_final = reporte_n.nave_arribo
-        safe_write(ws, "C8", nave_final)
-
-        if primer_pedido:
-            recibidor_raw = (primer_pedido.recibidor or "").strip().upper()
-            recipient_info = RECIPIENTS_DATA.get(recibidor_raw)
-            if not recipient_info:
-                if "VDH" in recibidor_raw: recipient_info = RECIPIENTS_DATA.get("VDH")
-                elif "ISS" in recibidor_raw: recipient_info = RECIPIENTS_DATA.get("ISS")
-            if recipient_info:
-                safe_write(ws, "C10", recipient_info["notify_id"])
-                safe_write(ws, "C11", recipient_info["full_name"])
-            else:
-                safe_write(ws, "C11", primer_pedido.recibidor or "")
-            safe_write(ws, "C12", primer_pedido.port_id_orig or "")
-            
-            # Arrival Port: usar destino_booking del posicionamiento (más actualizado que cuadro de pedidos)
-            ARRIVAL_PORT_CODES = {
-                "ROTTERDAM":      "NLRTM",
-                "LONDON":         "GBLGP",
-                "ALGECIRAS":      "ESALG",
-                "THESSALONIKI":   "GRSKG",
-                "PHILADELPHIA":   "USPHL",
-                "LOS ANGELES":    "USLAX",
-                "LOS ÁNGELES":    "USLAX",
-                "SAVANNAH":       "USSAV",
-                "NEW ORLEANS":    "USMSY",
-                "OAKLAND":        "USOAK",
-                "MIAMI":          "PortMiami",
-                "QUETZAL":        "GTPRQ",
-                "MERSIN":         "TRMER",
-                "VLISSINGEN":     "NLVLI",
-            }
-            # Prioridad: destino_booking del posicionamiento → pod del pedido
-            arrival_port_raw = ""
-            if primer_pos and primer_pos.DESTINO_BOOKING:
-                arrival_port_raw = primer_pos.DESTINO_BOOKING.strip()
-            elif primer_pedido.pod:
-                arrival_port_raw = primer_pedido.pod.strip()
-            
-            arrival_port_upper = arrival_port_raw.upper()
-            arrival_port_id = ""
-            for key, code in ARRIVAL_PORT_CODES.items():
-                if key in arrival_port_upper:
-                    arrival_port_id = code
-                    break
-            if not arrival_port_id:
-                arrival_port_id = primer_pedido.port_id_dest or ""
-            
-            safe_write(ws, "C14", arrival_port_id)
-            safe_write(ws, "C15", arrival_port_raw)
+        # Pedidos OGL (por vínculo booking → pedido) y reportes de la semana en una consulta cada uno
+        bookings_ogl = pedidos_por_booking(db, [p.BOOKING for p in pos_semana], OGL_KEYWORD)
+        reportes_semana = {}
+        for rep in db.query(ReporteEmbarques).filter(
+            ReporteEmbarques.booking.in_([p.BOOKING for p in pos_semana])
+        ).all():
+            reportes_semana[rep.booking] = rep
         
-        if primer_pos:
-            safe_write(ws, "C13", primer_pos.POL or "")
-            safe_write(ws, "C16", primer_pos.ETD.strftime("%d/%m/%Y") if primer_pos.ETD else "")
-            safe_write(ws, "C17", primer_pos.ETA.strftime("%d/%m/%Y") if primer_pos.ETA else "")
-
-        def safe_float(val):
-            try: return float(val) if pd.notna(val) else 0.0
-            except: return 0.0
-
-        GRID_START_ROW = 21
-        fila_secuencial = 1
-        therms_written = set()
-        total_cajas_acum = 0
-        total_gross_acum = 0.0
-        tipo_emision = "OTRO"
+        nave_etas = {}
+        for p in pos_semana:
+            if p.BOOKING in bookings_ogl:
+                rep = reportes_semana.get(p.BOOKING)
+                n_name = (rep.nave_arribo if rep and rep.nave_arribo else p.NAVE).strip().upper()
+                etd_val = p.ETD if p.ETD else p.ETA
+                if n_name not in nave_etas or etd_val < nave_etas[n_name]:
+                    nave_etas[n_name] = etd_val
+        if nave_clean not in nave_etas:
+            nave_etas[nave_clean] = primer_pos.ETD if primer_pos else (ahora.date())
+        naves_ordenadas = sorted(nave_etas.items(), key=lambda x: (x[1], x[0]))
+        correlativo = 1
+        for i, (n_name, _) in enumerate(naves_ordenadas):
+            if n_name == nave_clean:
+                correlativo = i + 1
+                break
+        pl_id = f"WK{str(semana_eta).zfill(2)}{correlativo}"
+
+    # Cabecera
+    writer.celda("C2", "1101613", forzar=True)
+    writer.centrar("C2")
+    writer.celda("C3", "COMPLEJO AGROINDUSTRIAL BETA S.A.")
+    writer.celda("C4", pl_id)
+    writer.celda("C5", ahora.strftime("%d/%m/%Y"))
+    writer.celda("C6", "CIF")
+    writer.celda("C7", "VESSEL")
+    nave_final = primer_pos.NAVE if primer_pos else nave_clean
+    nave_arribo_n = ctx.nave_arribo(next(iter(bookings_set)))
+    if nave_arribo_n: nave_final = nave_arribo_n
+    writer.celda("C8", nave_final)
+
+    if primer_pedido:
+        recibidor_raw = (primer_pedido.recibidor or "").strip().upper()
+        recipient_info = RECIPIENTS_DATA.get(recibidor_raw)
+        if not recipient_info:
+            if "VDH" in recibidor_raw: recipient_info = RECIPIENTS_DATA.get("VDH")
+            elif "ISS" in recibidor_raw: recipient_info = RECIPIENTS_DATA.get("ISS")
+        if recipient_info:
+            writer.celda("C10", recipient_info["notify_id"])
+            writer.celda("C11", recipient_info["full_name"])
+        else:
+            writer.celda("C11", primer_pedido.recibidor or "")
+        writer.celda("C12", primer_pedido.port_id_orig or "")
         
-        for bk_id, _ in lista_ordenada:
-            pedido = booking_data_map[bk_id]["pedido"]
-            pos_bk = db.query(Posicionamiento).filter(Posicionamiento.BOOKING == bk_id).first()
-            planta_llenado_raw = pos_bk.PLANTA_LLENADO.strip() if pos_bk and pos_bk.PLANTA_LLENADO else ""
-            planta_llenado_up = planta_llenado_raw.upper()
-
-            for item in agrupado_por_booking.get(bk_id, []):
-                fila_e = GRID_START_ROW + (fila_secuencial - 1)
-                ws.cell(row=fila_e, column=3).value = item["pallet"]
-                ws.cell(row=fila_e, column=4).value = booking_data_map[bk_id]["contenedor"]
-                ws.cell(row=fila_e, column=6).value = pedido.product.strip() if pedido and pedido.product else ""
-                ws.cell(row=fila_e, column=7).value = pedido.variedad.strip() if pedido and pedido.variedad else ""
-                ws.cell(row=fila_e, column=8).value = item["calibre"]
-                peso_val = pedido.peso_por_caja if pedido else ""
-                if peso_val is not None and str(peso_val).strip() != "":
-                    ws.cell(row=fila_e, column=9).value = f"{str(peso_val).strip()} KG"
-                p_id_match = str(item["pallet"]).strip().upper()
-                if p_id_match in termografos_map and p_id_match not in therms_written:
-                    ws.cell(row=fila_e, column=13).value = termografos_map[p_id_match]
-                    therms_written.add(p_id_match)
-                cajas_num = safe_float(item["cajas"])
-                factor = 4.2
-                cultivo_up = (pedido.cultivo or "").upper() if pedido else ""
-                peso_nominal = safe_float(pedido.peso_por_caja) if pedido else 0.0
-                if "PALTA" in cultivo_up or "AVOCADO" in cultivo_up:
-                    ws.cell(row=fila_e, column=10).value = "LOOSE"
-                    if peso_nominal == 10: 
-                        factor = 10.97
-                        tipo_emision = "PALTA_10KG"
-                    elif peso_nominal == 4: 
-                        factor = 4.3
-                        tipo_emision = "PALTA_4KG"
-                gross_val = round(cajas_num * factor, 2)
-                ws.cell(row=fila_e, column=14).value = gross_val
-                total_cajas_acum += cajas_num
-                total_gross_acum += gross_val
-                ws.cell(row=fila_e, column=15).value = item["total_kilos"]
-                ws.cell(row=fila_e, column=16).value = item["cosecha"]
-                ws.cell(row=fila_e, column=17).value = item["proceso"]
-                ws.cell(row=fila_e, column=18).value = item["lote_ogl"]
-                ws.cell(row=fila_e, column=19).value = "Complejo Agroindustrial"
-                
-                # GLN por Planta de Llenado
-                if "ICA" in planta_llenado_up:
-                    ws.cell(row=fila_e, column=20).value = "7751043044355"
-                elif "JAYANCA" in planta_llenado_up:
-                    ws.cell(row=fila_e, column=20).value = "7751043046953"
-                elif "OLMOS" in planta_llenado_up:
-                    ws.cell(row=fila_e, column=20).value = "7751043045680"
-                else:
-                    ws.cell(row=fila_e, column=20).value = ""
-                    
-                ws.cell(row=fila_e, column=21).value = pedido.caja_por_pallet if pedido else ""
-                ws.cell(row=fila_e, column=22).value = item["cajas"]
-                ws.cell(row=fila_e, column=23).value = "COMPLEJO AGROINDUSTRIAL BETA S.A."
-                ws.cell(row=fila_e, column=24).value = "4050373153151"
-                ws.cell(row=fila_e, column=25).value = planta_llenado_raw
-                ws.cell(row=fila_e, column=26).value = item["trazabilidad"]
-                fila_secuencial += 1
-
-        if agrupado_por_booking.get("DESCONOCIDO"):
-            planta_llenado_raw = primer_pos.PLANTA_LLENADO.strip() if primer_pos and primer_pos.PLANTA_LLENADO else ""
-            planta_llenado_up = planta_llenado_raw.upper()
-            for item in agrupado_por_booking["DESCONOCIDO"]:
-                fila_e = GRID_START_ROW + (fila_secuencial - 1)
-                ws.cell(row=fila_e, column=3).value = item["pallet"]; ws.cell(row=fila_e, column=4).value = contenedor_default
-                ws.cell(row=fila_e, column=6).value = primer_pedido.product if primer_pedido else ""; ws.cell(row=fila_e, column=7).value = primer_pedido.variedad if primer_pedido else ""
-                ws.cell(row=fila_e, column=8).value = item["calibre"]
-                peso_val = primer_pedido.peso_por_caja if primer_pedido else ""
-                if peso_val is not None and str(peso_val).strip() != "": ws.cell(row=fila_e, column=9).value = f"{str(peso_val).strip()} KG"
-                if primer_pedido and ("PALTA" in (primer_pedido.cultivo or "").upper() or "AVOCADO" in (primer_pedido.cultivo or "").upper()):
-                    ws.cell(row=fila_e, column=10).value = "LOOSE"
-                p_id_match = str(item["pallet"]).strip().upper()
-                if p_id_match in termografos_map and p_id_match not in therms_written:
-                    ws.cell(row=fila_e, column=13).value = termografos_map[p_id_match]
-                    therms_written.add(p_id_match)
-                ws.cell(row=fila_e, column=14).value = round(safe_float(item["cajas"]) * 4.2, 2)
-                ws.cell(row=fila_e, column=15).value = item["total_kilos"]; ws.cell(row=fila_e, column=16).value = item["cosecha"]; ws.cell(row=fila_e, column=17).value = item["proceso"]
-                ws.cell(row=fila_e, column=18).value = item["lote_ogl"]; ws.cell(row=fila_e, column=19).value = "Complejo Agroindustrial"
-                if "ICA" in planta_llenado_up: ws.cell(row=fila_e, column=20).value = "7751043044355"
-                ws.cell(row=fila_e, column=21).value = primer_pedido.caja_por_pallet if primer_pedido else ""; ws.cell(row=fila_e, column=22).value = item["cajas"]
-                ws.cell(row=fila_e, column=23).value = "COMPLEJO AGROINDUSTRIAL BETA S.A."; ws.cell(row=fila_e, column=24).value = "4050373153151"
-                ws.cell(row=fila_e, column=25).value = planta_llenado_raw; ws.cell(row=fila_e, column=26).value = item["trazabilidad"]
-                fila_secuencial += 1
-
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        # Arrival Port: usar destino_booking del posicionamiento (más actualizado que cuadro de pedidos)
+        ARRIVAL_PORT_CODES = {
+            "ROTTERDAM":      "NLRTM",
+            "LONDON":         "GBLGP",
+            "ALGECIRAS":      "ESALG",
+            "THESSALONIKI":   "GRSKG",
+            "PHILADELPHIA":   "USPHL",
+            "LOS ANGELES":    "USLAX",
+            "LOS ÁNGELES":    "USLAX",
+            "SAVANNAH":       "USSAV",
+            "NEW ORLEANS":    "USMSY",
+            "OAKLAND":        "USOAK",
+            "MIAMI":          "PortMiami",
+            "QUETZAL":        "GTPRQ",
+            "MERSIN":         "TRMER",
+            "VLISSINGEN":     "NLVLI",
+        }
+        # Prioridad: destino_booking del posicionamiento → pod del pedido
+        arrival_port_raw = ""
+        if primer_pos and primer_pos.DESTINO_BOOKING:
+            arrival_port_raw = primer_pos.DESTINO_BOOKING.strip()
+        elif primer_pedido.pod:
+            arrival_port_raw = primer_pedido.pod.strip()
         
-        # Validaciones Finales
-        # NOTA: Las validaciones de Cajas/Peso Bruto solo aplican para Granada,
-        # donde los contenedores tienen un número fijo de cajas estándar.
-        # Para Palta (LOOSE), los valores varían por naturaleza del producto y no se validan.
-        warnings = []
+        arrival_port_upper = arrival_port_raw.upper()
+        arrival_port_id = ""
+        for key, code in ARRIVAL_PORT_CODES.items():
+            if key in arrival_port_upper:
+                arrival_port_id = code
+                break
+        if not arrival_port_id:
+            arrival_port_id = primer_pedido.port_id_dest or ""
         
-        safe_nave = re.sub(r'[\\/*?:"<>|]', "_", nave_clean).replace(' ', '_')
-        filename = f"Packing List_OGL_MAESTRO_{safe_nave}_{pl_id}.xlsx"
-        file_bytes = output.getvalue()
-        storage_path = os.path.join(PL_STORAGE_DIR, filename)
-        with open(storage_path, "wb") as f_disk: f_disk.write(file_bytes)
+        writer.celda("C14", arrival_port_id)
+        writer.celda("C15", arrival_port_raw)
+    
+    if primer_pos:
+        writer.celda("C13", primer_pos.POL or "")
+        writer.celda("C16", primer_pos.ETD.strftime("%d/%m/%Y") if primer_pos.ETD else "")
+        writer.celda("C17", primer_pos.ETA.strftime("%d/%m/%Y") if primer_pos.ETA else "")
+
+    # Grilla: bookings en orden de programación y luego pallets DESCONOCIDOS,
+    # con la misma regla de fila para ambos. El termógrafo se escribe solo
+    # en la primera aparición de cada pallet.
+    termografos_pendientes = dict(termografos_map)
+    grupos = [
+        (agrupado_por_booking.get(bk_id, []), booking_data_map[bk_id]["contenedor"],
+         booking_data_map[bk_id]["pedido"], ctx.pos(bk_id))
+        for bk_id, _ in lista_ordenada
+    ]
+    if agrupado_por_booking.get("DESCONOCIDO"):
+        grupos.append((agrupado_por_booking["DESCONOCIDO"], contenedor_default, primer_pedido, primer_pos))
+
+    def filas_grilla():
+        for items, contenedor, pedido, pos_bk in grupos:
+            planta_llenado_raw = pos_bk.PLANTA_LLENADO.strip() if pos_bk and pos_bk.PLANTA_LLENADO else ""
+            for item in items:
+                termografo = termografos_pendientes.pop(str(item["pallet"]).strip().upper(), None)
+                yield fila_pallet_ogl(item, contenedor, pedido, planta_llenado_raw, termografo)
 
-        # Auditoría
-        try:
-            nombre_usuario = current_user.usuario.upper() if current_user else "SISTEMA"
-            nueva_emision = EmisionPackingList(usuario=nombre_usuario, nave=nave_clean, estado="ACTIVO", archivo_nombre=filename, cultivo=cultivo_check)
-            db.add(nueva_emision); db.flush()
-            for bk_id in bookings_set:
-                db.add(DetalleEmisionPackingList(emision_id=nueva_emision.id, booking=bk_id))
+    writer.agregar_filas(filas_grilla())
+
+    
+    # Validaciones Finales
+    # NOTA: Las validaciones de Cajas/Peso Bruto solo aplican para Granada,
+    # donde los contenedores tienen un número fijo de cajas estándar.
+    # Para Palta (LOOSE), los valores varían por naturaleza del producto y no se validan.
+    warnings = []
+    
+    safe_nave = re.sub(r'[\\/*?:"<>|]', "_", nave_clean).replace(' ', '_')
+    filename = f"Packing List_OGL_MAESTRO_{safe_nave}_{pl_id}.xlsx"
+    if vista_previa:
+        return {
+            "vista_previa": True, "nave": nave_clean, "pl_id": pl_id, "archivo": filename, "warnings": warnings,
+            "grupos": [
+                {"booking": bk_id, "contenedor": contenedor, "pallets": len(items)}
+                for bk_id, (items, contenedor, _, _) in zip([bk for bk, _ in lista_ordenada] + ["DESCONOCIDO"], grupos)
+            ],
+            **writer.como_dict(),
+        }
+    avisar(85, "Guardando archivo")
+    file_bytes = writer.guardar()
+    storage_path = os.path.join(PL_STORAGE_DIR, filename)
+    with open(storage_path, "wb") as f_disk: f_disk.write(file_bytes)
+
+    # Auditoría
+    avisar(95, "Registrando emisión")
+    try:
+        nueva_emision = EmisionPackingList(
+            usuario=usuario, nave=nave_clean, estado="ACTIVO", archivo_nombre=filename, cultivo=cultivo_check,
+            pl_id=pl_id, semana=semana_pl,
+            archivo_bytes=len(file_bytes), archivo_sha256=hashlib.sha256(file_bytes).hexdigest(), archivo_disponible=True,
+        )
+        db.add(nueva_emision); db.flush()
+        for bk_id in bookings_set:
+            db.add(DetalleEmisionPackingList(emision_id=nueva_emision.id, booking=bk_id))
+        if lote is None:
             db.commit()
-        except Exception as inner_e:
-            db.rollback(); logger.error(f"Error auditoría: {inner_e}")
-            raise HTTPException(status_code=500, detail="Error al guardar historial")
-
-        headers = {"Content-Disposition": f"attachment; filename={filename}", "Access-Control-Expose-Headers": "X-PL-Warnings"}
-        if warnings:
-            import json
-            headers["X-PL-Warnings"] = json.dumps(warnings)
-        return Response(content=file_bytes, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+            pl_cache.invalidar(f"PL emitido para {nave_clean}")
+        else:
+            db.flush()
+    except Exception as inner_e:
+        if lote is None: db.rollback()
+        logger.error(f"Error auditoría: {inner_e}")
+        raise HTTPException(status_code=500, detail="Error al guardar historial")
+
+    return {
+        "archivo": filename, "file_bytes": file_bytes, "warnings": warnings,
+        "emision_id": nueva_emision.id, "pl_id": pl_id, "nave": nave_clean,
+    }
+
+
+def preparar_lote(
+    db: Session,
+    semana_eta: int,
+    cultivo: Optional[str],
+    confirmaciones_parseadas: List[ConfirmacionOGL],
+    termografos_map: Dict[str, str],
+) -> LotePL:
+    """
+    Naves pendientes (bookings sin PL activo, como en /naves) con pedidos OGL de la
+    semana ETA y cultivo, restringidas a los bookings/órdenes de los archivos.
+    Cada fila de las confirmaciones se rutea UNA vez a su booking (y así a su nave).
+    """
+    cultivo_up = (cultivo or "").strip().upper()
+    naves = pl_cache.obtener("naves", None, lambda: _calcular_naves(db))
+    todos = {bk for n in naves for bk in n.bookings}
+    ctx = BookingContext.cargar(db, todos, cliente_keyword=OGL_KEYWORD)
+
+    def en_semana(bk: str) -> bool:
+        pedido = ctx.pedido(bk)
+        if not pedido or pedido.semana_eta != semana_eta:
+            return False
+        return not cultivo_up or (pedido.cultivo or "").strip().upper() == cultivo_up
+
+    candidatos = {bk for bk in todos if en_semana(bk)}
+    candidatos = _restringir_a_archivos(candidatos, ctx, confirmaciones_parseadas, estricto=True)
+    pallets = _agrupar_pallets(
+        confirmaciones_parseadas, candidatos, _orden_a_booking(candidatos, ctx), por_defecto="DESCONOCIDO"
+    )
+
+    # Solo naves con pallets en los archivos
+    bookings_por_nave: Dict[str, set] = {}
+    for n in naves:
+        if n.nave == SIN_NAVE:
+            continue
+        propios = {bk for bk in candidatos.intersection(n.bookings) if pallets.get(bk)}
+        if propios:
+            bookings_por_nave[n.nave.strip().upper()] = propios
+    return LotePL(ctx, bookings_por_nave, pallets, termografos_map)
+
+
+def construir_lote_pl_ogl(
+    db: Session,
+    usuario: str,
+    semana_eta: int,
+    cultivo: Optional[str],
+    confirmaciones: List[Tuple[Optional[str], bytes]],
+    termografos: Optional[bytes] = None,
+    recibidor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Genera el PL de cada nave pendiente de la semana/cultivo y los empaqueta en un ZIP.
+    Las emisiones del lote van en una transacción; cada nave en un savepoint, para que
+    una nave con error no aborte el resto. Los WK IDs se reservan aparte (ver
+    construir_pl_ogl) y se devuelven si el lote no llega a confirmarse.
+    """
+    confirmaciones_parseadas = _parsear_confirmaciones(confirmaciones, lambda _p, _e: None)
+    lote = preparar_lote(db, semana_eta, cultivo, confirmaciones_parseadas, _leer_termografos(termografos))
+    if not lote.bookings_por_nave:
+        raise HTTPException(
+            status_code=404,
+            detail=f"No hay naves pendientes con bookings OGL de la semana {semana_eta} en los archivos subidos",
+        )
+
+    resumen: List[Dict[str, Any]] = []
+    zip_buffer = io.BytesIO()
+    with zipfile.ZipFile(zip_buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for nave_lote in sorted(lote.bookings_por_nave):
+            try:
+                with db.begin_nested():
+                    res = construir_pl_ogl(db, usuario, nave_lote, [], recibidor=recibidor, semana_eta=semana_eta, lote=lote)
+            except Exception as e:
+                detalle = e.detail if isinstance(e, HTTPException) else str(e)
+                logger.error(f"Lote WK{semana_eta}: no se generó el PL de {nave_lote}: {detalle}")
+                resumen.append({"nave": nave_lote, "error": detalle})
+                continue
+            zf.writestr(res["archivo"], res["file_bytes"])
+            resumen.append({
+                "nave": nave_lote, "pl_id": res["pl_id"], "archivo": res["archivo"],
+                "emision_id": res["emision_id"], "bookings": sorted(lote.bookings_por_nave[nave_lote]),
+                "warnings": res["warnings"],
+            })
+
+    generados = [r for r in resumen if "error" not in r]
+    if not generados:
+        db.rollback()
+        raise HTTPException(status_code=404, detail={"mensaje": "No se generó ningún Packing List", "naves": resumen})
+    try:
+        db.commit()
+    except Exception as e:
+        db.rollback(); logger.error(f"Error auditoría lote: {e}")
+        _devolver_reservas(lote.reservas)
+        raise HTTPException(status_code=500, detail="Error al guardar historial")
+    pl_cache.invalidar(f"lote de {len(generados)} PLs semana {semana_eta}")
+
+    sufijo_cultivo = f"_{re.sub(r'[^A-Z0-9]', '_', cultivo.strip().upper())}" if cultivo and cultivo.strip() else ""
+    return {
+        "archivo": f"Packing Lists_OGL_WK{str(semana_eta).zfill(2)}{sufijo_cultivo}.zip",
+        "zip_bytes": zip_buffer.getvalue(),
+        "naves": resumen,
+        "pallets_sin_nave": [p["pallet"] for p in lote.pallets_por_booking.get("DESCONOCIDO", [])],
+    }
+
+
+def _nombre_usuario(current_user) -> str:
+    return current_user.usuario.upper() if current_user else "SISTEMA"
+
+
+@router.post("/generate/ogl")
+async def generate_packing_list_ogl(
+    current_user: OptionalUser,
+    nave: str = Form(...),
+    confirmaciones: List[UploadFile] = File(...),
+    termografos: Optional[UploadFile] = File(None),
+    recibidor: Optional[str] = Form(None),
+    semana_eta: Optional[int] = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        archivos, t_content = await _leer_archivos(confirmaciones, termografos)
+        # El armado es bloqueante: se ejecuta en el pool de PLs, fuera del event loop
+        res = await pl_jobs.ejecutar(
+            construir_pl_ogl, db, _nombre_usuario(current_user), nave, archivos, t_content, recibidor, semana_eta
+        )
     except HTTPException: raise
     except Exception as e: 
         import traceback
@@ -919,28 +837,197 @@ async def generate_packing_list_ogl(
         logger.error(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
 
+    headers = {"Content-Disposition": f"attachment; filename={res['archivo']}", "Access-Control-Expose-Headers": "X-PL-Warnings"}
+    if res["warnings"]:
+        import json
+        headers["X-PL-Warnings"] = json.dumps(res["warnings"])
+    return Response(content=res["file_bytes"], media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", headers=headers)
+
+# ---------------------------------------------------------------------------
+# POST /generate/ogl/preview  ─  Cabecera y grilla en JSON (sin Excel ni emisión)
+# ---------------------------------------------------------------------------
+@router.post("/generate/ogl/preview")
+async def preview_packing_list_ogl(
+    current_user: OptionalUser,
+    nave: str = Form(...),
+    confirmaciones: List[UploadFile] = File(...),
+    termografos: Optional[UploadFile] = File(None),
+    recibidor: Optional[str] = Form(None),
+    semana_eta: Optional[int] = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        archivos, t_content = await _leer_archivos(confirmaciones, termografos)
+        return await pl_jobs.ejecutar(
+            lambda: construir_pl_ogl(
+                db, _nombre_usuario(current_user), nave, archivos, t_content, recibidor, semana_eta, vista_previa=True
+            )
+        )
+    except HTTPException: raise
+    except Exception as e:
+        logger.error(f"Error en vista previa PL OGL: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+# ---------------------------------------------------------------------------
+# POST /generate/ogl/lote  ─  Todas las naves pendientes de una semana ETA/cultivo (ZIP)
+# ---------------------------------------------------------------------------
+@router.post("/generate/ogl/lote")
+async def generate_packing_list_ogl_lote(
+    current_user: OptionalUser,
+    semana_eta: int = Form(...),
+    confirmaciones: List[UploadFile] = File(...),
+    termografos: Optional[UploadFile] = File(None),
+    cultivo: Optional[str] = Form(None),
+    recibidor: Optional[str] = Form(None),
+    db: Session = Depends(get_db)
+):
+    try:
+        archivos, t_content = await _leer_archivos(confirmaciones, termografos)
+        res = await pl_jobs.ejecutar(
+            construir_lote_pl_ogl, db, _nombre_usuario(current_user), semana_eta, cultivo, archivos, t_content, recibidor
+        )
+    except HTTPException: raise
+    except Exception as e:
+        import traceback
+        logger.error(f"FATAL ERROR en generar lote PL OGL: {str(e)}")
+        logger.error(traceback.format_exc())
+        raise HTTPException(status_code=500, detail=f"Error interno del servidor: {str(e)}")
+
+    import json
+    headers = {
+        "Content-Disposition": f"attachment; filename={res['archivo']}",
+        "Access-Control-Expose-Headers": "Content-Disposition, X-PL-Resumen",
+        "X-PL-Resumen": json.dumps({"naves": res["naves"], "pallets_sin_nave": res["pallets_sin_nave"]}, ensure_ascii=True),
+    }
+    return Response(content=res["zip_bytes"], media_type="application/zip", headers=headers)
+
+# ---------------------------------------------------------------------------
+# Cola de generación: POST /jobs/ogl → job_id; GET /jobs/{id} (estado y avance);
+# GET /jobs/{id}/descargar cuando está COMPLETADO
+# ---------------------------------------------------------------------------
+@router.post("/jobs/ogl", status_code=202)
+async def encolar_packing_list_ogl(
+    current_user: OptionalUser,
+    nave: str = Form(...),
+    confirmaciones: List[UploadFile] = File(...),
+    termografos: Optional[UploadFile] = File(None),
+    recibidor: Optional[str] = Form(None),
+    semana_eta: Optional[int] = Form(None),
+):
+    archivos, t_content = await _leer_archivos(confirmaciones, termografos)
+    usuario = _nombre_usuario(current_user)
+
+    def tarea(trabajo: pl_jobs.Trabajo) -> Dict[str, Any]:
+        db = SessionLocal()
+        try:
+            res = construir_pl_ogl(db, usuario, nave, archivos, t_content, recibidor, semana_eta, progreso=trabajo.avanzar)
+        finally:
+            db.close()
+        return {k: v for k, v in res.items() if k != "file_bytes"}
+
+    trabajo = pl_jobs.encolar("PL_OGL", usuario, tarea, descripcion=nave.strip().upper())
+    return {"job_id": trabajo.id, "estado": trabajo.estado}
+
+@router.get("/jobs/{job_id}")
+def estado_trabajo_pl(job_id: str):
+    return pl_jobs.obtener(job_id).to_dict()
+
+@router.get("/jobs/{job_id}/descargar")
+def descargar_trabajo_pl(job_id: str):
+    trabajo = pl_jobs.obtener(job_id)
+    if trabajo.estado == pl_jobs.ERROR:
+        raise HTTPException(status_code=trabajo.codigo_error or 500, detail=trabajo.error)
+    if trabajo.estado != pl_jobs.COMPLETADO:
+        raise HTTPException(status_code=409, detail=f"El Packing List aún no está listo ({trabajo.progreso}%)")
+    filename = trabajo.resultado["archivo"]
+    path_disco = os.path.join(PL_STORAGE_DIR, filename)
+    if not os.path.exists(path_disco): raise HTTPException(status_code=404, detail="Archivo no disponible en disco")
+    headers = {"Access-Control-Expose-Headers": "Content-Disposition, X-PL-Warnings"}
+    if trabajo.resultado.get("warnings"):
+        import json
+        headers["X-PL-Warnings"] = json.dumps(trabajo.resultado["warnings"])
+    return FileResponse(path=path_disco, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=filename, headers=headers)
+
 def format_container_ogl(code: str) -> str:
     if not code or len(code) < 5: return code or ""
     code = code.strip().upper()
     if " " in code: return code
     return f"{code[:4]} {code[4:]}"
 
+def _metadatos_archivo(nombre: Optional[str]) -> Tuple[Optional[int], Optional[str], bool]:
+    """(bytes, sha256, disponible) del archivo en storage."""
+    if not nombre:
+        return None, None, False
+    path_disco = os.path.join(PL_STORAGE_DIR, nombre)
+    if not os.path.exists(path_disco):
+        return None, None, False
+    sha = hashlib.sha256()
+    with open(path_disco, "rb") as f_disk:
+        for bloque in iter(lambda: f_disk.read(1 << 20), b""):
+            sha.update(bloque)
+    return os.path.getsize(path_disco), sha.hexdigest(), True
+
 @router.get("/historial")
-def obtener_historial_pl(db: Session = Depends(get_db)):
-    emisiones = db.query(EmisionPackingList).order_by(EmisionPackingList.fecha_generacion.desc()).limit(100).all()
+def obtener_historial_pl(
+    page: int = 1,
+    size: int = 100,
+    nave: Optional[str] = None,
+    estado: Optional[str] = None,
+    usuario: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    page = max(page, 1)
+    size = min(max(size, 1), 500)
+    query = db.query(EmisionPackingList)
+    if nave: query = query.filter(EmisionPackingList.nave.ilike(f"%{nave.strip()}%"))
+    if estado: query = query.filter(EmisionPackingList.estado == estado.strip().upper())
+    if usuario: query = query.filter(EmisionPackingList.usuario.ilike(f"%{usuario.strip()}%"))
+    if start_date: query = query.filter(EmisionPackingList.fecha_generacion >= start_date)
+    if end_date:
+        # Añadir 23:59:59 para incluir el día final completo
+        query = query.filter(EmisionPackingList.fecha_generacion <= f"{end_date} 23:59:59")
+
+    total = query.count()
+    emisiones = query.options(selectinload(EmisionPackingList.detalles)).order_by(
+        EmisionPackingList.fecha_generacion.desc(), EmisionPackingList.id.desc()
+    ).offset((page - 1) * size).limit(size).all()
+
+    # Órdenes de todas las emisiones de la página en una sola consulta (detalle ⋈ posicionamiento)
+    ordenes_por_emision: Dict[int, set] = {}
+    if emisiones:
+        for emision_id, orden in db.query(DetalleEmisionPackingList.emision_id, Posicionamiento.ORDEN_BETA).join(
+            Posicionamiento, Posicionamiento.BOOKING == DetalleEmisionPackingList.booking
+        ).filter(
+            DetalleEmisionPackingList.emision_id.in_([em.id for em in emisiones]),
+            Posicionamiento.ORDEN_BETA.isnot(None),
+        ).all():
+            ordenes_por_emision.setdefault(emision_id, set()).add(orden)
+
+    # Emisiones antiguas sin metadatos: se verifica su archivo una sola vez y se guarda
+    pendientes = [em for em in emisiones if em.archivo_disponible is None]
+    for em in pendientes:
+        em.archivo_bytes, em.archivo_sha256, em.archivo_disponible = _metadatos_archivo(em.archivo_nombre)
+    if pendientes:
+        try: db.commit()
+        except Exception as e: db.rollback(); logger.error(f"Error guardando metadatos de archivos PL: {e}")
+
     resultado = []
     for em in emisiones:
-        archivo_disponible = os.path.exists(os.path.join(PL_STORAGE_DIR, em.archivo_nombre)) if em.archivo_nombre else False
-        bk_list = [d.booking for d in em.detalles]
-        pos_data = db.query(Posicionamiento.ORDEN_BETA).filter(Posicionamiento.BOOKING.in_(bk_list)).all()
-        ord_list = sorted(list(set([p[0] for p in pos_data if p[0]])))
         resultado.append({
             "id": em.id, "fecha": em.fecha_generacion, "usuario": em.usuario or "Sistema", "nave": em.nave,
-            "estado": em.estado, "archivo": em.archivo_nombre, "archivo_disponible": archivo_disponible,
+            "estado": em.estado, "archivo": em.archivo_nombre, "archivo_disponible": bool(em.archivo_disponible),
+            "archivo_bytes": em.archivo_bytes, "archivo_sha256": em.archivo_sha256,
             "motivo_anulacion": em.motivo_anulacion, "usuario_anulacion": em.usuario_anulacion,
-            "bookings": bk_list, "ordenes": ord_list
+            "bookings": [d.booking for d in em.detalles], "ordenes": sorted(ordenes_por_emision.get(em.id, ()))
         })
-    return {"items": resultado}
+    return {
+        "total": total,
+        "page": page,
+        "total_pages": (total + size - 1) // size,
+        "items": resultado,
+    }
 
 class AnularPLRequest(BaseModel):
     motivo: str
@@ -952,8 +1039,10 @@ def anular_pl(id: int, req: AnularPLRequest, current_user: CurrentUser, db: Sess
     if emision.estado == "ANULADO": raise HTTPException(status_code=400, detail="Ya se encuentra anulado")
     emision.estado = "ANULADO"; emision.motivo_anulacion = req.motivo
     emision.usuario_anulacion = current_user.usuario.upper() if current_user else "SISTEMA"
+    liberar_pl_id(db, emision)
     try: db.commit()
     except: db.rollback(); raise HTTPException(status_code=500, detail="Error al anular")
+    pl_cache.invalidar(f"PL {id} anulado")
     return {"message": "Anulado correctamente", "id": id}
 
 @router.get("/{id}/descargar")
@@ -961,5 +1050,11 @@ def descargar_pl(id: int, db: Session = Depends(get_db)):
     emision = db.query(EmisionPackingList).filter(EmisionPackingList.id == id).first()
     if not emision or not emision.archivo_nombre: raise HTTPException(status_code=404, detail="Archivo no encontrado")
     path_disco = os.path.join(PL_STORAGE_DIR, emision.archivo_nombre)
-    if not os.path.exists(path_disco): raise HTTPException(status_code=404, detail="Archivo no disponible en disco")
+    if not os.path.exists(path_disco):
+        # El historial deja de ofrecerlo como descargable
+        if emision.archivo_disponible is not False:
+            emision.archivo_disponible = False
+            try: db.commit()
+            except Exception: db.rollback()
+        raise HTTPException(status_code=404, detail="Archivo no disponible en disco")
     return FileResponse(path=path_disco, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=emision.archivo_nombre, headers={"Access-Control-Expose-Headers": "Content-Disposition"})
@@ -1,16 +1,29 @@
-from fastapi import APIRouter, Header, Depends, HTTPException, status, Body, Request
-from typing import List, Any
+from fastapi import APIRouter, Header, Depends, HTTPException, status, Body, Request, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from typing import List, Any, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy.dialects.postgresql import insert
-from app.database import get_db
+from app.database import SessionLocal, get_db
 from app.configuracion import settings
 from app.models.posicionamiento import Posicionamiento
 from app.models.pedido import PedidoComercial
 from app.models.embarque import ReporteEmbarques
+from app.utils.formatters import normalize_cultivo, normalize_orden_beta, normalize_vessel_name
+from app.services.booking_pedido import revincular
+from app.services.naves_service import registrar_naves
+from app.services.pl_correlativo import (
+    OGL_KEYWORD, es_ogl, ordenes_por_booking, semanas_de_ordenes, sincronizar_correlativos,
+)
+from app.services import pl_cache, sync_export, sync_jobs
+from app.services.sync_ingesta import (
+    MAX_ERRORES, Cronometro, MapeadorFilas, ResolutorCabeceras, aplicar_diferencias,
+    consultar_progreso, diferencias, huella_fila, leer_ndjson, publicar_progreso,
+    reemplazar_porciones_staging, sumar_delta, upsert_por_lotes,
+)
+from app.services.sync_limpieza import limpiar_columna, limpiar_filas
 import logging
 import json
-from dateutil.parser import parse as parse_date
-import re
+import uuid
 
 logger = logging.getLogger(__name__)
 
@@ -131,320 +144,720 @@ PEDIDOS_MAPPING = {
     "SEMANA ETA PROGRAMA COMERCIAL": "semana_eta"
 }
 
-def clean_data_value(val: Any, db_column: str):
-    null_and_errors = {"", "-", "N/A", "NONE", "NULL", "NAN", "#¡VALOR!", "#VALUE!", "#REF!", "#DIV/0!", "#N/A", "#NAME?", "#¿NOMBRE?"}
-    if val is None: return None
-    val_str = str(val).strip()
-    if not val_str or val_str.upper() in null_and_errors: return None
-    
-    col_upper = db_column.upper()
-    numeric_cols = ["PESO_POR_CAJA", "CAJA_POR_PALLET", "TOTAL_PALLETS", "TOTAL_CAJAS", "SEMANA_ETA", "CAJAS_VACIAS"]
-
-    if val_str == "0" and col_upper not in numeric_cols:
-        return None
-    
-    # Manejo de números
-    if col_upper in numeric_cols:
-        if col_upper == "CAJAS_VACIAS":
-            if val_str.upper() == "SI": return 1
-            if val_str.upper() == "NO": return 0
-        try:
-            match = re.search(r'(\d+(\.\d+)?)', val_str.replace(',', ''))
-            if match:
-                num = float(match.group(1))
-                return int(num) if col_upper != "PESO_POR_CAJA" else num
-        except:
-            return 0
-
-    # Manejo de fechas
-    if col_upper in ["ETD", "ETA", "FECHA_PROGRAMADA", "FECHA_LLENADO_REPORTE"]:
+# Mapeos precompilados (cabecera limpia → columna); cada firma de cabeceras se resuelve una vez
+RESOLUTOR_POSICIONAMIENTO = ResolutorCabeceras(COLUMN_MAPPING)
+RESOLUTOR_PEDIDOS = ResolutorCabeceras(PEDIDOS_MAPPING)
+
+def actualizar_correlativos_pl(db: Session, results: dict):
+    """
+    Recalcula el orden de naves del asignador de WK IDs tras una sincronización,
+    solo en las semanas ETA que tocaron los lotes (ver _anotar_semanas).
+    """
+    semanas = results.pop("_semanas_pl", None)
+    if not semanas:
+        return
+    try:
+        sincronizar_correlativos(db, semanas)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"No se pudo actualizar el correlativo de PLs: {e}")
+
+def _anotar_semanas(results: dict, semanas) -> None:
+    """Acumula en `results` las semanas ETA del correlativo de PLs que cambiaron (se consume al final)."""
+    if semanas:
+        results.setdefault("_semanas_pl", set()).update(semanas)
+
+def _semanas_ogl_de_porciones(db: Session, porciones) -> set:
+    """Semanas ETA de los pedidos OGL ya guardados en esas porciones (cultivo, planta), antes de reemplazarlas."""
+    semanas = set()
+    for c, p in porciones:
+        semanas.update(int(s) for (s,) in db.query(PedidoComercial.semana_eta).filter(
+            PedidoComercial.cultivo == c,
+            PedidoComercial.planta == p,
+            PedidoComercial.semana_eta.isnot(None),
+            PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%"),
+        ).distinct())
+    return semanas
+
+def _semanas_ogl_nuevas(filas) -> set:
+    """Semanas ETA de las filas OGL recibidas (las que no traen una semana numérica no cuentan)."""
+    semanas = set()
+    for m in filas:
+        if not es_ogl(m.get("cliente")):
+            continue
         try:
-            # Traducción básica de meses en español a inglés para el parser
-            meses_es_en = {
-                "ENE": "JAN", "FEB": "FEB", "MAR": "MAR", "ABR": "APR", "MAY": "MAY", "JUN": "JUN",
-                "JUL": "JUL", "AGO": "AUG", "SEP": "SEP", "OCT": "OCT", "NOV": "NOV", "DIC": "DEC"
-            }
-            temp_val = val_str.upper()
-            for es, en in meses_es_en.items():
-                if es in temp_val: temp_val = temp_val.replace(es, en)
-            
-            parsed_date = parse_date(temp_val, dayfirst=True)
-            return parsed_date.date()
-        except:
-            return None
-
-    # Manejo de horas
-    if col_upper in ["HORA_PROGRAMADA", "HORA_LLENADO_REPORTE"]:
-        try: return parse_date(val_str).time()
-        except: return None
-
-    return val_str.replace(";", "").strip().upper()
+            semanas.add(int(float(m.get("semana_eta"))))
+        except (TypeError, ValueError):
+            continue
+    return semanas
+
+def clean_data_value(val: Any, db_column: str):
+    """Limpieza de una sola celda; las cargas masivas usan sync_limpieza.limpiar_filas por columnas."""
+    return limpiar_columna([val], db_column)[0]
+
+def _hubo_cambios(conteo: dict) -> bool:
+    return any(conteo.get(k) for k in ("insertadas", "actualizadas", "eliminadas"))
+
+def _procesar_posicionamiento(db: Session, crudas, results, delta: bool = False):
+    """
+    Limpia por columnas, descarta filas sin booking y hace el upsert por lotes (sin commit).
+    Posicionamiento nunca borra: en delta solo se omiten las filas sin cambios.
+    """
+    limpiar_filas([row_data for _, row_data in crudas])
+    filas = []  # (nro de fila en la hoja, datos limpios)
+    for nro, row_data in crudas:
+        if not row_data.get("booking"):
+            results["skipped"] += 1
+            continue
+        filas.append((nro, row_data))
+        if "nave" in row_data:
+            row_data["nave_norm"] = normalize_vessel_name(row_data["nave"]) or None
+        if "orden_beta" in row_data:
+            row_data["orden_num"] = normalize_orden_beta(row_data["orden_beta"])
+        if "cultivo" in row_data:
+            row_data["cultivo_key"] = normalize_cultivo(row_data["cultivo"])
+
+    # Orden previa de cada booking: si la carga la cambia, también se mueve el bucket anterior
+    ordenes_previas = ordenes_por_booking(db, [d["booking"] for _, d in filas])
+    escritura = upsert_por_lotes(db, Posicionamiento, filas, clave="booking", delta=delta)
+    if escritura["processed"] and (not delta or _hubo_cambios(escritura["delta"])):
+        sync_export.marcar_cambio(db, Posicionamiento)
+        revincular(db, bookings=escritura["escritas"])
+        registrar_naves(db, {d.get("nave") for _, d in filas})
+        ordenes = set(ordenes_por_booking(db, escritura["escritas"]).values())
+        ordenes.update(ordenes_previas[b] for b in escritura["escritas"] if b in ordenes_previas)
+        _anotar_semanas(results, semanas_de_ordenes(db, ordenes))
+    results["processed"] += escritura["processed"]
+    results["errors"].extend(escritura["errors"])
+    results["fusionadas"] += escritura["fusionadas"]
+    if delta:
+        sumar_delta(results.setdefault("delta", {}), escritura["delta"])
 
 @router.post("/posicionamiento/raw")
 async def sync_posicionamiento_raw(
-    payload: Any = Body(...), 
-    x_sync_token: str = Header(None, alias="X-Sync-Token"), 
+    payload: Any = Body(...),
+    delta: bool = Query(False, description="Omitir filas sin cambios (por huella) y devolver el conteo de diferencias"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
     db: Session = Depends(get_db)
 ):
     if isinstance(payload, str): payload = json.loads(payload)
     if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
     if not payload or len(payload) < 2: return {"status": "error", "message": "Payload vacio"}
-    
-    def clean_header(h: Any):
-        return re.sub(r'[^A-Z0-9]', '', str(h).upper()) if h else ""
-
-    results = {"processed": 0, "errors": [], "skipped": 0}
-    
-    if isinstance(payload, list) and len(payload) > 0 and isinstance(payload[0], dict):
-        # Modo Objetos
-        for i, row in enumerate(payload):
-            try:
-                row_data = {}
-                for orig_key, val in row.items():
-                    c_header = clean_header(orig_key)
-                    for ex_col, db_col in COLUMN_MAPPING.items():
-                        if clean_header(ex_col) == c_header:
-                            # Solo asignamos si no existe, respetando la prioridad del mapeo
-                            if db_col not in row_data:
-                                row_data[db_col] = clean_data_value(val, db_col)
-                            break
-                booking_id = row_data.get("booking")
-                if not booking_id:
-                    results["skipped"] += 1
-                    continue
-                    
-                stmt = insert(Posicionamiento).values(**row_data)
-                update_data = {k: v for k, v in row_data.items() if k != "booking" and v is not None}
-                upsert_stmt = stmt.on_conflict_do_update(index_elements=[Posicionamiento.BOOKING], set_=update_data) if update_data else stmt.on_conflict_do_nothing(index_elements=[Posicionamiento.BOOKING])
-                db.execute(upsert_stmt)
-                results["processed"] += 1
-            except Exception as e:
-                db.rollback()
-                results["errors"].append({"row": i + 2, "error": str(e)})
-    else:
-        # Modo Legado (Array de Arrays)
-        excel_headers = [clean_header(h) for h in payload[0]]
-        logger.info(f"CABECERAS LIMPIAS DETECTADAS: {excel_headers}")
-        data_rows = payload[1:]
-        
-        mapping_indices = {}
-        for ex_col, db_col in COLUMN_MAPPING.items():
-            clean_target = clean_header(ex_col)
-            # Solo guardamos el índice si la columna en BD aún no tiene una columna superior asignada
-            if clean_target in excel_headers and db_col not in mapping_indices:
-                mapping_indices[db_col] = excel_headers.index(clean_target)
-                
-        logger.info(f"Mapping indices Posicionamiento: {mapping_indices}")
-        
-        for i, row in enumerate(data_rows):
-            try:
-                row_data = {db_col: clean_data_value(row[idx], db_col) for db_col, idx in mapping_indices.items() if idx < len(row)}
-                booking_id = row_data.get("booking")
-                if not booking_id:
-                    results["skipped"] += 1
-                    continue
-                    
-                stmt = insert(Posicionamiento).values(**row_data)
-                update_data = {k: v for k, v in row_data.items() if k != "booking" and v is not None}
-                upsert_stmt = stmt.on_conflict_do_update(index_elements=[Posicionamiento.BOOKING], set_=update_data) if update_data else stmt.on_conflict_do_nothing(index_elements=[Posicionamiento.BOOKING])
-                db.execute(upsert_stmt)
-                results["processed"] += 1
-            except Exception as e:
-                db.rollback()
-                results["errors"].append({"row": i + 2, "error": str(e)})
-            
-    db.commit()
+
+    cronometro = Cronometro()
+    results = {"processed": 0, "errors": [], "skipped": 0, "fusionadas": 0}
+    mapeador = MapeadorFilas(RESOLUTOR_POSICIONAMIENTO)
+    crudas = mapeador.mapear(payload, results["errors"])
+    if mapeador.indices is not None:
+        logger.info(f"Mapping indices Posicionamiento: {mapeador.indices}")
+
+    try:
+        _procesar_posicionamiento(db, crudas, results, delta)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Sincronización de posicionamiento abortada: {e}")
+        results.pop("_semanas_pl", None)
+        return {"status": "error", "error": str(e), "summary": results}
+
+    results["errors"].sort(key=lambda e: e["row"])
+    results["mapeo_cabeceras"] = mapeador.mapeo
+    results.update(cronometro.metricas(mapeador.filas))
+    logger.info(f"Posicionamiento: {results['processed']} filas en {results['duracion_s']}s ({results['filas_por_segundo']} filas/s)")
+
+    await run_in_threadpool(actualizar_correlativos_pl, db, results)
+    pl_cache.invalidar("sincronización de posicionamiento")
     return {"status": "success" if not results["errors"] else "partial_success", "summary": results}
 
+def _procesar_pedidos(db: Session, crudas, results, porciones_reemplazadas: set, delta: bool = False, staging: bool = False):
+    """
+    Limpia, descarta filas sin orden y reemplaza las porciones (cultivo, planta)
+    recibidas (sin commit). Cada porción se borra solo la primera vez que aparece
+    en la carga: así los lotes siguientes de un stream no borran a los anteriores.
+    En delta cada porción se compara por huellas y solo se escriben las diferencias;
+    con staging esa comparación la hace la BD contra una tabla temporal.
+    """
+    new_mappings = []
+    for pedido_data in limpiar_filas([pedido_data for _, pedido_data in crudas]):
+        if pedido_data.get("orden_beta"):
+            new_mappings.append(pedido_data)
+            c = pedido_data.get("cultivo")
+            if c:
+                results["cultivos_actualizados"].add(c)
+        else:
+            results["skipped"] += 1
+    for m in new_mappings:
+        m["orden_num"] = normalize_orden_beta(m["orden_beta"])
+        m["cultivo_key"] = normalize_cultivo(m.get("cultivo"))
+        m["huella"] = huella_fila(m)
+    results["processed"] += len(new_mappings)
+
+    if staging:
+        con_porcion = [m for m in new_mappings if m.get("cultivo") and m.get("planta")]
+        sin_porcion = [m for m in new_mappings if not (m.get("cultivo") and m.get("planta"))]
+        semanas_previas = _semanas_ogl_de_porciones(db, {(m["cultivo"], m["planta"]) for m in con_porcion})
+        conteo = reemplazar_porciones_staging(db, PedidoComercial, con_porcion, ("cultivo", "planta"))
+        if sin_porcion:
+            db.bulk_insert_mappings(PedidoComercial, sin_porcion)
+            conteo["insertadas"] += len(sin_porcion)
+        if _hubo_cambios(conteo):
+            sync_export.marcar_cambio(db, PedidoComercial)
+            revincular(db, ordenes=[m["orden_num"] for m in new_mappings])
+            _anotar_semanas(results, semanas_previas | _semanas_ogl_nuevas(new_mappings))
+        sumar_delta(results.setdefault("delta", {}), conteo)
+        return
+    if delta:
+        _aplicar_delta_pedidos(db, new_mappings, results)
+        return
+
+    # Borrado inteligente: Solo eliminamos la combinación exacta de Cultivo y Planta que estamos subiendo
+    # Esto permite subir múltiples Excels del mismo cultivo (ej. Palta Ica y Palta Litardo) sin que se borren entre sí.
+    filtros_cultivo_planta = set()
+    for m in new_mappings:
+        c = m.get("cultivo")
+        p = m.get("planta")
+        if c and p:
+            filtros_cultivo_planta.add((str(c).strip(), str(p).strip()))
+
+    a_reemplazar = filtros_cultivo_planta - porciones_reemplazadas
+    semanas_previas = _semanas_ogl_de_porciones(db, a_reemplazar)
+    for c, p in a_reemplazar:
+        db.query(PedidoComercial).filter(
+            PedidoComercial.cultivo == c,
+            PedidoComercial.planta == p
+        ).delete(synchronize_session=False)
+    porciones_reemplazadas |= filtros_cultivo_planta
+    if new_mappings:
+        db.bulk_insert_mappings(PedidoComercial, new_mappings)
+        sync_export.marcar_cambio(db, PedidoComercial)
+        revincular(db, ordenes=[m["orden_num"] for m in new_mappings])
+        _anotar_semanas(results, semanas_previas | _semanas_ogl_nuevas(new_mappings))
+
+def _aplicar_delta_pedidos(db: Session, new_mappings, results):
+    """Diferencias por porción (cultivo, planta); las filas sin porción solo se insertan si su huella es nueva."""
+    porciones, sin_porcion = {}, []
+    for m in new_mappings:
+        c, p = m.get("cultivo"), m.get("planta")
+        if c and p:
+            porciones.setdefault((str(c).strip(), str(p).strip()), []).append(m)
+        else:
+            sin_porcion.append(m)
+
+    conteo = {}
+    semanas_previas = _semanas_ogl_de_porciones(db, porciones)
+    for (c, p), nuevas in porciones.items():
+        existentes = db.query(PedidoComercial.id, PedidoComercial.huella, PedidoComercial.orden_beta).filter(
+            PedidoComercial.cultivo == c,
+            PedidoComercial.planta == p
+        ).all()
+        sumar_delta(conteo, aplicar_diferencias(db, PedidoComercial, diferencias(existentes, nuevas, "orden_beta")))
+
+    if sin_porcion:
+        conocidas = {h for (h,) in db.query(PedidoComercial.huella).filter(
+            PedidoComercial.huella.in_({m["huella"] for m in sin_porcion})
+        )}
+        nuevas = [m for m in sin_porcion if m["huella"] not in conocidas]
+        sumar_delta(conteo, {"insertadas": len(nuevas), "sin_cambios": len(sin_porcion) - len(nuevas)})
+        if nuevas:
+            db.bulk_insert_mappings(PedidoComercial, nuevas)
+
+    if _hubo_cambios(conteo):
+        sync_export.marcar_cambio(db, PedidoComercial)
+        revincular(db, ordenes=[m["orden_num"] for m in new_mappings])
+        _anotar_semanas(results, semanas_previas | _semanas_ogl_nuevas(new_mappings))
+    sumar_delta(results.setdefault("delta", {}), conteo)
+
 @router.post("/pedidos/raw")
 async def sync_pedidos_raw(
-    payload: Any = Body(...), 
-    x_sync_token: str = Header(None, alias="X-Sync-Token"), 
+    payload: Any = Body(...),
+    delta: bool = Query(False, description="Aplicar solo las diferencias por porción (cultivo, planta) y devolver sus conteos"),
+    staging: bool = Query(False, description="Cargar en tabla temporal y reemplazar las porciones en una sola transacción (implica delta)"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
     db: Session = Depends(get_db)
 ):
     if isinstance(payload, str): payload = json.loads(payload)
     if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
     if not payload or len(payload) < 2: return {"status": "error", "message": "Payload vacio"}
-    
-    def clean_header(h: Any):
-        return re.sub(r'[^A-Z0-9]', '', str(h).upper()) if h else ""
 
     try:
-        new_mappings = []
-        cultivos_en_payload = set()
-
-        if isinstance(payload, list) and len(payload) > 0 and isinstance(payload[0], dict):
-            # Modo Objetos
-            for row in payload:
-                pedido_data = {}
-                for orig_key, val in row.items():
-                    c_header = clean_header(orig_key)
-                    for ex_col, db_col in PEDIDOS_MAPPING.items():
-                        if clean_header(ex_col) == c_header:
-                            if db_col not in pedido_data:
-                                pedido_data[db_col] = clean_data_value(val, db_col)
-                            break
-                if pedido_data.get("orden_beta"):
-                    new_mappings.append(pedido_data)
-                    c = pedido_data.get("cultivo")
-                    if c: cultivos_en_payload.add(c)
-        else:
-            # Modo Legado (Array de Arrays)
-            excel_headers = [clean_header(h) for h in payload[0]]
-            data_rows = payload[1:]
-            
-            mapping_indices = {}
-            for ex_col, db_col in PEDIDOS_MAPPING.items():
-                clean_target = clean_header(ex_col)
-                if clean_target in excel_headers and db_col not in mapping_indices:
-                    mapping_indices[db_col] = excel_headers.index(clean_target)
-
-            logger.info(f"Mapping indices Pedidos: {mapping_indices}")
-
-            for row in data_rows:
-                pedido_data = {db_col: clean_data_value(row[idx], db_col) for db_col, idx in mapping_indices.items() if idx < len(row)}
-                if pedido_data.get("orden_beta"):
-                    new_mappings.append(pedido_data)
-                    c = pedido_data.get("cultivo")
-                    if c:
-                        cultivos_en_payload.add(c)
-
-        # Borrado inteligente: Solo eliminamos la combinación exacta de Cultivo y Planta que estamos subiendo
-        # Esto permite subir múltiples Excels del mismo cultivo (ej. Palta Ica y Palta Litardo) sin que se borren entre sí.
-        filtros_cultivo_planta = set()
-        for m in new_mappings:
-            c = m.get("cultivo")
-            p = m.get("planta")
-            if c and p:
-                filtros_cultivo_planta.add((str(c).strip(), str(p).strip()))
-                
-        for c, p in filtros_cultivo_planta:
-            db.query(PedidoComercial).filter(
-                PedidoComercial.cultivo == c,
-                PedidoComercial.planta == p
-            ).delete(synchronize_session=False)
-        if new_mappings: 
-            db.bulk_insert_mappings(PedidoComercial, new_mappings)
-            
+        results = {"processed": 0, "errors": [], "skipped": 0, "cultivos_actualizados": set()}
+        mapeador = MapeadorFilas(RESOLUTOR_PEDIDOS)
+        crudas = mapeador.mapear(payload, results["errors"])
+        if mapeador.indices is not None:
+            logger.info(f"Mapping indices Pedidos: {mapeador.indices}")
+
+        cronometro = Cronometro()
+        _procesar_pedidos(db, crudas, results, set(), delta, staging)
         db.commit()
-        return {
-            "status": "success", 
-            "summary": {
-                "processed": len(new_mappings), 
-                "columnas_detectadas": list(mapping_indices.keys()),
-                "cultivos_actualizados": list(cultivos_en_payload), 
-                "message": "Sincronización selectiva exitosa"
-            }
+        await run_in_threadpool(actualizar_correlativos_pl, db, results)
+        pl_cache.invalidar("sincronización de pedidos")
+        summary = {
+            "processed": results["processed"],
+            "columnas_detectadas": list(dict.fromkeys(mapeador.mapeo.values())),
+            "mapeo_cabeceras": mapeador.mapeo,
+            "cultivos_actualizados": list(results["cultivos_actualizados"]),
+            "message": "Sincronización selectiva exitosa"
         }
+        if delta or staging:
+            summary["delta"] = results.get("delta", {})
+            summary.update(cronometro.metricas(mapeador.filas))
+        return {"status": "success", "summary": summary}
     except Exception as e:
         db.rollback()
         return {"status": "error", "error": str(e)}
 
+class MapeadorReportes:
+    """
+    Filas del Reporte de Embarques → {"booking", "nave_arribo"}. Mismo contrato
+    que MapeadorFilas (modo fijado por la primera fila, cabecera entre lotes).
+    """
+
+    def __init__(self):
+        self.objetos = None
+        self.indices = None  # (idx_bkg, idx_nave, idx_nave_arribo) en modo legado
+        self.filas = 0
+
+    @staticmethod
+    def _desde_objeto(row: dict):
+        row_lower = {k.strip().lower(): v for k, v in row.items()}
+        # Buscar bkg_val por llaves conocidas
+        bkg_val = str(row_lower.get("booking") or row_lower.get("reserva") or row_lower.get("nro booking") or row_lower.get("n° b/l") or "").strip().upper()
+
+        # Si no lo encuentra, buscar en TODOS los valores de la fila algo que parezca un booking
+        if bkg_val in ["NONE", "NAN", ""]:
+            for v in row.values():
+                if v and isinstance(v, str):
+                    v_up = v.strip().upper()
+                    if v_up.startswith("EBKG") or v_up.startswith("MBM"):
+                        bkg_val = v_up
+                        break
+
+        if bkg_val in ["NONE", "NAN", ""]: return None
+
+        nave = str(
+            row_lower.get("nave de arribo") or
+            row_lower.get("nave_arribo") or
+            row_lower.get("nave arribo") or
+            row_lower.get("nave_de_arribo") or
+            row_lower.get("navedearribo") or
+            ""
+        ).strip().upper()
+
+        if nave in ["NONE", "NAN", ""]:
+            nave = str(row_lower.get("nave") or "").strip().upper()
+        if nave in ["NONE", "NAN"]: nave = ""
+
+        return {"booking": bkg_val, "nave_arribo": nave}
+
+    @staticmethod
+    def _indices(cabecera):
+        headers = [str(h).strip().upper() for h in cabecera]
+        idx_bkg = -1
+        idx_nave = -1
+        idx_nave_arribo = -1
+        for i, h in enumerate(headers):
+            if "BOOKING" in h or "RESERVA" in h: idx_bkg = i
+            elif "ARRIBO" in h: idx_nave_arribo = i
+            elif "NAVE" in h: idx_nave = i
+        return idx_bkg, idx_nave, idx_nave_arribo
+
+    def _desde_fila(self, row):
+        idx_bkg, idx_nave, idx_nave_arribo = self.indices
+        if idx_bkg == -1 or idx_bkg >= len(row): return None
+        bkg = str(row[idx_bkg]).strip().upper()
+        if bkg in ["NONE", "NAN", ""]: return None
+
+        nave = ""
+        if idx_nave_arribo != -1 and idx_nave_arribo < len(row):
+            val = str(row[idx_nave_arribo]).strip().upper()
+            if val not in ["NONE", "NAN", ""]: nave = val
+
+        if not nave and idx_nave != -1 and idx_nave < len(row):
+            val = str(row[idx_nave]).strip().upper()
+            if val not in ["NONE", "NAN", ""]: nave = val
+
+        return {"booking": bkg, "nave_arribo": nave}
+
+    def mapear(self, rows, errores):
+        mappings = []
+        for row in rows:
+            if self.objetos is None:
+                self.objetos = isinstance(row, dict)
+            if not self.objetos and self.indices is None:
+                self.indices = self._indices(row)
+                continue
+            self.filas += 1
+            try:
+                m = self._desde_objeto(row) if self.objetos else self._desde_fila(row)
+            except Exception as e:
+                errores.append({"row": self.filas + 1, "error": str(e)})
+                continue
+            if m:
+                mappings.append((self.filas + 1, m))
+        return mappings
+
+def _procesar_reportes(db: Session, crudas, results, bookings_vistos: set, delta: bool = False):
+    """
+    Upsert por booking en ReporteEmbarques (sin commit). Cada booking aparece
+    una sola vez: ante repetidos en la carga gana la primera fila, y un booking
+    ya sincronizado se reemplaza completo. En delta se omiten los sin cambios.
+    """
+    filas = []
+    for nro, m in crudas:
+        if m["booking"] in bookings_vistos:
+            results["processed"] += 1  # repetido de un lote anterior del mismo stream
+            continue
+        m["nave_arribo_norm"] = normalize_vessel_name(m.get("nave_arribo")) or None
+        filas.append((nro, m))
+    bookings_vistos.update(m["booking"] for _, m in filas)
+
+    escritura = upsert_por_lotes(db, ReporteEmbarques, filas, clave="booking", delta=delta, reemplazar=True)
+    if escritura["processed"] and (not delta or _hubo_cambios(escritura["delta"])):
+        sync_export.marcar_cambio(db, ReporteEmbarques)
+        registrar_naves(db, {d.get("nave_arribo") for _, d in filas})
+        _anotar_semanas(results, semanas_de_ordenes(db, ordenes_por_booking(db, escritura["escritas"]).values()))
+    results["processed"] += escritura["processed"]
+    results["errors"].extend(escritura["errors"])
+    if delta:
+        sumar_delta(results.setdefault("delta", {}), escritura["delta"])
+
 @router.post("/reportes/embarques/raw")
 async def sync_reportes_embarques_raw(
-    payload: Any = Body(...), 
-    x_sync_token: str = Header(None, alias="X-Sync-Token"), 
+    payload: Any = Body(...),
+    delta: bool = Query(False, description="Omitir bookings sin cambios (por huella) y devolver el conteo de diferencias"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
     db: Session = Depends(get_db)
 ):
     if isinstance(payload, str): payload = json.loads(payload)
     if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
-    
+
     # Manejar modo dual (lista de objetos o lista de listas)
-    mappings = []
-    if isinstance(payload, list) and len(payload) > 0:
-        if isinstance(payload[0], dict):
-            # Modo Objetos
-            for row in payload:
-                row_lower = {k.strip().lower(): v for k, v in row.items()}
-                # Buscar bkg_val por llaves conocidas
-                bkg_val = str(row_lower.get("booking") or row_lower.get("reserva") or row_lower.get("nro booking") or row_lower.get("n° b/l") or "").strip().upper()
-                
-                # Si no lo encuentra, buscar en TODOS los valores de la fila algo que parezca un booking
-                if bkg_val in ["NONE", "NAN", ""]:
-                    for v in row.values():
-                        if v and isinstance(v, str):
-                            v_up = v.strip().upper()
-                            if v_up.startswith("EBKG") or v_up.startswith("MBM"):
-                                bkg_val = v_up
-                                break
-                
-                if bkg_val in ["NONE", "NAN", ""]: continue
-                
-                nave = str(
-                    row_lower.get("nave de arribo") or 
-                    row_lower.get("nave_arribo") or 
-                    row_lower.get("nave arribo") or
-                    row_lower.get("nave_de_arribo") or 
-                    row_lower.get("navedearribo") or 
-                    ""
-                ).strip().upper()
-                
-                if nave in ["NONE", "NAN", ""]:
-                    nave = str(row_lower.get("nave") or "").strip().upper()
-                if nave in ["NONE", "NAN"]: nave = ""
-                
-                if bkg_val: mappings.append({"booking": bkg_val, "nave_arribo": nave})
-        else:
-            # Modo Legado (Array de Arrays)
-            headers = [str(h).strip().upper() for h in payload[0]]
-            data = payload[1:]
-            idx_bkg = -1
-            idx_nave = -1
-            idx_nave_arribo = -1
-            for i, h in enumerate(headers):
-                if "BOOKING" in h or "RESERVA" in h: idx_bkg = i
-                elif "ARRIBO" in h: idx_nave_arribo = i
-                elif "NAVE" in h: idx_nave = i
-                
-            if idx_bkg != -1:
-                for row in data:
-                    if idx_bkg < len(row):
-                        bkg = str(row[idx_bkg]).strip().upper()
-                        if bkg in ["NONE", "NAN", ""]: continue
-                        
-                        nave = ""
-                        if idx_nave_arribo != -1 and idx_nave_arribo < len(row):
-                            val = str(row[idx_nave_arribo]).strip().upper()
-                            if val not in ["NONE", "NAN", ""]: nave = val
-                            
-                        if not nave and idx_nave != -1 and idx_nave < len(row):
-                            val = str(row[idx_nave]).strip().upper()
-                            if val not in ["NONE", "NAN", ""]: nave = val
-                            
-                        if bkg: mappings.append({"booking": bkg, "nave_arribo": nave})
+    results = {"processed": 0, "errors": []}
+    crudas = MapeadorReportes().mapear(payload, results["errors"]) if isinstance(payload, list) else []
 
     try:
-        if mappings:
-            # --- DEBUG LOGGING ---
-            import sys
-            print(f"DEBUG: Recibiendo {len(mappings)} mappings del Excel", file=sys.stderr)
-            for m in mappings:
-                if m.get("booking") in ["EBKG16698011", "EBKG16698031"]:
-                    print(f"DEBUG: Booking {m['booking']} -> Nave de arribo enviada: '{m.get('nave_arribo')}'", file=sys.stderr)
-            # ---------------------
-            
-            # Borrado inteligente: Solo borramos los bookings que estamos actualizando
-            # para no afectar la data de otros archivos Excel si hay múltiples
-            bookings_in_payload = [m["booking"] for m in mappings if "booking" in m]
-            if bookings_in_payload:
-                db.query(ReporteEmbarques).filter(ReporteEmbarques.booking.in_(bookings_in_payload)).delete(synchronize_session=False)
-            
-            db.bulk_insert_mappings(ReporteEmbarques, mappings)
-            
+        _procesar_reportes(db, crudas, results, set(), delta)
         db.commit()
-        return {"status": "success", "summary": {"processed": len(mappings), "message": "Reporte de embarques actualizado"}}
+        await run_in_threadpool(actualizar_correlativos_pl, db, results)
+        pl_cache.invalidar("sincronización de reporte de embarques")
+        summary = {"processed": results["processed"], "message": "Reporte de embarques actualizado"}
+        if results["errors"]:
+            summary["errors"] = sorted(results["errors"], key=lambda e: e["row"])
+        if delta:
+            summary["delta"] = results.get("delta", {})
+        return {"status": "success" if not results["errors"] else "partial_success", "summary": summary}
     except Exception as e:
         db.rollback()
         return {"status": "error", "error": str(e)}
 
+# --- Ingesta por streaming (NDJSON) ---
+# Cuerpo: una fila por línea (objeto, o arreglo de valores con la cabecera en la
+# primera línea) o un arreglo de filas por línea. Se procesa en lotes de
+# TAM_LOTE_STREAM filas con un commit por lote; el avance se consulta en
+# GET /stream/{sync_id} (id propio en X-Sync-Id o generado).
+
+TAM_LOTE_STREAM = 1000
+
+async def _ingestar_stream(request: Request, db: Session, sync_id: str, mapeador, procesar, motivo: str, results: dict):
+    sync_id = sync_id or uuid.uuid4().hex
+    cronometro = Cronometro()
+    results.update({"processed": 0, "errors": [], "skipped": 0, "lotes": 0, "filas_recibidas": 0, "errores_omitidos": 0})
+    estado, error = "COMPLETADO", None
+    publicar_progreso(sync_id, {"tipo": motivo, "estado": "EN_PROCESO", "lotes": 0, "filas_recibidas": 0, "processed": 0})
+
+    try:
+        async for lote in leer_ndjson(request.stream(), TAM_LOTE_STREAM, results["errors"]):
+            crudas = mapeador.mapear(lote, results["errors"])
+            # El trabajo de BD del lote corre fuera del event loop
+            await run_in_threadpool(procesar, crudas, results)
+            await run_in_threadpool(db.commit)
+
+            results["lotes"] += 1
+            results["filas_recibidas"] = mapeador.filas
+            if len(results["errors"]) > MAX_ERRORES:
+                results["errores_omitidos"] += len(results["errors"]) - MAX_ERRORES
+                del results["errors"][MAX_ERRORES:]
+            progreso = {k: results[k] for k in ("lotes", "filas_recibidas", "processed", "skipped")}
+            publicar_progreso(sync_id, {"tipo": motivo, "estado": "EN_PROCESO", **progreso, **cronometro.metricas(results["filas_recibidas"])})
+            logger.info(f"Stream {motivo} [{sync_id}]: lote {results['lotes']} confirmado ({results['filas_recibidas']} filas)")
+    except Exception as e:
+        db.rollback()
+        estado, error = "ERROR", str(e)
+        logger.error(f"Stream {motivo} [{sync_id}] abortado tras {results['lotes']} lotes: {e}")
+
+    if results["lotes"]:
+        await run_in_threadpool(actualizar_correlativos_pl, db, results)
+        pl_cache.invalidar(motivo)
+    results.pop("_semanas_pl", None)
+    results.update(cronometro.metricas(results["filas_recibidas"]))
+    resumen = {k: results[k] for k in ("lotes", "filas_recibidas", "processed", "skipped", "duracion_s", "filas_por_segundo")}
+    publicar_progreso(sync_id, {"tipo": motivo, "estado": estado, "error": error, **resumen, "errores": len(results["errors"]) + results["errores_omitidos"]})
+
+    if error:
+        # Los lotes ya confirmados quedan escritos; el cliente puede reenviar desde results["filas_recibidas"]
+        return {"status": "error", "sync_id": sync_id, "error": error, "summary": results}
+    return {"status": "success" if not results["errors"] else "partial_success", "sync_id": sync_id, "summary": results}
+
+@router.post("/posicionamiento/stream")
+async def sync_posicionamiento_stream(
+    request: Request,
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    x_sync_id: Optional[str] = Header(None, alias="X-Sync-Id"),
+    db: Session = Depends(get_db)
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    mapeador = MapeadorFilas(RESOLUTOR_POSICIONAMIENTO)
+    results = {"fusionadas": 0}
+    respuesta = await _ingestar_stream(
+        request, db, x_sync_id, mapeador,
+        lambda crudas, res: _procesar_posicionamiento(db, crudas, res),
+        "sincronización de posicionamiento", results,
+    )
+    results["mapeo_cabeceras"] = mapeador.mapeo
+    return respuesta
+
+@router.post("/pedidos/stream")
+async def sync_pedidos_stream(
+    request: Request,
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    x_sync_id: Optional[str] = Header(None, alias="X-Sync-Id"),
+    db: Session = Depends(get_db)
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    mapeador = MapeadorFilas(RESOLUTOR_PEDIDOS)
+    porciones = set()
+    results = {"cultivos_actualizados": set()}
+    respuesta = await _ingestar_stream(
+        request, db, x_sync_id, mapeador,
+        lambda crudas, res: _procesar_pedidos(db, crudas, res, porciones),
+        "sincronización de pedidos", results,
+    )
+    results["cultivos_actualizados"] = list(results["cultivos_actualizados"])
+    results["mapeo_cabeceras"] = mapeador.mapeo
+    return respuesta
+
+@router.post("/reportes/embarques/stream")
+async def sync_reportes_embarques_stream(
+    request: Request,
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    x_sync_id: Optional[str] = Header(None, alias="X-Sync-Id"),
+    db: Session = Depends(get_db)
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    vistos = set()
+    return await _ingestar_stream(
+        request, db, x_sync_id, MapeadorReportes(),
+        lambda crudas, res: _procesar_reportes(db, crudas, res, vistos),
+        "sincronización de reporte de embarques", {},
+    )
+
+@router.get("/stream/{sync_id}")
+def progreso_stream(sync_id: str, x_sync_token: str = Header(None, alias="X-Sync-Token")):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    progreso = consultar_progreso(sync_id)
+    if progreso is None:
+        raise HTTPException(status_code=404, detail="Carga no encontrada")
+    return progreso
+
+# --- Sincronización asíncrona (cola con claves de idempotencia) ---
+# POST /{destino}/jobs acepta el mismo cuerpo que /raw más la cabecera
+# Idempotency-Key y responde 202 con el job_id; un reintento con la misma clave
+# devuelve ese trabajo (200) sin reprocesarlo. La clave se persiste
+# (sync_claves_idempotencia), así que el reintento se reconoce también tras un
+# reinicio; un trabajo que el reinicio dejó a medias se informa como ERROR y el
+# reintento lo reprocesa. El worker escribe en lotes de TAM_LOTE_STREAM con un
+# commit por lote. Estado en GET /jobs/{id} y filas con error en
+# GET /jobs/{id}/errores (solo mientras el trabajo siga en memoria; si no, 410).
+
+def _ejecutar_sync(trabajo: sync_jobs.TrabajoSync, cuerpo: bytes, mapeador, procesar, motivo: str, results: dict, por_lote: bool = True):
+    """Procesa en el pool de sync_jobs un cuerpo /raw completo; devuelve el resumen del trabajo."""
+    payload = json.loads(cuerpo)
+    if isinstance(payload, str): payload = json.loads(payload)
+    if not isinstance(payload, list) or not payload:
+        raise ValueError("Payload vacio")
+
+    cronometro = Cronometro()
+    results.update({"processed": 0, "errors": trabajo.errores, "skipped": 0, "lotes": 0})
+    tam_lote = TAM_LOTE_STREAM if por_lote else len(payload)
+    db = SessionLocal()
+    try:
+        for inicio in range(0, len(payload), tam_lote):
+            crudas = mapeador.mapear(payload[inicio:inicio + tam_lote], results["errors"])
+            procesar(db, crudas, results)
+            db.commit()
+            results["lotes"] += 1
+            trabajo.avanzar(
+                min(99, (inicio + tam_lote) * 100 // len(payload)),
+                f"Lote {results['lotes']} confirmado ({mapeador.filas} filas)",
+            )
+        actualizar_correlativos_pl(db, results)
+        pl_cache.invalidar(motivo)
+    except Exception as e:
+        db.rollback()
+        # Los lotes ya confirmados quedan escritos; reintentar con la misma clave reprocesa todo
+        raise RuntimeError(f"Abortada tras {results['lotes']} lotes confirmados ({mapeador.filas} filas leídas): {e}") from e
+    finally:
+        db.close()
+
+    trabajo.errores.sort(key=lambda e: e["row"])
+    del results["errors"]
+    results["errores"] = len(trabajo.errores)
+    results["filas_recibidas"] = mapeador.filas
+    results.update(cronometro.metricas(mapeador.filas))
+    logger.info(f"Sync job {trabajo.tipo} [{trabajo.id}]: {results['processed']} filas en {results['duracion_s']}s")
+    return results
+
+async def _encolar_sync(request: Request, response: Response, clave: Optional[str], tipo: str, tarea, *opciones):
+    if not clave or not clave.strip():
+        raise HTTPException(status_code=400, detail="Falta la cabecera Idempotency-Key")
+    if len(clave.strip()) > sync_jobs.LARGO_MAXIMO_CLAVE:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key supera {sync_jobs.LARGO_MAXIMO_CLAVE} caracteres")
+    cuerpo = await request.body()
+    trabajo, nuevo = await run_in_threadpool(
+        sync_jobs.encolar, tipo, clave.strip(), sync_jobs.huella_envio(cuerpo, *opciones),
+        lambda t: tarea(t, cuerpo), descripcion=f"{len(cuerpo)} bytes",
+    )
+    response.status_code = status.HTTP_202_ACCEPTED if nuevo else status.HTTP_200_OK
+    return {**trabajo.to_dict(), "reintento": not nuevo}
+
+@router.post("/posicionamiento/jobs", status_code=202)
+async def encolar_sync_posicionamiento(
+    request: Request,
+    response: Response,
+    delta: bool = Query(False, description="Omitir filas sin cambios (por huella)"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+
+    def tarea(trabajo, cuerpo):
+        results = {"fusionadas": 0}
+        mapeador = MapeadorFilas(RESOLUTOR_POSICIONAMIENTO)
+        _ejecutar_sync(
+            trabajo, cuerpo, mapeador,
+            lambda db, crudas, res: _procesar_posicionamiento(db, crudas, res, delta),
+            "sincronización de posicionamiento", results,
+        )
+        results["mapeo_cabeceras"] = mapeador.mapeo
+        return results
+
+    return await _encolar_sync(request, response, idempotency_key, "SYNC_POSICIONAMIENTO", tarea, delta)
+
+@router.post("/pedidos/jobs", status_code=202)
+async def encolar_sync_pedidos(
+    request: Request,
+    response: Response,
+    delta: bool = Query(False, description="Aplicar solo las diferencias por porción (cultivo, planta)"),
+    staging: bool = Query(False, description="Reemplazar las porciones vía tabla temporal (implica delta)"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+
+    def tarea(trabajo, cuerpo):
+        results = {"cultivos_actualizados": set()}
+        mapeador = MapeadorFilas(RESOLUTOR_PEDIDOS)
+        porciones = set()
+        # delta/staging comparan cada porción completa: no se puede partir en lotes
+        _ejecutar_sync(
+            trabajo, cuerpo, mapeador,
+            lambda db, crudas, res: _procesar_pedidos(db, crudas, res, porciones, delta, staging),
+            "sincronización de pedidos", results, por_lote=not (delta or staging),
+        )
+        results["cultivos_actualizados"] = list(results["cultivos_actualizados"])
+        results["mapeo_cabeceras"] = mapeador.mapeo
+        return results
+
+    return await _encolar_sync(request, response, idempotency_key, "SYNC_PEDIDOS", tarea, delta, staging)
+
+@router.post("/reportes/embarques/jobs", status_code=202)
+async def encolar_sync_reportes_embarques(
+    request: Request,
+    response: Response,
+    delta: bool = Query(False, description="Omitir bookings sin cambios (por huella)"),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+
+    def tarea(trabajo, cuerpo):
+        vistos = set()
+        return _ejecutar_sync(
+            trabajo, cuerpo, MapeadorReportes(),
+            lambda db, crudas, res: _procesar_reportes(db, crudas, res, vistos, delta),
+            "sincronización de reporte de embarques", {},
+        )
+
+    return await _encolar_sync(request, response, idempotency_key, "SYNC_REPORTES_EMBARQUES", tarea, delta)
+
+@router.get("/jobs/{job_id}")
+def estado_sync_job(job_id: str, x_sync_token: str = Header(None, alias="X-Sync-Token")):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    return sync_jobs.obtener(job_id).to_dict()
+
+@router.get("/jobs/{job_id}/errores")
+def errores_sync_job(
+    job_id: str,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(MAX_ERRORES, ge=1, le=5000),
+    x_sync_token: str = Header(None, alias="X-Sync-Token"),
+):
+    if not x_sync_token or x_sync_token != settings.SYNC_TOKEN: raise HTTPException(status_code=401)
+    return sync_jobs.errores(job_id, offset, limit)
+
+# --- Exportación (/list) ---
+# Sin parámetros: arreglo JSON completo (contrato original), ahora en streaming.
+# ?limite=N → página JSON {"items", "siguiente", "version"}; se sigue con
+# ?despues_de=<siguiente>. ?formato=csv|arrow|parquet → descarga en streaming
+# (acepta también despues_de/limite). ETag por versión de tabla: con
+# If-None-Match vigente se responde 304 sin leer filas.
+
+def _listar(db: Session, modelo, formato: str, despues_de: int, limite: Optional[int], if_none_match: Optional[str]):
+    version = sync_export.version_tabla(db, modelo)
+    etiqueta = sync_export.etag(modelo, version, formato, despues_de, limite)
+    cabeceras = {"ETag": etiqueta, "Cache-Control": "no-cache", "X-Table-Version": str(version)}
+    if sync_export.coincide_etag(if_none_match, etiqueta):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=cabeceras)
+
+    if formato == "json" and limite is not None:
+        return JSONResponse({**sync_export.pagina(db, modelo, despues_de, limite), "version": version}, headers=cabeceras)
+    if formato != "json":
+        cabeceras["Content-Disposition"] = f"attachment; filename={modelo.__tablename__}.{formato}"
+    return StreamingResponse(
+        sync_export.exportar(modelo, formato, despues_de, limite),
+        media_type=sync_export.MEDIA_TYPES[formato], headers=cabeceras,
+    )
+
+FORMATO_LIST = Query("json", pattern="^(json|csv|arrow|parquet)$", description="json | csv | arrow | parquet")
+DESPUES_DE_LIST = Query(0, ge=0, description="Cursor: devolver filas con id mayor a este")
+LIMITE_LIST = Query(None, ge=1, le=50000, description="Filas por página (JSON paginado); sin él, toda la tabla")
+
 @router.get("/posicionamiento/list")
-def list_posicionamiento(db: Session = Depends(get_db)):
-    return db.query(Posicionamiento).all()
+def list_posicionamiento(
+    formato: str = FORMATO_LIST,
+    despues_de: int = DESPUES_DE_LIST,
+    limite: Optional[int] = LIMITE_LIST,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+):
+    return _listar(db, Posicionamiento, formato, despues_de, limite, if_none_match)
 
 @router.get("/pedidos/list")
-def list_pedidos(db: Session = Depends(get_db)):
-    return db.query(PedidoComercial).all()
+def list_pedidos(
+    formato: str = FORMATO_LIST,
+    despues_de: int = DESPUES_DE_LIST,
+    limite: Optional[int] = LIMITE_LIST,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+):
+    return _listar(db, PedidoComercial, formato, despues_de, limite, if_none_match)
 
 @router.get("/reportes/embarques/list")
-def list_reportes_embarques(db: Session = Depends(get_db)):
-    return db.query(ReporteEmbarques).all()
+def list_reportes_embarques(
+    formato: str = FORMATO_LIST,
+    despues_de: int = DESPUES_DE_LIST,
+    limite: Optional[int] = LIMITE_LIST,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    db: Session = Depends(get_db),
+):
+    return _listar(db, ReporteEmbarques, formato, despues_de, limite, if_none_match)
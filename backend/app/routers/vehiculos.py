@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import BaseModel, condecimal
@@ -7,6 +8,7 @@ from decimal import Decimal
 
 from app.database import get_db
 from app.models.maestros import VehiculoTracto, VehiculoCarreta, Transportista
+from app.utils.formatters import normalize_plate
 from app.utils.logging import logger
 
 router = APIRouter(
@@ -74,6 +76,16 @@ class PaginatedCarretaResponse(BaseModel):
     size: int
     total_pages: int
 
+def _placa_registrada(model, placa: str, db: Session, excluir_id: Optional[int] = None):
+    """Vehículo con la misma placa normalizada (búsqueda por el índice único de placa_norm)."""
+    placa_norm = normalize_plate(placa)
+    if not placa_norm:
+        return None
+    query = db.query(model).filter(model.placa_norm == placa_norm)
+    if excluir_id is not None:
+        query = query.filter(model.id != excluir_id)
+    return query.first()
+
 # --- ENDPOINTS TRACTOS ---
 
 @router.get("/tractos", response_model=PaginatedTractoResponse)
@@ -123,10 +135,7 @@ def list_tractos(
 @router.post("/tractos", response_model=TractoResponse)
 def create_tracto(data: TractoCreate, db: Session = Depends(get_db)):
     # Validar duplicado
-    from app.routers.maestros import clean_plate
-    clean_new_plate = clean_plate(data.placa_tracto)
-    all_tractos = db.query(VehiculoTracto).all()
-    existing = next((v for v in all_tractos if clean_plate(v.placa_tracto) == clean_new_plate), None)
+    existing = _placa_registrada(VehiculoTracto, data.placa_tracto, db)
     if existing:
         raise HTTPException(status_code=400, detail=f"La placa {data.placa_tracto} ya está registrada")
     
@@ -138,7 +147,12 @@ def create_tracto(data: TractoCreate, db: Session = Depends(get_db)):
     new_v = VehiculoTracto(**data.model_dump())
     new_v.placa_tracto = data.placa_tracto.upper()
     db.add(new_v)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra solicitud registró la misma placa entre la validación y el commit (índice único de placa_norm)
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"La placa {data.placa_tracto} ya está registrada")
     db.refresh(new_v)
     return new_v
 
@@ -190,10 +204,7 @@ def list_carretas(
 @router.post("/carretas", response_model=CarretaResponse)
 def create_carreta(data: CarretaCreate, db: Session = Depends(get_db)):
     # Validar duplicado
-    from app.routers.maestros import clean_plate
-    clean_new_plate = clean_plate(data.placa_carreta)
-    all_carretas = db.query(VehiculoCarreta).all()
-    existing = next((v for v in all_carretas if clean_plate(v.placa_carreta) == clean_new_plate), None)
+    existing = _placa_registrada(VehiculoCarreta, data.placa_carreta, db)
     if existing:
         raise HTTPException(status_code=400, detail=f"La placa {data.placa_carreta} ya está registrada")
     
@@ -205,7 +216,12 @@ def create_carreta(data: CarretaCreate, db: Session = Depends(get_db)):
     new_v = VehiculoCarreta(**data.model_dump())
     new_v.placa_carreta = data.placa_carreta.upper()
     db.add(new_v)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        # Otra solicitud registró la misma placa entre la validación y el commit (índice único de placa_norm)
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"La placa {data.placa_carreta} ya está registrada")
     db.refresh(new_v)
     return new_v
 
@@ -257,10 +273,21 @@ def update_vehiculo(tipo: str, id: int, data: dict, db: Session = Depends(get_db
     if not v:
         raise HTTPException(status_code=404, detail="Vehículo no encontrado")
     
+    campo_placa = "placa_tracto" if tipo == "tracto" else "placa_carreta"
+    nueva_placa = data.get(campo_placa)
+    if nueva_placa and _placa_registrada(model, nueva_placa, db, excluir_id=id):
+        raise HTTPException(status_code=400, detail=f"La placa {nueva_placa} ya está registrada")
+
     for key, value in data.items():
-        if hasattr(v, key):
+        if hasattr(v, key) and key != "placa_norm":
             setattr(v, key, value)
+    placa = getattr(v, campo_placa)
+    v.placa_norm = normalize_plate(placa) or None
     
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=f"La placa {placa} ya está registrada")
     db.refresh(v)
     return v
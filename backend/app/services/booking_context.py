@@ -0,0 +1,73 @@
+"""
+Servicio: Contexto de Bookings para Packing List
+Carga en un número FIJO de consultas (una por tabla) todo lo que la generación
+del Packing List necesita por booking: Posicionamiento, Pedido Comercial del
+cliente, Control de Embarque y Reporte de Embarques. Cabecera, grilla y
+auditoría consultan este mapa en memoria en lugar de ir a la BD por booking.
+Autor: AgroFlow Dev Team
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.embarque import ControlEmbarque, ReporteEmbarques
+from app.models.pedido import PedidoComercial
+from app.models.posicionamiento import Posicionamiento
+from app.services.booking_pedido import pedidos_por_booking
+
+
+@dataclass
+class BookingContext:
+    """Mapa en memoria booking → datos maestros asociados."""
+    posicionamientos: Dict[str, Posicionamiento] = field(default_factory=dict)
+    pedidos: Dict[str, PedidoComercial] = field(default_factory=dict)
+    embarques: Dict[str, ControlEmbarque] = field(default_factory=dict)
+    reportes: Dict[str, ReporteEmbarques] = field(default_factory=dict)
+
+    def pos(self, booking: str) -> Optional[Posicionamiento]:
+        return self.posicionamientos.get(booking)
+
+    def pedido(self, booking: str) -> Optional[PedidoComercial]:
+        return self.pedidos.get(booking)
+
+    def embarque(self, booking: str) -> Optional[ControlEmbarque]:
+        return self.embarques.get(booking)
+
+    def nave_arribo(self, booking: str) -> Optional[str]:
+        rep = self.reportes.get(booking)
+        return rep.nave_arribo if rep and rep.nave_arribo else None
+
+    @classmethod
+    def cargar(cls, db: Session, bookings: Iterable[str], cliente_keyword: Optional[str] = None) -> "BookingContext":
+        """
+        Resuelve el contexto de todos los bookings con 4 consultas set-based.
+        Si se indica `cliente_keyword`, solo se consideran pedidos de ese cliente (ej. OGL).
+        Ante duplicados se conserva el registro de menor id (equivalente estable a `.first()`).
+        """
+        ctx = cls()
+        bookings = sorted({b for b in bookings if b})
+        if not bookings:
+            return ctx
+
+        # 1. Posicionamiento
+        for pos in db.query(Posicionamiento).filter(Posicionamiento.BOOKING.in_(bookings)).all():
+            ctx.posicionamientos[pos.BOOKING] = pos
+
+        # 2. Pedido comercial por booking (vínculo booking → pedido, igualdad indexada)
+        ctx.pedidos = pedidos_por_booking(db, ctx.posicionamientos, cliente_keyword)
+
+        # 3. Control de embarque (contenedor / DAM)
+        for emb in db.query(ControlEmbarque).filter(
+            ControlEmbarque.booking.in_(bookings)
+        ).order_by(ControlEmbarque.id.desc()).all():
+            ctx.embarques[emb.booking] = emb
+
+        # 4. Reporte de embarques (nave de arribo; booking único)
+        for rep in db.query(ReporteEmbarques).filter(
+            ReporteEmbarques.booking.in_(bookings)
+        ).all():
+            ctx.reportes[rep.booking] = rep
+
+        return ctx
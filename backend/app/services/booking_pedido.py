@@ -0,0 +1,95 @@
+"""
+Servicio: Vínculo booking → pedido comercial
+Resuelve una sola vez, en la sincronización, qué pedidos corresponden a cada
+booking, en lugar de que PL, instrucciones y el correlativo normalicen órdenes
+en Python o busquen con `ilike('%orden')` (que no usa índices).
+
+- Posicionamiento y PedidoComercial guardan la orden normalizada (`orden_num`,
+  ver normalize_orden_beta) y el cultivo normalizado (`cultivo_key`), con un
+  índice compuesto (orden_num, cultivo_key) en ambas tablas.
+- Un booking se vincula con los pedidos de su misma orden y, si el
+  posicionamiento tiene cultivo, del mismo cultivo. Sin cultivo: todos los de
+  la orden.
+- `revincular` rehace solo los vínculos de las órdenes y bookings que tocó
+  una sincronización, en la misma transacción que la escritura de los datos;
+  `pedidos_por_booking` consulta la tabla por igualdad.
+Autor: AgroFlow Dev Team
+"""
+
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, delete, insert, or_, select
+from sqlalchemy.orm import Query, Session
+
+from app.models.pedido import BookingPedido, PedidoComercial
+from app.models.posicionamiento import Posicionamiento
+
+
+TAM_LOTE = 1000
+
+
+def revincular(db: Session, ordenes: Iterable[str] = (), bookings: Iterable[str] = ()) -> int:
+    """
+    Rehace los vínculos de las órdenes (`orden_num`) y bookings indicados, con
+    los datos ya escritos en la transacción del llamador (sin commit). Un
+    booking se resuelve por su orden actual: se borran sus vínculos anteriores
+    y se recalculan los de todos los bookings de esa orden. Los de pedidos
+    borrados ya los quitó el ON DELETE CASCADE. Devuelve los vínculos creados.
+    """
+    pos, ped = Posicionamiento.__table__, PedidoComercial.__table__
+    ordenes = {o for o in ordenes if o}
+    bookings = sorted({b for b in bookings if b})
+    for inicio in range(0, len(bookings), TAM_LOTE):
+        parte = bookings[inicio:inicio + TAM_LOTE]
+        ordenes.update(o for (o,) in db.execute(
+            select(pos.c.orden_num).where(pos.c.booking.in_(parte), pos.c.orden_num.isnot(None)).distinct()
+        ))
+        db.execute(delete(BookingPedido).where(BookingPedido.booking.in_(parte)))
+
+    ordenes = sorted(ordenes)
+    creados = 0
+    for inicio in range(0, len(ordenes), TAM_LOTE):
+        parte = ordenes[inicio:inicio + TAM_LOTE]
+        db.execute(delete(BookingPedido).where(
+            BookingPedido.pedido_id.in_(select(ped.c.id).where(ped.c.orden_num.in_(parte)))
+        ))
+        pares = select(pos.c.booking, ped.c.id).select_from(
+            pos.join(ped, and_(
+                ped.c.orden_num == pos.c.orden_num,
+                or_(pos.c.cultivo_key.is_(None), ped.c.cultivo_key == pos.c.cultivo_key),
+            ))
+        ).where(pos.c.orden_num.in_(parte))
+        creados += db.execute(insert(BookingPedido).from_select(["booking", "pedido_id"], pares)).rowcount
+    return creados
+
+
+def pedidos_de_booking(db: Session, booking: str) -> Query:
+    """Pedidos vinculados a `booking`, por id (Query: el llamador puede agregar filtros, ej. planta)."""
+    return db.query(PedidoComercial).join(
+        BookingPedido, BookingPedido.pedido_id == PedidoComercial.id
+    ).filter(BookingPedido.booking == booking).order_by(PedidoComercial.id)
+
+
+def pedidos_por_booking(
+    db: Session, bookings: Optional[Iterable[str]] = None, cliente_keyword: Optional[str] = None
+) -> Dict[str, PedidoComercial]:
+    """
+    {booking: pedido} con una consulta por igualdad sobre booking_pedido. Ante
+    varios pedidos gana el de menor id. `bookings=None` → todos los vinculados;
+    `cliente_keyword` restringe a pedidos de ese cliente (ej. OGL).
+    """
+    query = db.query(BookingPedido.booking, PedidoComercial).join(
+        PedidoComercial, PedidoComercial.id == BookingPedido.pedido_id
+    )
+    if bookings is not None:
+        bookings = sorted({b for b in bookings if b})
+        if not bookings:
+            return {}
+        query = query.filter(BookingPedido.booking.in_(bookings))
+    if cliente_keyword:
+        query = query.filter(PedidoComercial.cliente.ilike(f"%{cliente_keyword}%"))
+
+    resultado: Dict[str, PedidoComercial] = {}
+    for booking, pedido in query.order_by(PedidoComercial.id).all():
+        resultado.setdefault(booking, pedido)
+    return resultado
@@ -0,0 +1,200 @@
+"""
+Servicio: Parser de Confirmaciones OGL
+Lee cada archivo de confirmación UNA sola vez (openpyxl en modo read-only),
+detecta la fila de cabecera y devuelve los datos por columnas para que el
+pre-scan de bookings/órdenes y la carga de pallets trabajen sobre la misma
+estructura en memoria.
+Autor: AgroFlow Dev Team
+"""
+
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Set
+import io
+import itertools
+
+import openpyxl
+import pandas as pd
+
+# Filas en las que se busca la cabecera (mismo criterio que el flujo original)
+MAX_FILAS_CABECERA = 20
+
+# Palabras clave por campo lógico del Packing List (el orden define la prioridad)
+COLUMNAS_CONFIRMACION: Dict[str, List[str]] = {
+    "pallet":       ["PALLET", "HU", "ID PALLET"],
+    "booking":      ["BOOKING", "DESPACHO"],
+    "orden_beta":   ["ORDEN BETA", "ORDEN"],
+    "calibre":      ["CALIBRE", "CALIDAD"],
+    "kilos":        ["KILOS", "PESO NETO", "NET"],
+    "cosecha":      ["COSECHA", "HARVEST", "FECHA COSECHA"],
+    "proceso":      ["PROCESO", "PROCESS", "FECHA PROCESO"],
+    "lote_ogl":     ["LOTE CLIENTE (OGL)", "LOTE OGL", "CLIENT LOT"],
+    "cajas":        ["TOTAL DE CAJAS", "CAJAS", "BOXES", "QTY"],
+    "total_kilos":  ["TOTAL KILOS", "NET WEIGHT", "PESO NETO TOTAL"],
+    "trazabilidad": ["CODIGO TRAZABILIDAD", "TRAZABILIDAD", "TRACEABILITY"],
+}
+
+
+def es_vacio(val: Any) -> bool:
+    """Equivalente a `pd.isna` para celdas leídas directamente con openpyxl."""
+    if val is None:
+        return True
+    if isinstance(val, float) and val != val:
+        return True
+    return False
+
+
+def texto_celda(val: Any) -> str:
+    """Convierte una celda a texto limpio ("" si está vacía)."""
+    if es_vacio(val):
+        return ""
+    if isinstance(val, float) and val.is_integer():
+        # Evita IDs tipo "123456.0" cuando Excel guarda el número como flotante
+        return str(int(val))
+    return str(val).strip()
+
+
+def format_date_ogl(val: Any) -> str:
+    """Normaliza fechas de cosecha/proceso al formato DD/MM/YYYY del PL."""
+    if es_vacio(val) or str(val).strip() == "":
+        return ""
+    if isinstance(val, (datetime, date)):
+        return val.strftime("%d/%m/%Y")
+    try:
+        dt = pd.to_datetime(str(val).strip())
+        return dt.strftime("%d/%m/%Y")
+    except Exception:
+        raw_str = str(val).strip()
+        if " " in raw_str:
+            raw_str = raw_str.split(" ")[0]
+        if "-" in raw_str and len(raw_str.split("-")[0]) == 4:
+            parts = raw_str.split("-")
+            if len(parts) == 3:
+                return f"{parts[2]}/{parts[1]}/{parts[0]}"
+        return raw_str
+
+
+def _fila_con_datos(fila: Iterable[Any]) -> bool:
+    return any(not es_vacio(v) and str(v).strip() != "" for v in fila)
+
+
+def _es_fila_cabecera(fila: Iterable[Any]) -> bool:
+    for val in fila:
+        if es_vacio(val):
+            continue
+        txt = str(val).upper()
+        if "PALLET" in txt or "HU" in txt:
+            return True
+    return False
+
+
+def _nombres_columnas(fila_cabecera: List[Any]) -> List[str]:
+    """Nombres de columna en MAYÚSCULAS, desambiguando duplicados como pandas (X, X.1)."""
+    nombres: List[str] = []
+    vistos: Dict[str, int] = {}
+    for idx, val in enumerate(fila_cabecera):
+        base = str(val).strip().upper() if not es_vacio(val) else f"UNNAMED: {idx}"
+        if base in vistos:
+            vistos[base] += 1
+            nombre = f"{base}.{vistos[base]}"
+        else:
+            vistos[base] = 0
+            nombre = base
+        nombres.append(nombre)
+    return nombres
+
+
+@dataclass
+class ConfirmacionOGL:
+    """Contenido de un archivo de confirmación, organizado por columnas."""
+    archivo: str
+    columnas: List[str]
+    valores: Dict[str, List[Any]]
+    total_filas: int
+    campos: Dict[str, Optional[str]] = field(default_factory=dict)
+
+    def find_col(self, keywords: List[str]) -> Optional[str]:
+        """Primera columna cuyo nombre contiene alguna de las palabras clave."""
+        for col in self.columnas:
+            for kw in keywords:
+                if kw.upper() in col:
+                    return col
+        return None
+
+    def columna(self, campo: str) -> List[Any]:
+        """Valores del campo lógico (lista de None si la columna no existe)."""
+        col = self.campos.get(campo)
+        if not col:
+            return [None] * self.total_filas
+        return self.valores[col]
+
+    def valores_por_keyword(self, keywords: List[str]) -> List[Any]:
+        """Valores no vacíos de TODAS las columnas que contienen alguna palabra clave."""
+        out: List[Any] = []
+        for col in self.columnas:
+            if any(kw in col for kw in keywords):
+                out.extend(v for v in self.valores[col] if not es_vacio(v))
+        return out
+
+    def bookings(self) -> Set[str]:
+        """Bookings declarados en el archivo (pre-scan)."""
+        res: Set[str] = set()
+        for v in self.valores_por_keyword(["BOOKING", "DESPACHO"]):
+            val = texto_celda(v).upper()
+            if val and val != "NAN":
+                res.add(val)
+        return res
+
+
+def parse_confirmacion(contenido: bytes, archivo: str = "") -> ConfirmacionOGL:
+    """
+    Abre el libro una sola vez en modo streaming y arma las columnas.
+    Replica el criterio original: cabecera = primera fila (de las 20 primeras)
+    que mencione PALLET/HU; si no hay ninguna se usa la primera fila.
+    """
+    wb = openpyxl.load_workbook(io.BytesIO(contenido), read_only=True, data_only=True)
+    try:
+        ws = wb.worksheets[0]
+        filas = ws.iter_rows(values_only=True)
+
+        buffer: List[tuple] = []
+        header_index = None
+        for fila in filas:
+            if not _fila_con_datos(fila):
+                continue
+            buffer.append(fila)
+            if _es_fila_cabecera(fila):
+                header_index = len(buffer) - 1
+                break
+            if len(buffer) >= MAX_FILAS_CABECERA:
+                break
+        if header_index is None:
+            header_index = 0
+
+        if not buffer:
+            return ConfirmacionOGL(archivo=archivo, columnas=[], valores={}, total_filas=0)
+
+        cabecera = list(buffer[header_index])
+        columnas = _nombres_columnas(cabecera)
+        valores: Dict[str, List[Any]] = {c: [] for c in columnas}
+        total = 0
+
+        # Volcado columnar directo desde el stream (sin materializar filas intermedias).
+        # pandas descarta filas totalmente vacías; mantenemos el mismo comportamiento.
+        for fila in itertools.chain(buffer[header_index + 1:], filas):
+            if not _fila_con_datos(fila):
+                continue
+            if len(fila) > len(columnas):
+                for idx in range(len(columnas), len(fila)):
+                    nombre = f"UNNAMED: {idx}"
+                    columnas.append(nombre)
+                    valores[nombre] = [None] * total
+            for idx, col in enumerate(columnas):
+                valores[col].append(fila[idx] if idx < len(fila) else None)
+            total += 1
+    finally:
+        wb.close()
+
+    conf = ConfirmacionOGL(archivo=archivo, columnas=columnas, valores=valores, total_filas=total)
+    conf.campos = {campo: conf.find_col(kws) for campo, kws in COLUMNAS_CONFIRMACION.items()}
+    return conf
@@ -0,0 +1,330 @@
+"""
+Servicio: Datos de captura LogiCapture en una sola llamada
+Al capturar un contenedor la pantalla consultaba en secuencia /lookup, /driver,
+/vehicle, /trailer y varios /check_unique: una conexión del pool y un viaje de
+red desde planta por cada uno. `resolver_captura` arma la misma información en
+un request, en dos ramas independientes que corren en paralelo, cada una con
+su propia sesión:
+
+- Booking: posicionamiento + control de embarque (1 consulta) y unicidad de
+  booking, DAM y contenedor en logicapture_registros (1 consulta).
+- Transporte: chofer por DNI, tracto (con su transportista) y carreta por
+  placa_norm; 3 búsquedas por índice.
+
+Los payloads son los mismos de los endpoints individuales (que también los
+arman aquí), más el resumen de documentos vencidos.
+
+`validar_captura` resuelve la unicidad de una captura completa (booking, DAM,
+contenedor y todos sus precintos/termógrafos) con una consulta por tabla, en
+lugar de un /check_unique por código.
+Autor: AgroFlow Dev Team
+"""
+
+import asyncio
+from datetime import date
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
+
+from app.database import SessionLocal
+from app.models.embarque import ControlEmbarque
+from app.models.logicapture import LogiCaptureDetalle, LogiCaptureRegistro
+from app.models.maestros import Chofer, VehiculoCarreta, VehiculoTracto
+from app.models.posicionamiento import Posicionamiento
+from app.utils.formatters import clean_booking, clean_container, clean_dni, clean_plate, normalize_plate
+
+# Valores de relleno que /check_unique no considera duplicados
+VALORES_SIN_VALIDAR = {"**", "***", "****", "-", "S/P", "N/A", "PENDIENTE", ""}
+
+
+# ---------------------------------------------------------------------------
+# Payloads (compartidos con /lookup, /driver, /vehicle y /trailer)
+# ---------------------------------------------------------------------------
+def _vencimiento(fecha: Optional[date], hoy: date) -> Tuple[Optional[str], bool]:
+    if not fecha:
+        return None, False
+    return fecha.isoformat(), fecha < hoy
+
+
+def payload_booking(booking: str, pos: Posicionamiento, ctrl: Optional[ControlEmbarque]) -> Dict[str, Any]:
+    return {
+        "booking": booking,
+        "orden_beta": pos.ORDEN_BETA or "PENDIENTE",
+        "planta": pos.PLANTA_LLENADO,
+        "cultivo": pos.CULTIVO,
+        "dam": ctrl.dam if ctrl else None,
+        "contenedor": ctrl.contenedor if ctrl else None,
+        "status": "success",
+        # New fields for premium pre-fill
+        "naviera": pos.NAVIERA,
+        "nave": pos.NAVE,
+        "temperatura": pos.TEMPERATURA,
+        "ventilacion": pos.VENTILACION,
+        "humedad": pos.HUMEDAD,
+        "ac": pos.AC,
+        "ct": pos.CT,
+        "filtros": pos.FILTROS,
+        "tipo_tecnologia": getattr(pos, 'TIPO_TECNOLOGIA', None)
+    }
+
+
+def payload_chofer(driver: Chofer, hoy: Optional[date] = None) -> Dict[str, Any]:
+    venc_lic_str, licencia_vencida = _vencimiento(driver.vencimiento_licencia, hoy or date.today())
+    return {
+        "dni": driver.dni,
+        "nombres": driver.nombres,
+        "apellido_paterno": driver.apellido_paterno,
+        "apellido_materno": driver.apellido_materno,
+        "licencia": driver.licencia,
+        "nombre_operativo": driver.nombre_operativo,
+        "estado": driver.estado,
+        "vencimiento_licencia": venc_lic_str,
+        "licencia_vencida": licencia_vencida
+    }
+
+
+def payload_tracto(vehicle: VehiculoTracto, hoy: Optional[date] = None) -> Dict[str, Any]:
+    hoy = hoy or date.today()
+    venc_tarjeta_str, tarjeta_circulacion_vencida = _vencimiento(vehicle.vencimiento_tarjeta_circulacion, hoy)
+    venc_soat_str, soat_vencido = _vencimiento(vehicle.vencimiento_soat, hoy)
+    transportista = vehicle.transportista
+    return {
+        "placa": vehicle.placa_tracto,
+        "marca": vehicle.marca,
+        "transportista": transportista.nombre_transportista if transportista else "S/N",
+        "ruc_transportista": transportista.ruc if transportista else None,
+        "codigo_sap": transportista.codigo_sap if transportista else None,
+        "partida_registral": transportista.partida_registral if transportista else None,
+        "configuracion_vehicular": vehicle.certificado_vehicular_tracto,
+        "peso_neto": vehicle.peso_neto_tracto,
+        "numero_ejes": vehicle.numero_ejes,
+        "vencimiento_tarjeta_circulacion": venc_tarjeta_str,
+        "tarjeta_circulacion_vencida": tarjeta_circulacion_vencida,
+        "vencimiento_soat": venc_soat_str,
+        "soat_vencido": soat_vencido
+    }
+
+
+def payload_carreta(trailer: VehiculoCarreta, hoy: Optional[date] = None) -> Dict[str, Any]:
+    hoy = hoy or date.today()
+    venc_tarjeta_str, tarjeta_circulacion_vencida = _vencimiento(trailer.vencimiento_tarjeta_circulacion, hoy)
+    venc_soat_str, soat_vencido = _vencimiento(trailer.vencimiento_soat, hoy)
+    return {
+        "placa": trailer.placa_carreta,
+        "configuracion_vehicular": trailer.certificado_vehicular_carreta,
+        "peso_neto": trailer.peso_neto_carreta,
+        "numero_ejes": trailer.numero_ejes,
+        "vencimiento_tarjeta_circulacion": venc_tarjeta_str,
+        "tarjeta_circulacion_vencida": tarjeta_circulacion_vencida,
+        "vencimiento_soat": venc_soat_str,
+        "soat_vencido": soat_vencido
+    }
+
+
+# ---------------------------------------------------------------------------
+# Búsquedas
+# ---------------------------------------------------------------------------
+def buscar_tracto(db: Session, placa: str) -> Optional[VehiculoTracto]:
+    """Una búsqueda por índice (placa_norm) con el transportista en el mismo SELECT."""
+    return db.query(VehiculoTracto).options(joinedload(VehiculoTracto.transportista)).filter(
+        VehiculoTracto.placa_norm == normalize_plate(placa)
+    ).first()
+
+
+def buscar_carreta(db: Session, placa: str) -> Optional[VehiculoCarreta]:
+    return db.query(VehiculoCarreta).filter(VehiculoCarreta.placa_norm == normalize_plate(placa)).first()
+
+
+def _dam_capturado(dam: Optional[str]) -> str:
+    """DAM como la guarda la pantalla de captura: sin ceros a la izquierda en el último segmento."""
+    valor = (dam or "").strip().upper()
+    if "-" in valor:
+        partes = valor.split("-")
+        partes[-1] = partes[-1].lstrip("0") or partes[-1][-1:]
+        valor = "-".join(partes)
+    return valor
+
+
+def unicidad(db: Session, valores: Dict[str, str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Misma respuesta que /check_unique ({exists, id}) para booking, dam y
+    contenedor, en una sola consulta sobre los registros no anulados. Ante
+    varios registros se informa el de menor id.
+    """
+    resultado = {campo: {"exists": False, "id": None} for campo in valores}
+    columnas = {campo: getattr(LogiCaptureRegistro, campo) for campo, v in valores.items() if v not in VALORES_SIN_VALIDAR}
+    if not columnas:
+        return resultado
+
+    filas = db.query(LogiCaptureRegistro.id, *columnas.values()).filter(
+        LogiCaptureRegistro.status != "ANULADO",
+        or_(*[col == valores[campo] for campo, col in columnas.items()]),
+    ).order_by(LogiCaptureRegistro.id).all()
+    for fila in filas:
+        for campo in columnas:
+            if not resultado[campo]["exists"] and getattr(fila, campo) == valores[campo]:
+                resultado[campo] = {"exists": True, "id": fila.id}
+    return resultado
+
+
+def unicidad_codigos(db: Session, codigos: Dict[str, List[str]]) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Precintos y termógrafos por campo de la captura ({"precintoAduana": [...], ...}),
+    con un solo `codigo IN (...)` sobre logicapture_detalles. Devuelve el estado de
+    cada código ({exists, id}) y los conflictos: REGISTRADO (ya usado en el registro
+    `id`) o REPETIDO (aparece más de una vez en la misma captura, como rechaza /register).
+    """
+    vistos: Dict[str, str] = {}
+    conflictos: List[Dict[str, Any]] = []
+    for campo, valores in codigos.items():
+        for valor in valores:
+            codigo = (valor or "").strip().upper()
+            if codigo in VALORES_SIN_VALIDAR:
+                continue
+            if codigo in vistos:
+                conflictos.append({"field": campo, "value": codigo, "id": None, "motivo": "REPETIDO"})
+            else:
+                vistos[codigo] = campo
+
+    estado = {codigo: {"exists": False, "id": None} for codigo in vistos}
+    if vistos:
+        filas = db.query(LogiCaptureDetalle.codigo, LogiCaptureDetalle.registro_id).filter(
+            LogiCaptureDetalle.codigo.in_(list(vistos))
+        ).all()
+        for codigo, registro_id in filas:
+            estado[codigo] = {"exists": True, "id": registro_id}
+            conflictos.append({"field": vistos[codigo], "value": codigo, "id": registro_id, "motivo": "REGISTRADO"})
+    return estado, conflictos
+
+
+def validar_captura(
+    db: Session,
+    booking: Optional[str] = None,
+    dam: Optional[str] = None,
+    contenedor: Optional[str] = None,
+    tratamiento_buque: bool = False,
+    codigos: Optional[Dict[str, List[str]]] = None,
+) -> Dict[str, Any]:
+    """
+    Unicidad de todos los identificadores y códigos de una captura: una consulta
+    por tabla. El DAM se normaliza como lo guarda la captura (`_dam_capturado`),
+    igual que en el bundle.
+    """
+    valores = {
+        "booking": "" if tratamiento_buque else (booking or "").strip().upper(),
+        "dam": _dam_capturado(dam),
+        "contenedor": clean_container(contenedor or ""),
+    }
+    campos = unicidad(db, valores)
+    estado_codigos, conflictos_codigos = unicidad_codigos(db, codigos or {})
+    conflictos = [
+        {"field": campo, "value": valores[campo], "id": r["id"], "motivo": "REGISTRADO"}
+        for campo, r in campos.items() if r["exists"]
+    ] + conflictos_codigos
+    return {
+        "valido": not conflictos,
+        "campos": campos,
+        "codigos": estado_codigos,
+        "conflictos": conflictos,
+    }
+
+
+def _resolver_booking(
+    booking: str, tratamiento_buque: bool, dam: Optional[str], contenedor: Optional[str]
+) -> Dict[str, Any]:
+    db = SessionLocal()
+    try:
+        fila = db.query(Posicionamiento, ControlEmbarque).outerjoin(
+            ControlEmbarque, ControlEmbarque.booking == Posicionamiento.BOOKING
+        ).filter(Posicionamiento.BOOKING == booking).order_by(ControlEmbarque.id).first()
+        datos = payload_booking(booking, *fila) if fila else None
+
+        # DAM/contenedor: los enviados por la pantalla o, si no, los del control de embarque
+        if dam is None and datos: dam = datos["dam"]
+        if contenedor is None and datos: contenedor = datos["contenedor"]
+        valores = {
+            "booking": "" if tratamiento_buque else booking,  # con tratamiento a buque el booking se repite
+            "dam": _dam_capturado(dam),
+            "contenedor": clean_container(contenedor or ""),
+        }
+        return {"booking": datos, "unicidad": unicidad(db, valores)}
+    finally:
+        db.close()
+
+
+def _resolver_transporte(dni: Optional[str], placa_tracto: Optional[str], placa_carreta: Optional[str]) -> Dict[str, Any]:
+    hoy = date.today()
+    resultado: Dict[str, Any] = {"chofer": None, "tracto": None, "carreta": None}
+    if not (dni or placa_tracto or placa_carreta):
+        return resultado
+    db = SessionLocal()
+    try:
+        if dni:
+            driver = db.query(Chofer).filter(Chofer.dni == dni).first()
+            resultado["chofer"] = payload_chofer(driver, hoy) if driver else None
+        if placa_tracto:
+            vehicle = buscar_tracto(db, placa_tracto)
+            resultado["tracto"] = payload_tracto(vehicle, hoy) if vehicle else None
+        if placa_carreta:
+            trailer = buscar_carreta(db, placa_carreta)
+            resultado["carreta"] = payload_carreta(trailer, hoy) if trailer else None
+        return resultado
+    finally:
+        db.close()
+
+
+def _vencidos(resultado: Dict[str, Any]) -> List[str]:
+    """Documentos vencidos del chofer y las unidades, como claves planas (ej. 'tracto.soat')."""
+    vencidos = []
+    chofer, tracto, carreta = resultado["chofer"], resultado["tracto"], resultado["carreta"]
+    if chofer and chofer["licencia_vencida"]:
+        vencidos.append("chofer.licencia")
+    for nombre, unidad in (("tracto", tracto), ("carreta", carreta)):
+        if unidad and unidad["tarjeta_circulacion_vencida"]:
+            vencidos.append(f"{nombre}.tarjeta_circulacion")
+        if unidad and unidad["soat_vencido"]:
+            vencidos.append(f"{nombre}.soat")
+    return vencidos
+
+
+async def resolver_captura(
+    booking: Optional[str] = None,
+    dni: Optional[str] = None,
+    placa_tracto: Optional[str] = None,
+    placa_carreta: Optional[str] = None,
+    tratamiento_buque: bool = False,
+    dam: Optional[str] = None,
+    contenedor: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Booking, chofer, tracto, carreta y unicidad en un solo resultado. Lo no
+    encontrado queda en None y su mensaje (el mismo 404 del endpoint
+    individual) en `errores`.
+    """
+    booking = clean_booking(booking or "")
+    dni = clean_dni(dni or "")
+
+    ramas = [run_in_threadpool(_resolver_transporte, dni, placa_tracto, placa_carreta)]
+    if booking:
+        ramas.append(run_in_threadpool(_resolver_booking, booking, tratamiento_buque, dam, contenedor))
+    transporte, *por_booking = await asyncio.gather(*ramas)
+
+    resultado: Dict[str, Any] = {"booking": None, "unicidad": {}}
+    if por_booking:
+        resultado.update(por_booking[0])
+    resultado.update(transporte)
+
+    errores: Dict[str, str] = {}
+    if booking and not resultado["booking"]:
+        errores["booking"] = f"No se encontró información maestra para el Booking: {booking}"
+    if dni and not resultado["chofer"]:
+        errores["chofer"] = f"Chofer con DNI {dni} no registrado"
+    if placa_tracto and not resultado["tracto"]:
+        errores["tracto"] = f"Vehículo con Placa {clean_plate(placa_tracto)} no registrado"
+    if placa_carreta and not resultado["carreta"]:
+        errores["carreta"] = f"Carreta con Placa {clean_plate(placa_carreta)} no registrada"
+    resultado["vencidos"] = _vencidos(resultado)
+    resultado["errores"] = errores
+    return resultado
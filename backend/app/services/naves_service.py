@@ -0,0 +1,224 @@
+"""
+Servicio: Naves
+- Resolución de bookings por nave sobre las columnas normalizadas e indexadas
+  (`reporte_embarques.nave_arribo_norm` y `posicionamientos.nave_norm`).
+- Agrupación de variantes de nombre de una misma nave (Smart Match) con
+  bloqueo por prefijo/sufijo, caché de IDs canónicos y tabla de alias que
+  persiste la sincronización (`registrar_naves`); GET /naves solo la lee.
+Autor: AgroFlow Dev Team
+"""
+
+from collections import defaultdict
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import difflib
+import re
+import time
+
+from sqlalchemy import exists, select, union
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+
+from app.models.embarque import AliasNave, ReporteEmbarques
+from app.models.posicionamiento import Posicionamiento
+from app.utils.formatters import normalize_vessel_name
+from app.utils.logging import logger
+
+SIN_NAVE = "SIN NAVE"
+
+# Umbral de similitud: alto para no confundir voyages distintos
+# (ej. NX616A vs NX612R son la misma nave pero viajes distintos → NO es lo mismo)
+UMBRAL_SIMILITUD = 0.95
+
+# Largo del prefijo/sufijo usado como llave de bloqueo
+LARGO_BLOQUE = 4
+
+# Vigencia de la caché de alias en memoria (por proceso). Con varios workers
+# cada uno refresca desde la BD al vencer, así ven los alias creados por otros.
+ALIAS_TTL_SEGUNDOS = 300
+
+
+def query_bookings_en_nave(nave: str):
+    """
+    SELECT de los bookings cuya nave ACTUAL es `nave`, en una sola consulta:
+    - Bookings cuyo Reporte de Embarques dice que arriban en la nave, más
+    - Bookings posicionados en la nave que NO fueron movidos a otra nave
+      según el Reporte de Embarques (anti-join por booking).
+    """
+    nave_norm = normalize_vessel_name(nave)
+
+    en_reporte = select(ReporteEmbarques.booking).where(
+        ReporteEmbarques.nave_arribo_norm == nave_norm,
+        ReporteEmbarques.booking.isnot(None),
+    )
+
+    movido = exists().where(
+        ReporteEmbarques.booking == Posicionamiento.BOOKING,
+        ReporteEmbarques.nave_arribo_norm.isnot(None),
+        ReporteEmbarques.nave_arribo_norm != nave_norm,
+    )
+    en_posicionamiento = select(Posicionamiento.BOOKING).where(
+        Posicionamiento.NAVE_NORM == nave_norm,
+        ~movido,
+    )
+
+    return union(en_reporte, en_posicionamiento)
+
+
+def bookings_en_nave(db: Session, nave: str) -> Set[str]:
+    """Conjunto de bookings actualmente asignados a la nave."""
+    if not normalize_vessel_name(nave):
+        return set()
+    return {bk for (bk,) in db.execute(query_bookings_en_nave(nave)) if bk}
+
+
+# ---------------------------------------------------------------------------
+# Smart Match: agrupación de nombres de nave
+# ---------------------------------------------------------------------------
+def clave_nave(nombre: Optional[str]) -> str:
+    """Clave compacta de comparación: solo A-Z y 0-9."""
+    if not nombre:
+        return ""
+    return re.sub(r'[^A-Z0-9]', '', nombre.upper())
+
+
+def _similares(k1: str, k2: str, umbral: float = UMBRAL_SIMILITUD) -> bool:
+    """Comparación difusa sobre claves compactas, con cotas baratas antes del ratio completo."""
+    l1, l2 = len(k1), len(k2)
+    if not l1 or not l2:
+        return False
+    # Cota superior del ratio según largos: 2*min/(l1+l2)
+    if 2.0 * min(l1, l2) / (l1 + l2) < umbral:
+        return False
+    sm = difflib.SequenceMatcher(None, k1, k2)
+    return sm.quick_ratio() >= umbral and sm.ratio() >= umbral
+
+
+# Caché de alias por proceso: clave compacta → (ID canónico, nombre canónico)
+_alias: Dict[str, Tuple[str, str]] = {}
+_alias_cargado_en: float = 0.0
+_alias_lock = Lock()
+
+
+def _alias_vigente() -> bool:
+    return bool(_alias_cargado_en) and time.time() - _alias_cargado_en < ALIAS_TTL_SEGUNDOS
+
+
+def cargar_alias(db: Session, forzar: bool = False) -> Dict[str, Tuple[str, str]]:
+    """Carga (o refresca si venció) la tabla de alias en la caché del proceso."""
+    global _alias_cargado_en
+    with _alias_lock:
+        if forzar or not _alias_vigente():
+            filas = db.query(AliasNave.alias, AliasNave.canonico, AliasNave.nave_canonica).all()
+            _alias.clear()
+            _alias.update({f.alias: (f.canonico, f.nave_canonica) for f in filas})
+            _alias_cargado_en = time.time()
+        return dict(_alias)
+
+
+def invalidar_alias() -> None:
+    """Fuerza la recarga de alias en la próxima consulta."""
+    global _alias_cargado_en
+    with _alias_lock:
+        _alias_cargado_en = 0.0
+
+
+class ClusterNaves:
+    """
+    Asigna a cada nombre de nave el ID canónico de su grupo.
+
+    - Caché: una clave ya vista (o con alias persistido) se resuelve con un dict.
+    - Bloqueo: una clave nueva solo se compara con los representantes que comparten
+      su prefijo o su sufijo de LARGO_BLOQUE caracteres. Una sola edición
+      (sustitución, inserción o borrado) deja intacto al menos uno de los dos
+      bloques, así que esos pares siempre se comparan. Dos ediciones, una en cada
+      extremo, pueden escapar al bloqueo (con el umbral de 0.95 solo es posible en
+      claves de 21+ caracteres): esas variantes quedan como naves distintas.
+    - Persistencia: las asignaciones nuevas quedan en `nuevos` para `guardar()`.
+    """
+
+    def __init__(self, alias: Optional[Dict[str, Tuple[str, str]]] = None, umbral: float = UMBRAL_SIMILITUD):
+        self.umbral = umbral
+        self._canon: Dict[str, Tuple[str, str]] = {}
+        self._bloques: Dict[str, List[str]] = defaultdict(list)
+        self.nuevos: Dict[str, Tuple[str, str]] = {}
+        for k, (canonico, nombre) in (alias or {}).items():
+            self._canon[k] = (canonico, nombre)
+            if k == canonico:
+                self._indexar(canonico)
+
+    @classmethod
+    def desde_bd(cls, db: Session) -> "ClusterNaves":
+        return cls(alias=cargar_alias(db))
+
+    def _llaves_bloque(self, clave: str) -> Tuple[str, str]:
+        return "P:" + clave[:LARGO_BLOQUE], "S:" + clave[-LARGO_BLOQUE:]
+
+    def _indexar(self, canonico: str) -> None:
+        for llave in self._llaves_bloque(canonico):
+            self._bloques[llave].append(canonico)
+
+    def resolver(self, nombre: str) -> Tuple[str, str]:
+        """(ID canónico, nombre canónico) de la nave."""
+        clave = clave_nave(nombre)
+        if not clave:
+            return SIN_NAVE, SIN_NAVE
+        hit = self._canon.get(clave)
+        if hit:
+            return hit
+
+        asignado: Optional[Tuple[str, str]] = None
+        vistos: Set[str] = set()
+        for llave in self._llaves_bloque(clave):
+            for rep in self._bloques.get(llave, ()):
+                if rep in vistos:
+                    continue
+                vistos.add(rep)
+                if _similares(clave, rep, self.umbral):
+                    asignado = self._canon[rep]
+                    break
+            if asignado:
+                break
+
+        if not asignado:
+            # Nueva nave: ella misma es la representante de su grupo
+            asignado = (clave, nombre.strip().upper())
+            self._indexar(clave)
+
+        self._canon[clave] = asignado
+        self.nuevos[clave] = asignado
+        return asignado
+
+    def guardar(self, db: Session) -> int:
+        """
+        Agrega los alias nuevos a la transacción del llamador (savepoint, sin commit).
+        Ante conflicto (otra carga los creó) se descartan; la caché se recarga luego.
+        """
+        if not self.nuevos:
+            return 0
+        try:
+            with db.begin_nested():
+                db.add_all([
+                    AliasNave(alias=k, canonico=canonico, nave_canonica=nombre)
+                    for k, (canonico, nombre) in self.nuevos.items()
+                ])
+        except SQLAlchemyError as e:
+            logger.warning(f"No se pudieron guardar alias de nave: {e}")
+            return 0
+        finally:
+            invalidar_alias()
+        total = len(self.nuevos)
+        self.nuevos = {}
+        return total
+
+
+def registrar_naves(db: Session, nombres: Iterable[Optional[str]]) -> int:
+    """
+    Resuelve los nombres de nave que trae una sincronización y agrega sus alias
+    nuevos en la misma transacción. Devuelve los alias agregados.
+    """
+    cluster = ClusterNaves.desde_bd(db)
+    for nombre in nombres:
+        if nombre and nombre.strip():
+            cluster.resolver(nombre)
+    return cluster.guardar(db)
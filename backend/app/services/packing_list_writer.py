@@ -0,0 +1,284 @@
+"""
+Servicio: Escritor del Packing List OGL
+- La plantilla "FORMATO PL - OGL.xlsx" se parsea UNA vez por proceso y cada
+  emisión trabaja sobre un clon en memoria (sin volver a leer ni parsear el xlsx).
+  Las imágenes (logos) se guardan como bytes y cada clon recibe las suyas: al
+  guardar, openpyxl cierra el archivo de cada imagen.
+- La grilla de pallets se arma como filas {columna: valor} con una sola regla
+  (`fila_pallet_ogl`) para los bookings y para los pallets DESCONOCIDOS, y se
+  vuelca en bloque con `agregar_filas`.
+- `VistaPreviaPL` recibe las mismas escrituras y las devuelve como JSON.
+Autor: AgroFlow Dev Team
+"""
+
+from copy import copy
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, List, Optional
+import io
+import os
+
+import openpyxl
+from openpyxl.cell.cell import Cell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment
+from openpyxl.styles.cell_style import StyleArray
+from openpyxl.utils import get_column_letter
+from openpyxl.utils.indexed_list import IndexedList
+from openpyxl.workbook import Workbook
+
+from app.utils.logging import logger
+
+TEMPLATE_PATH = os.path.join(
+    os.path.dirname(__file__),  # app/services/
+    "..", "..",                  # backend/
+    "assets", "templates",
+    "FORMATO PL - OGL.xlsx"
+)
+
+# Primera fila de la grilla de pallets en la plantilla
+GRID_START_ROW = 21
+
+EMPRESA = "COMPLEJO AGROINDUSTRIAL BETA S.A."
+EMPRESA_GLN = "4050373153151"
+
+# GLN por planta de llenado
+GLN_PLANTAS = {
+    "ICA": "7751043044355",
+    "JAYANCA": "7751043046953",
+    "OLMOS": "7751043045680",
+}
+
+# Registros de estilos del libro que se amplían al asignar estilos nuevos
+_REGISTROS_ESTILO = ("_fonts", "_alignments", "_borders", "_fills", "_number_formats", "_protections", "_cell_styles")
+
+_plantillas: Dict[str, tuple] = {}   # ruta → (mtime, Workbook parseado, imágenes por hoja)
+_plantillas_lock = Lock()
+
+
+def _extraer_imagenes(wb: Workbook) -> List[List[tuple]]:
+    """(bytes, anchor, ancho, alto) de cada imagen, por hoja; las hojas de la plantilla quedan sin imágenes."""
+    imagenes = []
+    for ws in wb._sheets:
+        imagenes.append([(img._data(), img.anchor, img.width, img.height) for img in ws._images])
+        ws._images = []
+    return imagenes
+
+
+def _plantilla(ruta: str) -> tuple:
+    """(Workbook parseado, imágenes por hoja) de la plantilla (se recarga solo si cambia en disco)."""
+    mtime = os.path.getmtime(ruta)
+    with _plantillas_lock:
+        cacheado = _plantillas.get(ruta)
+        if cacheado and cacheado[0] == mtime:
+            return cacheado[1], cacheado[2]
+        wb = openpyxl.load_workbook(ruta, keep_vba=False)
+        imagenes = _extraer_imagenes(wb)
+        _plantillas[ruta] = (mtime, wb, imagenes)
+        return wb, imagenes
+
+
+def _imagen(datos: bytes, anchor: Any, ancho: float, alto: float) -> Image:
+    img = Image(io.BytesIO(datos))
+    img.anchor = copy(anchor)
+    img.width, img.height = ancho, alto
+    return img
+
+
+def _clonar_libro(wb_t: Workbook, imagenes: Optional[List[List[tuple]]] = None) -> Workbook:
+    """
+    Copia independiente de un Workbook: celdas, valores y estilos por celda son
+    propios del clon, igual que las imágenes y lo que openpyxl modifica al guardar
+    (sheet_format, hipervínculos, comentarios); lo demás (dimensiones, celdas
+    combinadas, propiedades) es de solo lectura y se comparte con la plantilla.
+    """
+    wb = copy(wb_t)
+    for attr in _REGISTROS_ESTILO:
+        setattr(wb, attr, IndexedList(getattr(wb_t, attr)))
+    wb._named_styles = copy(wb_t._named_styles)
+    wb._sheets = []
+    nueva_celda = Cell.__new__
+    for i, ws_t in enumerate(wb_t._sheets):
+        ws = copy(ws_t)
+        ws._parent = wb
+        ws.sheet_format = copy(ws_t.sheet_format)
+        ws._hyperlinks = []
+        ws._comments = []
+        ws._charts = list(ws_t._charts)
+        ws._images = [_imagen(*datos) for datos in (imagenes[i] if imagenes else [])]
+        celdas = {}
+        for key, c in ws_t._cells.items():
+            if type(c) is Cell:
+                nc = nueva_celda(Cell)
+                nc.row = c.row
+                nc.column = c.column
+                nc._value = c._value
+                nc.data_type = c.data_type
+                nc._hyperlink = copy(c._hyperlink) if c._hyperlink else None
+                nc._comment = None
+                if c._comment:
+                    nc._comment = copy(c._comment)
+                    nc._comment.bind(nc)
+                nc._style = StyleArray(c._style)
+            else:
+                nc = copy(c)
+            nc.parent = ws
+            celdas[key] = nc
+        ws._cells = celdas
+        wb._sheets.append(ws)
+    return wb
+
+
+def nuevo_libro(ruta: Optional[str] = None) -> Workbook:
+    """Libro listo para escribir a partir de la plantilla cacheada."""
+    ruta = os.path.normpath(ruta or TEMPLATE_PATH)
+    plantilla, imagenes = _plantilla(ruta)
+    try:
+        return _clonar_libro(plantilla, imagenes)
+    except Exception as e:
+        logger.warning(f"No se pudo clonar la plantilla en memoria, se recarga de disco: {e}")
+        return openpyxl.load_workbook(ruta, keep_vba=False)
+
+
+def _safe_float(val: Any) -> float:
+    try:
+        f = float(val)
+        return f if f == f else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def gln_planta(planta_llenado: str) -> str:
+    planta_up = (planta_llenado or "").upper()
+    for clave, gln in GLN_PLANTAS.items():
+        if clave in planta_up:
+            return gln
+    return ""
+
+
+def fila_pallet_ogl(
+    item: Dict[str, Any],
+    contenedor: str,
+    pedido: Any,
+    planta_llenado: str,
+    termografo: Optional[str] = None,
+) -> Dict[int, Any]:
+    """
+    Fila de la grilla OGL para un pallet: {columna: valor}.
+    Las columnas ausentes no se escriben (conservan lo que tenga la plantilla).
+    """
+    cultivo_up = (pedido.cultivo or "").upper() if pedido else ""
+    es_palta = "PALTA" in cultivo_up or "AVOCADO" in cultivo_up
+
+    fila: Dict[int, Any] = {
+        3: item["pallet"],
+        4: contenedor,
+        6: pedido.product.strip() if pedido and pedido.product else "",
+        7: pedido.variedad.strip() if pedido and pedido.variedad else "",
+        8: item["calibre"],
+    }
+    peso_val = pedido.peso_por_caja if pedido else ""
+    if peso_val is not None and str(peso_val).strip() != "":
+        fila[9] = f"{str(peso_val).strip()} KG"
+
+    # Peso bruto: factor por caja (Palta LOOSE según peso nominal)
+    factor = 4.2
+    if es_palta:
+        fila[10] = "LOOSE"
+        peso_nominal = _safe_float(pedido.peso_por_caja)
+        if peso_nominal == 10:
+            factor = 10.97
+        elif peso_nominal == 4:
+            factor = 4.3
+    if termografo:
+        fila[13] = termografo
+
+    fila.update({
+        14: round(_safe_float(item["cajas"]) * factor, 2),
+        15: item["total_kilos"],
+        16: item["cosecha"],
+        17: item["proceso"],
+        18: item["lote_ogl"],
+        19: "Complejo Agroindustrial",
+        20: gln_planta(planta_llenado),
+        21: pedido.caja_por_pallet if pedido else "",
+        22: item["cajas"],
+        23: EMPRESA,
+        24: EMPRESA_GLN,
+        25: planta_llenado,
+        26: item["trazabilidad"],
+    })
+    return fila
+
+
+class PackingListWriter:
+    """Escritura de cabecera y grilla sobre un clon de la plantilla."""
+
+    def __init__(self, template_path: Optional[str] = None):
+        self.wb = nuevo_libro(template_path)
+        self.ws = self.wb.active
+        self.siguiente_fila = GRID_START_ROW
+
+    def celda(self, ref: str, valor: Any, forzar: bool = False) -> None:
+        """Escribe una celda de cabecera respetando las fórmulas de la plantilla (salvo `forzar`)."""
+        try:
+            cell = self.ws[ref]
+            if forzar or not (isinstance(cell.value, str) and cell.value.startswith("=")):
+                cell.value = valor
+        except Exception:
+            pass
+
+    def centrar(self, ref: str) -> None:
+        self.ws[ref].alignment = Alignment(horizontal='center', vertical='center')
+
+    def agregar_filas(self, filas: Iterable[Dict[int, Any]]) -> int:
+        """Vuelca filas {columna: valor} a partir de la siguiente fila libre. Devuelve cuántas escribió."""
+        celdas = self.ws._cells
+        obtener: Callable = self.ws.cell
+        fila_e = self.siguiente_fila
+        for fila in filas:
+            for col, valor in fila.items():
+                cell = celdas.get((fila_e, col))
+                if cell is None:
+                    cell = obtener(row=fila_e, column=col)
+                cell.value = valor
+            fila_e += 1
+        escritas = fila_e - self.siguiente_fila
+        self.siguiente_fila = fila_e
+        return escritas
+
+    def guardar(self) -> bytes:
+        output = io.BytesIO()
+        self.wb.save(output)
+        return output.getvalue()
+
+
+class VistaPreviaPL:
+    """
+    Mismo contrato que PackingListWriter, sin openpyxl: acumula cabecera y grilla
+    para devolverlas como JSON (vista previa, sin plantilla ni archivo).
+    """
+
+    def __init__(self):
+        self.cabecera: Dict[str, Any] = {}
+        self.filas: List[Dict[int, Any]] = []
+
+    def celda(self, ref: str, valor: Any, forzar: bool = False) -> None:
+        self.cabecera[ref] = valor
+
+    def centrar(self, ref: str) -> None:
+        pass
+
+    def agregar_filas(self, filas: Iterable[Dict[int, Any]]) -> int:
+        antes = len(self.filas)
+        self.filas.extend(filas)
+        return len(self.filas) - antes
+
+    def como_dict(self) -> Dict[str, Any]:
+        """Grilla compacta: letras de columna una vez y cada fila como lista de valores."""
+        columnas = sorted({col for fila in self.filas for col in fila})
+        return {
+            "cabecera": self.cabecera,
+            "fila_inicial": GRID_START_ROW,
+            "columnas": [get_column_letter(col) for col in columnas],
+            "filas": [[fila.get(col) for col in columnas] for fila in self.filas],
+        }
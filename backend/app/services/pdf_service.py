@@ -15,6 +15,7 @@ from typing import Optional, Any
 from app.utils.formatters import normalize_client_name, normalize_country_name
 from app.models.posicionamiento import Posicionamiento
 from app.models.pedido import PedidoComercial
+from app.services.booking_pedido import pedidos_de_booking
 from app.models.maestros import ClienteIE, Planta
 
 class FloatingImage(Flowable):
@@ -229,13 +230,9 @@ class InstructionPDFService:
 
             normalized_orden = self._normalize_orden(pos.ORDEN_BETA)
             pedidos = []
-            if normalized_orden and len(normalized_orden) > 1 and normalized_orden.upper() != "PENDIENTE":
-                query_pedidos = db.query(PedidoComercial).filter(
-                    PedidoComercial.orden_beta.ilike(f"%{normalized_orden}%")
-                )
-                if pos.CULTIVO and pos.CULTIVO.strip().upper() not in ["", "PENDIENTE", "N/A", "-"]:
-                    query_pedidos = query_pedidos.filter(PedidoComercial.cultivo.ilike(pos.CULTIVO))
-                    
+            if pos.ORDEN_NUM and len(normalized_orden) > 1 and normalized_orden.upper() != "PENDIENTE":
+                # Vínculo booking → pedido (orden + cultivo normalizados) en lugar de ilike('%orden%')
+                query_pedidos = pedidos_de_booking(db, pos.BOOKING)
                 if pos.PLANTA_LLENADO and pos.PLANTA_LLENADO.strip().upper() not in ["", "PENDIENTE", "N/A", "-"]:
                     query_pedidos = query_pedidos.filter(PedidoComercial.planta.ilike(pos.PLANTA_LLENADO))
                     
@@ -62,12 +62,12 @@ def generate_anexo_1_pdf(db: Session, registro_id: int, is_especial: bool = Fals
     nombre_operador = usuario_real.nombre if usuario_real else reg.usuario_registro
 
     # Limpieza de Placas para Match Robusto 🧼🏎️
-    from app.routers.logicapture import clean_plate
-    placa_tracto_clean = clean_plate(reg.placa_tracto or "")
-    placa_carreta_clean = clean_plate(reg.placa_carreta or "")
+    from app.utils.formatters import normalize_plate
+    placa_tracto_clean = normalize_plate(reg.placa_tracto)
+    placa_carreta_clean = normalize_plate(reg.placa_carreta)
 
-    tracto = db.query(VehiculoTracto).filter(VehiculoTracto.placa_tracto == placa_tracto_clean).first()
-    carreta = db.query(VehiculoCarreta).filter(VehiculoCarreta.placa_carreta == placa_carreta_clean).first()
+    tracto = db.query(VehiculoTracto).filter(VehiculoTracto.placa_norm == placa_tracto_clean).first()
+    carreta = db.query(VehiculoCarreta).filter(VehiculoCarreta.placa_norm == placa_carreta_clean).first()
 
     conf_label, peso_max = get_mtc_config(
         tracto.numero_ejes if tracto else 0, 
@@ -0,0 +1,84 @@
+"""
+Servicio: Caché versionada de Packing List (/naves y /bookings)
+Las respuestas se guardan junto con la versión de datos vigente al calcularlas.
+Toda escritura que cambia lo que ven esos endpoints (sincronizaciones,
+emisión y anulación de PLs, control de embarques) llama a `invalidar`, que
+sube la versión: las lecturas repetidas sin cambios no tocan la BD.
+
+Versión y caché son en memoria por proceso (como utils/rate_limit.py). Con
+varios workers cada uno solo ve sus propias invalidaciones; por eso las
+entradas vencen además a los CACHE_TTL_SEGUNDOS como red de seguridad.
+Autor: AgroFlow Dev Team
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+import time
+
+from app.utils.logging import logger
+
+CACHE_TTL_SEGUNDOS = 300
+MAX_ENTRADAS = 256
+
+_version = 0
+_entradas: "OrderedDict[Tuple[str, Hashable], Tuple[int, float, Any]]" = OrderedDict()
+_hits: Dict[str, int] = {}
+_misses: Dict[str, int] = {}
+_lock = Lock()
+
+
+def version_datos() -> int:
+    return _version
+
+
+def invalidar(motivo: str = "") -> int:
+    """Sube la versión de datos y descarta las respuestas cacheadas. Devuelve la nueva versión."""
+    global _version
+    with _lock:
+        _version += 1
+        _entradas.clear()
+        version = _version
+    if motivo:
+        logger.info(f"Caché de Packing List invalidada (v{version}): {motivo}")
+    return version
+
+
+def obtener(nombre: str, clave: Hashable, calcular: Callable[[], Any]) -> Any:
+    """
+    Respuesta cacheada de `nombre`/`clave` para la versión actual; si no existe
+    (o venció) la calcula. Si los datos cambian durante el cálculo, el resultado
+    se devuelve pero no se guarda.
+    """
+    llave = (nombre, clave)
+    now = time.time()
+    with _lock:
+        version = _version
+        hit = _entradas.get(llave)
+        if hit and hit[0] == version and now - hit[1] < CACHE_TTL_SEGUNDOS:
+            _entradas.move_to_end(llave)
+            _hits[nombre] = _hits.get(nombre, 0) + 1
+            return hit[2]
+        _misses[nombre] = _misses.get(nombre, 0) + 1
+
+    valor = calcular()
+
+    with _lock:
+        if _version == version:
+            _entradas[llave] = (version, now, valor)
+            _entradas.move_to_end(llave)
+            while len(_entradas) > MAX_ENTRADAS:
+                _entradas.popitem(last=False)
+    return valor
+
+
+def estadisticas() -> Dict[str, Any]:
+    with _lock:
+        nombres = sorted(set(_hits) | set(_misses))
+        return {
+            "version": _version,
+            "entradas": len(_entradas),
+            "hits": sum(_hits.values()),
+            "misses": sum(_misses.values()),
+            "por_endpoint": {n: {"hits": _hits.get(n, 0), "misses": _misses.get(n, 0)} for n in nombres},
+        }
@@ -0,0 +1,365 @@
+"""
+Servicio: Correlativo de Packing List (WK ID)
+Mantiene por semana ETA + cultivo el orden de salida (ETD) de las naves y los
+WK IDs ya usados por PLs activos, para que la emisión solo haga una lectura
+indexada + una reserva atómica en lugar de recorrer posicionamientos,
+reportes y emisiones en cada generación.
+
+- La sincronización (posicionamiento, pedidos, reporte de embarques) junta las
+  semanas ETA que tocó (`semanas_de_ordenes`) y recalcula solo esos buckets con
+  `sincronizar_correlativos`.
+- La emisión reserva su ID con `reservar_pl_id_confirmado` (transacción propia
+  y corta: el bloqueo del bucket no dura lo que el armado del Excel) y, si la
+  emisión no llega a registrarse, lo devuelve con `devolver_pl_id`. La
+  anulación lo libera con `liberar_pl_id`. La vista previa solo lo consulta
+  con `consultar_pl_id`.
+Autor: AgroFlow Dev Team
+"""
+
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import re
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.embarque import ReporteEmbarques
+from app.models.packing_list import CorrelativoSemanaPL, DetalleEmisionPackingList, EmisionPackingList
+from app.models.pedido import PedidoComercial
+from app.models.posicionamiento import Posicionamiento
+from app.utils.formatters import normalize_vessel_name
+
+OGL_KEYWORD = "OGL"
+
+Bucket = Tuple[int, str]
+
+TAM_LOTE = 1000
+
+
+def clave_cultivo(cultivo: Optional[str]) -> str:
+    return (cultivo or "").strip().upper()
+
+
+def prefijo_semana(semana: int) -> str:
+    return f"WK{str(semana).zfill(2)}"
+
+
+# ---------------------------------------------------------------------------
+# Cálculo set-based del orden de naves por semana + cultivo
+# ---------------------------------------------------------------------------
+def calcular_naves_semanas(db: Session, semanas: Optional[Iterable[int]] = None) -> Dict[Bucket, Dict[str, str]]:
+    """
+    {(semana, cultivo): {nave normalizada: primer ETD (o ETA) ISO}} en 3 consultas
+    (posicionamientos por orden_num y reportes por booking, en tramos de TAM_LOTE).
+    Una nave entra en la semana si alguno de sus posicionamientos corresponde a
+    una orden OGL con esa semana ETA (y mismo cultivo). La nave es la del Reporte
+    de Embarques si existe, si no la del posicionamiento.
+    """
+    q_pedidos = db.query(PedidoComercial.orden_num, PedidoComercial.semana_eta, PedidoComercial.cultivo).filter(
+        PedidoComercial.orden_num.isnot(None),
+        PedidoComercial.semana_eta.isnot(None),
+        PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%"),
+    )
+    if semanas is not None:
+        q_pedidos = q_pedidos.filter(PedidoComercial.semana_eta.in_(list(semanas)))
+
+    buckets_por_orden: Dict[str, Set[Bucket]] = defaultdict(set)
+    resultado: Dict[Bucket, Dict[str, str]] = {}
+    for num, semana, cultivo in q_pedidos.all():
+        bucket = (int(semana), clave_cultivo(cultivo))
+        buckets_por_orden[num].add(bucket)
+        resultado.setdefault(bucket, {})
+    if not buckets_por_orden:
+        return resultado
+
+    # Solo los posicionamientos de las órdenes OGL encontradas (índice orden_num, cultivo_key)
+    ordenes = list(buckets_por_orden)
+    posiciones = []
+    for inicio in range(0, len(ordenes), TAM_LOTE):
+        posiciones += db.query(
+            Posicionamiento.BOOKING, Posicionamiento.NAVE, Posicionamiento.ETD,
+            Posicionamiento.ETA, Posicionamiento.ORDEN_NUM, Posicionamiento.CULTIVO,
+        ).filter(
+            Posicionamiento.ORDEN_NUM.in_(ordenes[inicio:inicio + TAM_LOTE]),
+            Posicionamiento.NAVE.isnot(None),
+        ).all()
+
+    # Nave de arribo solo de esos bookings (índice único de reporte_embarques.booking)
+    bookings = sorted({p[0] for p in posiciones if p[0]})
+    reporte_naves: Dict[str, str] = {}
+    for inicio in range(0, len(bookings), TAM_LOTE):
+        for booking, nave_arribo in db.query(ReporteEmbarques.booking, ReporteEmbarques.nave_arribo).filter(
+            ReporteEmbarques.booking.in_(bookings[inicio:inicio + TAM_LOTE]),
+            ReporteEmbarques.nave_arribo.isnot(None),
+        ):
+            reporte_naves[booking] = nave_arribo
+
+    for booking, nave, etd, eta, orden_num, cultivo_pos in posiciones:
+        buckets = buckets_por_orden.get(orden_num)
+        etd_val = etd or eta
+        if not buckets or not etd_val:
+            continue
+        nave_norm = normalize_vessel_name(reporte_naves.get(booking) or nave)
+        if not nave_norm:
+            continue
+        cultivo_up = clave_cultivo(cultivo_pos)
+        for bucket in buckets:
+            if bucket[1] and bucket[1] not in cultivo_up:
+                continue
+            naves = resultado[bucket]
+            etd_iso = etd_val.isoformat()
+            if nave_norm not in naves or etd_iso < naves[nave_norm]:
+                naves[nave_norm] = etd_iso
+    return resultado
+
+
+def _cultivos_legacy(db: Session, emision_ids: List[int]) -> Dict[int, str]:
+    """Cultivo de emisiones antiguas sin `cultivo`: el del posicionamiento de su primer booking."""
+    if not emision_ids:
+        return {}
+    primer_bk: Dict[int, str] = {}
+    for emision_id, booking in db.query(
+        DetalleEmisionPackingList.emision_id, DetalleEmisionPackingList.booking
+    ).filter(DetalleEmisionPackingList.emision_id.in_(emision_ids)).order_by(DetalleEmisionPackingList.id).all():
+        primer_bk.setdefault(emision_id, booking)
+    cultivos_pos = dict(db.query(Posicionamiento.BOOKING, Posicionamiento.CULTIVO).filter(
+        Posicionamiento.BOOKING.in_(set(primer_bk.values()))
+    ).all()) if primer_bk else {}
+    return {emision_id: clave_cultivo(cultivos_pos.get(bk)) for emision_id, bk in primer_bk.items()}
+
+
+def _ids_usados_iniciales(db: Session, buckets: Iterable[Bucket]) -> Dict[Bucket, List[str]]:
+    """
+    WK IDs de PLs ACTIVOS por bucket, para sembrar un bucket nuevo.
+    Las emisiones antiguas (sin `semana`) se asignan por prefijo del WK en el
+    nombre del archivo, y su cultivo se deduce del primer booking si falta.
+    """
+    buckets = list(buckets)
+    usados: Dict[Bucket, List[str]] = {b: [] for b in buckets}
+    if not buckets:
+        return usados
+
+    emisiones = db.query(
+        EmisionPackingList.id, EmisionPackingList.cultivo, EmisionPackingList.pl_id,
+        EmisionPackingList.semana, EmisionPackingList.archivo_nombre,
+    ).filter(EmisionPackingList.estado == "ACTIVO").all()
+
+    cultivo_legacy = _cultivos_legacy(db, [e.id for e in emisiones if not e.cultivo])
+
+    for em in emisiones:
+        m = re.search(r'WK(\d+)', em.pl_id or em.archivo_nombre or "")
+        if not m:
+            continue
+        wk = m.group(0)
+        em_cultivo = clave_cultivo(em.cultivo) or cultivo_legacy.get(em.id, "")
+        for semana, cultivo in buckets:
+            if em_cultivo and cultivo and em_cultivo != cultivo:
+                continue  # Emisiones de otros cultivos
+            if em.semana is not None:
+                if em.semana != semana:
+                    continue
+            elif not wk.startswith(prefijo_semana(semana)):
+                continue
+            if wk not in usados[(semana, cultivo)]:
+                usados[(semana, cultivo)].append(wk)
+    return usados
+
+
+# ---------------------------------------------------------------------------
+# Mantenimiento (sincronización)
+# ---------------------------------------------------------------------------
+def ordenes_por_booking(db: Session, bookings: Iterable[str]) -> Dict[str, str]:
+    """{booking: orden_num actual} de los posicionamientos de `bookings` que tienen orden."""
+    bookings = sorted({b for b in bookings if b})
+    ordenes: Dict[str, str] = {}
+    for inicio in range(0, len(bookings), TAM_LOTE):
+        ordenes.update(db.query(Posicionamiento.BOOKING, Posicionamiento.ORDEN_NUM).filter(
+            Posicionamiento.BOOKING.in_(bookings[inicio:inicio + TAM_LOTE]),
+            Posicionamiento.ORDEN_NUM.isnot(None),
+        ).all())
+    return ordenes
+
+
+def semanas_de_ordenes(db: Session, ordenes: Iterable[str]) -> Set[int]:
+    """Semanas ETA de los pedidos OGL de esas órdenes: los buckets que un cambio en ellas puede mover."""
+    ordenes = sorted({o for o in ordenes if o})
+    semanas: Set[int] = set()
+    for inicio in range(0, len(ordenes), TAM_LOTE):
+        semanas.update(int(s) for (s,) in db.query(PedidoComercial.semana_eta).filter(
+            PedidoComercial.orden_num.in_(ordenes[inicio:inicio + TAM_LOTE]),
+            PedidoComercial.semana_eta.isnot(None),
+            PedidoComercial.cliente.ilike(f"%{OGL_KEYWORD}%"),
+        ).distinct())
+    return semanas
+
+
+def es_ogl(cliente: Optional[str]) -> bool:
+    return OGL_KEYWORD in (cliente or "").upper()
+
+
+def sincronizar_correlativos(db: Session, semanas: Optional[Iterable[int]] = None) -> int:
+    """
+    Recalcula el orden de naves de las semanas OGL indicadas (todas con `semanas=None`,
+    p. ej. para una reparación manual). Solo toca `naves`; `ids_usados` lo mantienen
+    emisión/anulación (evita pisar una reserva en curso). Devuelve la cantidad de
+    buckets actualizados.
+    """
+    if semanas is not None:
+        semanas = sorted({int(s) for s in semanas})
+        if not semanas:
+            return 0
+    calculado = calcular_naves_semanas(db, semanas)
+    q_filas = db.query(CorrelativoSemanaPL)
+    if semanas is not None:
+        q_filas = q_filas.filter(CorrelativoSemanaPL.semana.in_(semanas))
+    filas = {(f.semana, f.cultivo): f for f in q_filas.all()}
+
+    nuevos = [b for b in calculado if b not in filas]
+    semillas = _ids_usados_iniciales(db, nuevos)
+    for bucket in nuevos:
+        db.add(CorrelativoSemanaPL(semana=bucket[0], cultivo=bucket[1], naves=calculado[bucket], ids_usados=semillas[bucket]))
+
+    for bucket, fila in filas.items():
+        naves = calculado.get(bucket, {})
+        if fila.naves != naves:
+            fila.naves = naves
+    db.commit()
+    return len(calculado)
+
+
+# ---------------------------------------------------------------------------
+# Reserva / liberación (emisión y anulación)
+# ---------------------------------------------------------------------------
+def _bucket_bloqueado(db: Session, semana: int, cultivo: str) -> CorrelativoSemanaPL:
+    """Fila del bucket con bloqueo de escritura; la crea (sembrada) si no existe."""
+    q = db.query(CorrelativoSemanaPL).filter(
+        CorrelativoSemanaPL.semana == semana, CorrelativoSemanaPL.cultivo == cultivo
+    ).with_for_update()
+    fila = q.first()
+    if fila:
+        return fila
+
+    naves = calcular_naves_semanas(db, [semana]).get((semana, cultivo), {})
+    usados = _ids_usados_iniciales(db, [(semana, cultivo)])[(semana, cultivo)]
+    try:
+        with db.begin_nested():
+            db.add(CorrelativoSemanaPL(semana=semana, cultivo=cultivo, naves=naves, ids_usados=usados))
+    except IntegrityError:
+        pass  # Otro proceso lo creó en paralelo
+    return q.first()
+
+
+def _siguiente_pl_id(semana: int, naves: Dict[str, str], usados: List[str], nave: str, etd_defecto: date) -> str:
+    """Posición de la nave por ETD en la semana, saltando los IDs ya usados."""
+    naves = dict(naves or {})
+    nave_norm = normalize_vessel_name(nave)
+    if nave_norm not in naves:
+        naves[nave_norm] = etd_defecto.isoformat()
+    naves_ordenadas = sorted(naves.items(), key=lambda x: (x[1], x[0]))
+    correlativo = next((i + 1 for i, (n, _) in enumerate(naves_ordenadas) if n == nave_norm), 1)
+
+    prefijo = prefijo_semana(semana)
+    while f"{prefijo}{correlativo}" in usados:
+        correlativo += 1
+    return f"{prefijo}{correlativo}"
+
+
+def reservar_pl_id(db: Session, semana: int, cultivo: Optional[str], nave: str, etd_defecto: date) -> str:
+    """
+    Asigna el WK ID de la nave: posición de la nave por ETD en la semana, saltando
+    los IDs ya usados por PLs activos. La reserva queda en la transacción actual
+    (sin commit); la emisión usa `reservar_pl_id_confirmado`.
+    """
+    cultivo = clave_cultivo(cultivo)
+    fila = _bucket_bloqueado(db, semana, cultivo)
+
+    usados = list(fila.ids_usados or [])
+    pl_id = _siguiente_pl_id(semana, fila.naves, usados, nave, etd_defecto)
+
+    fila.ids_usados = usados + [pl_id]
+    db.flush()
+    return pl_id
+
+
+def reservar_pl_id_confirmado(semana: int, cultivo: Optional[str], nave: str, etd_defecto: date) -> str:
+    """
+    `reservar_pl_id` en una sesión propia que se confirma al instante: el bucket
+    queda bloqueado solo durante la reserva, no mientras se arma y guarda el PL.
+    Si la emisión falla después, el llamador debe devolverlo con `devolver_pl_id`.
+    """
+    db = SessionLocal()
+    try:
+        pl_id = reservar_pl_id(db, semana, cultivo, nave, etd_defecto)
+        db.commit()
+        return pl_id
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def devolver_pl_id(semana: int, cultivo: Optional[str], pl_id: str) -> None:
+    """Libera, en una sesión propia, un WK ID reservado cuya emisión no se registró."""
+    db = SessionLocal()
+    try:
+        fila = db.query(CorrelativoSemanaPL).filter(
+            CorrelativoSemanaPL.semana == semana, CorrelativoSemanaPL.cultivo == clave_cultivo(cultivo)
+        ).with_for_update().first()
+        if fila and pl_id in (fila.ids_usados or []):
+            fila.ids_usados = [x for x in fila.ids_usados if x != pl_id]
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def consultar_pl_id(db: Session, semana: int, cultivo: Optional[str], nave: str, etd_defecto: date) -> str:
+    """WK ID que recibiría la nave si se emitiera ahora (sin bloquear, reservar ni crear el bucket)."""
+    cultivo = clave_cultivo(cultivo)
+    fila = db.query(CorrelativoSemanaPL).filter(
+        CorrelativoSemanaPL.semana == semana, CorrelativoSemanaPL.cultivo == cultivo
+    ).first()
+    if fila:
+        naves, usados = fila.naves, list(fila.ids_usados or [])
+    else:
+        naves = calcular_naves_semanas(db, [semana]).get((semana, cultivo), {})
+        usados = _ids_usados_iniciales(db, [(semana, cultivo)])[(semana, cultivo)]
+    return _siguiente_pl_id(semana, naves, usados, nave, etd_defecto)
+
+
+def liberar_pl_id(db: Session, emision: EmisionPackingList) -> None:
+    """
+    Libera el WK ID de una emisión anulada (no confirma la transacción).
+    Emisiones con `pl_id` pero sin `semana` no salieron del asignador (WK por ETA) y no se tocan.
+    Las antiguas (sin `pl_id` ni `semana`) se ubican por el prefijo de semana del WK y su
+    cultivo se deduce del primer booking, como en `_ids_usados_iniciales`; si no se puede
+    deducir no se toca ningún bucket (el mismo WK puede estar activo en otro cultivo).
+    """
+    if emision.pl_id and emision.semana is None:
+        return
+    m = re.search(r'WK(\d+)', emision.pl_id or emision.archivo_nombre or "")
+    if not m:
+        return
+    wk = m.group(0)
+    q = db.query(CorrelativoSemanaPL)
+    if emision.semana is not None:
+        # Salió del asignador: su bucket es exactamente (semana, cultivo), aunque el cultivo sea ""
+        cultivo = clave_cultivo(emision.cultivo)
+        q = q.filter(CorrelativoSemanaPL.semana == emision.semana)
+    else:
+        cultivo = clave_cultivo(emision.cultivo) or _cultivos_legacy(db, [emision.id]).get(emision.id, "")
+        if not cultivo:
+            return
+        semanas = [s for s in range(1, 54) if wk.startswith(prefijo_semana(s))]
+        if not semanas:
+            return
+        q = q.filter(CorrelativoSemanaPL.semana.in_(semanas))
+    q = q.filter(CorrelativoSemanaPL.cultivo == cultivo)
+    for fila in q.with_for_update().all():
+        if wk in (fila.ids_usados or []):
+            fila.ids_usados = [x for x in fila.ids_usados if x != wk]
@@ -0,0 +1,133 @@
+"""
+Servicio: Cola de trabajos de Packing List
+La generación de un PL (pandas + openpyxl + SQLAlchemy) es bloqueante. Aquí se
+ejecuta en un pool acotado de hilos FUERA del event loop, para que el resto de
+la API siga respondiendo mientras se arman varias naves seguidas.
+
+- `encolar` registra el trabajo y devuelve su ID (429 si la cola está llena).
+- El trabajo reporta avance con `Trabajo.avanzar(progreso, etapa)`.
+- `ejecutar` corre una función en el mismo pool y la espera (endpoint directo).
+
+Estado en memoria del proceso (como utils/rate_limit.py): con varios workers
+de uvicorn el sondeo debe llegar al mismo worker que recibió el trabajo
+(sticky sessions) o habría que mover el estado a la BD/Redis.
+Autor: AgroFlow Dev Team
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+from typing import Any, Callable, Dict, Optional
+import asyncio
+import time
+import uuid
+
+from fastapi import HTTPException, status
+
+from app.configuracion import settings
+from app.utils.logging import logger
+
+PENDIENTE = "PENDIENTE"
+EN_PROCESO = "EN_PROCESO"
+COMPLETADO = "COMPLETADO"
+ERROR = "ERROR"
+
+_pool = ThreadPoolExecutor(max_workers=max(1, settings.PL_JOB_WORKERS), thread_name_prefix="pl-job")
+_trabajos: Dict[str, "Trabajo"] = {}
+_lock = Lock()
+
+
+class Trabajo:
+    """Estado de un trabajo de generación (lo que devuelve el sondeo)."""
+
+    def __init__(self, tipo: str, usuario: str, descripcion: str = ""):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.usuario = usuario
+        self.descripcion = descripcion
+        self.estado = PENDIENTE
+        self.progreso = 0
+        self.etapa = "En cola"
+        self.error: Optional[str] = None
+        self.codigo_error: Optional[int] = None
+        self.resultado: Dict[str, Any] = {}
+        self.creado = time.time()
+        self.iniciado: Optional[float] = None
+        self.terminado: Optional[float] = None
+
+    def avanzar(self, progreso: int, etapa: str) -> None:
+        self.progreso = max(0, min(100, int(progreso)))
+        self.etapa = etapa
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "tipo": self.tipo,
+            "descripcion": self.descripcion,
+            "usuario": self.usuario,
+            "estado": self.estado,
+            "progreso": self.progreso,
+            "etapa": self.etapa,
+            "error": self.error,
+            "creado": self.creado,
+            "iniciado": self.iniciado,
+            "terminado": self.terminado,
+            "resultado": {k: v for k, v in self.resultado.items() if not isinstance(v, bytes)},
+        }
+
+
+def _limpiar_vencidos(now: float) -> None:
+    """Elimina trabajos terminados hace más de PL_JOB_TTL_MINUTOS (llamar con el lock tomado)."""
+    corte = now - settings.PL_JOB_TTL_MINUTOS * 60
+    for job_id in [j.id for j in _trabajos.values() if j.terminado and j.terminado < corte]:
+        del _trabajos[job_id]
+
+
+def _correr(trabajo: Trabajo, fn: Callable[[Trabajo], Dict[str, Any]]) -> None:
+    trabajo.estado = EN_PROCESO
+    trabajo.iniciado = time.time()
+    trabajo.avanzar(1, "Iniciando")
+    try:
+        trabajo.resultado = fn(trabajo) or {}
+        trabajo.avanzar(100, "Completado")
+        trabajo.estado = COMPLETADO
+    except HTTPException as e:
+        trabajo.estado = ERROR
+        trabajo.error = str(e.detail)
+        trabajo.codigo_error = e.status_code
+    except Exception as e:
+        logger.error(f"Error en trabajo {trabajo.tipo} {trabajo.id}: {e}")
+        trabajo.estado = ERROR
+        trabajo.error = f"Error interno del servidor: {e}"
+        trabajo.codigo_error = 500
+    finally:
+        trabajo.terminado = time.time()
+
+
+def encolar(tipo: str, usuario: str, fn: Callable[[Trabajo], Dict[str, Any]], descripcion: str = "") -> Trabajo:
+    """Registra el trabajo y lo envía al pool. `fn` recibe el Trabajo para reportar avance."""
+    now = time.time()
+    with _lock:
+        _limpiar_vencidos(now)
+        activos = sum(1 for j in _trabajos.values() if j.estado in (PENDIENTE, EN_PROCESO))
+        if activos >= settings.PL_JOB_MAX_PENDIENTES:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Hay demasiados Packing List en cola. Espere a que terminen e intente de nuevo.",
+            )
+        trabajo = Trabajo(tipo, usuario, descripcion)
+        _trabajos[trabajo.id] = trabajo
+    _pool.submit(_correr, trabajo, fn)
+    return trabajo
+
+
+def obtener(job_id: str) -> Trabajo:
+    with _lock:
+        trabajo = _trabajos.get(job_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o expirado")
+    return trabajo
+
+
+async def ejecutar(fn: Callable[..., Any], *args: Any) -> Any:
+    """Corre `fn(*args)` en el pool de PLs sin bloquear el event loop y devuelve su resultado."""
+    return await asyncio.wrap_future(_pool.submit(fn, *args))
@@ -0,0 +1,238 @@
+"""
+Servicio: Exportación de las tablas de sincronización (/sync/*/list)
+Lectura por columnas (tuplas, sin ORM ni jsonable_encoder) y en páginas por
+clave (id > último id), para que el costo no crezca con OFFSET ni se arme la
+tabla entera en memoria.
+
+- JSON paginado: `pagina` devuelve hasta `limite` filas y el cursor siguiente.
+- Streaming: `exportar` genera la tabla (o el tramo pedido) como arreglo JSON,
+  CSV, Arrow IPC (stream) o Parquet, una página de TAM_PAGINA filas a la vez.
+- Versión de tabla: `marcar_cambio` sube la versión en la misma transacción que
+  cada escritura de /sync; `etag` la combina con los parámetros de la consulta.
+  Un cliente que repite la descarga con If-None-Match recibe 304 sin tocar las
+  filas. Los cambios hechos fuera de /sync (SQL manual) no suben la versión.
+Autor: AgroFlow Dev Team
+"""
+
+from datetime import date, datetime, time
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import csv
+import hashlib
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi.encoders import decimal_encoder
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, Numeric, Time, select
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models.sincronizacion import VersionTablaSync
+
+TAM_PAGINA = 5000
+
+MEDIA_TYPES = {
+    "json": "application/json",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+# ---------------------------------------------------------------------------
+# Versión de tabla y ETag
+# ---------------------------------------------------------------------------
+def version_tabla(db: Session, modelo) -> int:
+    version = db.query(VersionTablaSync.version).filter(VersionTablaSync.tabla == modelo.__tablename__).scalar()
+    return version or 0
+
+
+def marcar_cambio(db: Session, modelo) -> None:
+    """Sube la versión de la tabla de `modelo` (sin commit: va con la escritura que la motiva)."""
+    tabla = modelo.__tablename__
+    actualizadas = db.query(VersionTablaSync).filter(VersionTablaSync.tabla == tabla).update(
+        {VersionTablaSync.version: VersionTablaSync.version + 1}, synchronize_session=False
+    )
+    if not actualizadas:
+        db.add(VersionTablaSync(tabla=tabla, version=1))
+
+
+def etag(modelo, version: int, *parametros: Any) -> str:
+    """ETag fuerte: tabla + versión + huella de los parámetros (cada formato/tramo es una representación)."""
+    huella = hashlib.blake2b(repr(parametros).encode(), digest_size=6).hexdigest()
+    return f'"{modelo.__tablename__}-v{version}-{huella}"'
+
+
+def coincide_etag(if_none_match: Optional[str], valor: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(t.strip().removeprefix("W/") == valor for t in if_none_match.split(","))
+
+
+# ---------------------------------------------------------------------------
+# Lectura por páginas
+# ---------------------------------------------------------------------------
+def columnas(modelo) -> List[Tuple[str, Any]]:
+    """(nombre de atributo, Column) en orden del modelo: mismas claves que el JSON del ORM."""
+    return [(attr.key, attr.columns[0]) for attr in modelo.__mapper__.column_attrs]
+
+
+def _leer(db: Session, modelo, despues_de: int, limite: int) -> List[tuple]:
+    pk = modelo.__mapper__.primary_key[0]
+    consulta = select(*[c for _, c in columnas(modelo)]).where(pk > despues_de).order_by(pk).limit(limite)
+    return db.execute(consulta).all()
+
+
+def _valor_json(v: Any) -> Any:
+    if isinstance(v, (date, datetime, time)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return decimal_encoder(v)
+    return v
+
+
+def _dicts(claves: Sequence[str], filas: Sequence[tuple]) -> List[Dict[str, Any]]:
+    return [{k: _valor_json(v) for k, v in zip(claves, fila)} for fila in filas]
+
+
+def pagina(db: Session, modelo, despues_de: int = 0, limite: int = 1000) -> Dict[str, Any]:
+    """Hasta `limite` filas con id > `despues_de`; `siguiente` es el cursor de la próxima página (None al final)."""
+    claves = [k for k, _ in columnas(modelo)]
+    filas = _leer(db, modelo, despues_de, limite)
+    pos_pk = [c for _, c in columnas(modelo)].index(modelo.__mapper__.primary_key[0])
+    return {
+        "items": _dicts(claves, filas),
+        "siguiente": filas[-1][pos_pk] if len(filas) == limite else None,
+    }
+
+
+def _paginas(modelo, despues_de: int, limite: Optional[int]) -> Iterator[List[tuple]]:
+    """Páginas de TAM_PAGINA filas con sesión propia (el streaming corre después de cerrar la del request)."""
+    pos_pk = [c for _, c in columnas(modelo)].index(modelo.__mapper__.primary_key[0])
+    restantes = limite
+    db = SessionLocal()
+    try:
+        while restantes is None or restantes > 0:
+            tam = TAM_PAGINA if restantes is None else min(TAM_PAGINA, restantes)
+            filas = _leer(db, modelo, despues_de, tam)
+            if filas:
+                yield filas
+            if len(filas) < tam:
+                return
+            despues_de = filas[-1][pos_pk]
+            if restantes is not None:
+                restantes -= len(filas)
+    finally:
+        db.close()
+
+
+# ---------------------------------------------------------------------------
+# Formatos de streaming
+# ---------------------------------------------------------------------------
+def _tipo_arrow(columna) -> pa.DataType:
+    t = columna.type
+    if isinstance(t, Boolean):
+        return pa.bool_()
+    if isinstance(t, Integer):
+        return pa.int64()
+    if isinstance(t, Float):
+        return pa.float64()
+    if isinstance(t, Numeric):
+        return pa.decimal128(t.precision, t.scale) if t.precision and t.scale is not None else pa.float64()
+    if isinstance(t, DateTime):
+        return pa.timestamp("us", tz="UTC" if t.timezone else None)
+    if isinstance(t, Date):
+        return pa.date32()
+    if isinstance(t, Time):
+        return pa.time64("us")
+    return pa.string()
+
+
+class _Sumidero:
+    """Archivo de solo escritura para pyarrow: acumula lo escrito y lo entrega por partes."""
+
+    def __init__(self):
+        self._partes: List[bytes] = []
+        self._posicion = 0
+        self.closed = False
+
+    def write(self, datos) -> int:
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self) -> int:
+        return self._posicion  # Parquet guarda offsets absolutos en el footer
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def tomar(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _lote_arrow(schema: pa.Schema, filas: Sequence[tuple]) -> pa.RecordBatch:
+    return pa.RecordBatch.from_arrays(
+        [pa.array(list(valores), type=campo.type) for valores, campo in zip(zip(*filas), schema)],
+        schema=schema,
+    )
+
+
+def exportar(modelo, formato: str, despues_de: int = 0, limite: Optional[int] = None) -> Iterator[bytes]:
+    """Genera la tabla de `modelo` en `formato` (json, csv, arrow, parquet) página a página."""
+    cols = columnas(modelo)
+    claves = [k for k, _ in cols]
+    paginas = _paginas(modelo, despues_de, limite)
+
+    if formato == "json":
+        primero = True
+        yield b"["
+        for filas in paginas:
+            for d in _dicts(claves, filas):
+                yield (b"" if primero else b",") + json.dumps(d, ensure_ascii=False).encode()
+                primero = False
+        yield b"]"
+        return
+
+    if formato == "csv":
+        buffer = io.StringIO()
+        escritor = csv.writer(buffer)
+        escritor.writerow(claves)
+        for filas in paginas:
+            escritor.writerows([_valor_json(v) for v in fila] for fila in filas)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+
+    schema = pa.schema([pa.field(k, _tipo_arrow(c)) for k, c in cols])
+    sumidero = _Sumidero()
+    if formato == "arrow":
+        escritor = pa.ipc.new_stream(sumidero, schema)
+        for filas in paginas:
+            escritor.write_batch(_lote_arrow(schema, filas))
+            yield sumidero.tomar()
+    elif formato == "parquet":
+        escritor = pq.ParquetWriter(sumidero, schema)
+        for filas in paginas:
+            escritor.write_batch(_lote_arrow(schema, filas))  # un row group por página
+            yield sumidero.tomar()
+    else:
+        raise ValueError(f"Formato no soportado: {formato}")
+    escritor.close()
+    yield sumidero.tomar()
@@ -0,0 +1,501 @@
+"""
+Servicio: Ingesta masiva de sincronizaciones (Apps Script → BD)
+Escritura por lotes de las filas ya mapeadas y limpiadas por routers/sync.py.
+
+- Validación previa: cada fila se contrasta con las columnas de la tabla
+  (obligatorias, largo de textos) y las inválidas se reportan sin tocar la BD.
+- Filas repetidas por clave se fusionan en el orden del archivo: los valores
+  no nulos de la última fila pisan a los anteriores (igual que el upsert fila
+  a fila original).
+- Un INSERT ... ON CONFLICT multi-fila por lote. Si un lote falla se reintenta
+  fila a fila dentro de un savepoint: la fila mala se reporta y el resto del
+  trabajo se conserva.
+- ResolutorCabeceras: los mapeos Excel → columna se normalizan una sola vez y
+  cada firma de cabeceras (conjunto ordenado de claves del payload) se resuelve
+  una vez y queda en caché.
+- Streaming: `leer_ndjson` arma lotes de tamaño fijo a partir del cuerpo de la
+  request (NDJSON: una fila o un arreglo de filas por línea) sin materializar
+  el payload completo; `MapeadorFilas` conserva la cabecera entre lotes y el
+  avance de cada carga queda consultable por su id.
+- Huellas: cada fila sincronizada guarda un hash de su contenido (`huella`).
+  En modo delta las filas cuya huella no cambió no se escriben y solo se
+  aplican inserciones, actualizaciones y borrados.
+- Staging: `reemplazar_porciones_staging` carga las filas en una tabla
+  temporal y reemplaza las porciones afectadas con dos sentencias en la misma
+  transacción (los lectores ven el estado anterior o el nuevo, nunca uno parcial).
+Autor: AgroFlow Dev Team
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
+import json
+import re
+import time
+
+from sqlalchemy import Column, MetaData, Table, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.utils.logging import logger
+
+# Postgres admite hasta 65535 parámetros por sentencia: ~35 columnas × 1000 filas entra holgado
+TAM_LOTE = 1000
+# Errores por fila que devuelve una carga por streaming (el resto solo se cuenta)
+MAX_ERRORES = 500
+MAX_PROGRESOS = 100
+
+Fila = Tuple[int, Dict[str, Any]]  # (nro de fila en la hoja, {columna: valor})
+
+_NO_ALFANUMERICO = re.compile(r"[^A-Z0-9]")
+
+
+def limpiar_cabecera(h: Any) -> str:
+    """'Nro. Booking ' → 'NROBOOKING' (mismo criterio que el clean_header histórico)."""
+    return _NO_ALFANUMERICO.sub("", str(h).upper()) if h else ""
+
+
+class ResolutorCabeceras:
+    """
+    Mapeo {cabecera Excel: columna BD} precompilado a {cabecera limpia: columna}.
+    Ante cabeceras que limpian igual gana la primera del mapeo (como el `break`
+    del recorrido original). Las firmas ya resueltas se cachean (LRU por proceso).
+    """
+
+    MAX_FIRMAS = 64
+
+    def __init__(self, mapeo: Dict[str, str]):
+        self.prioridad: List[Tuple[str, str]] = [(limpiar_cabecera(ex), db) for ex, db in mapeo.items()]
+        self.normalizado: Dict[str, str] = {}
+        for limpia, db_col in self.prioridad:
+            self.normalizado.setdefault(limpia, db_col)
+        self._firmas: "OrderedDict[Tuple[str, Tuple[Any, ...]], Any]" = OrderedDict()
+        self._lock = Lock()
+
+    def _cacheado(self, modo: str, firma: Tuple[Any, ...], calcular):
+        llave = (modo, firma)
+        with self._lock:
+            hit = self._firmas.get(llave)
+            if hit is not None:
+                self._firmas.move_to_end(llave)
+                return hit
+        valor = calcular()
+        with self._lock:
+            self._firmas[llave] = valor
+            while len(self._firmas) > self.MAX_FIRMAS:
+                self._firmas.popitem(last=False)
+        return valor
+
+    def por_claves(self, claves: Sequence[Any]) -> Tuple[Tuple[Any, str], ...]:
+        """
+        Modo objetos: ((clave original, columna BD), ...) en el orden de las claves.
+        Si dos claves apuntan a la misma columna se queda la primera.
+        """
+        def calcular():
+            usadas, pares = set(), []
+            for clave in claves:
+                db_col = self.normalizado.get(limpiar_cabecera(clave))
+                if db_col and db_col not in usadas:
+                    usadas.add(db_col)
+                    pares.append((clave, db_col))
+            return tuple(pares)
+        return self._cacheado("claves", tuple(claves), calcular)
+
+    def por_indices(self, cabeceras: Sequence[Any]) -> Dict[str, int]:
+        """
+        Modo legado: {columna BD: índice en la fila}. La prioridad la da el orden
+        del mapeo (la primera cabecera del mapeo presente en la hoja gana).
+        """
+        def calcular():
+            posiciones: Dict[str, int] = {}
+            for i, h in enumerate(cabeceras):
+                posiciones.setdefault(limpiar_cabecera(h), i)
+            indices: Dict[str, int] = {}
+            for limpia, db_col in self.prioridad:
+                if limpia in posiciones and db_col not in indices:
+                    indices[db_col] = posiciones[limpia]
+            return indices
+        return dict(self._cacheado("indices", tuple(cabeceras), calcular))
+
+
+class MapeadorFilas:
+    """
+    Filas del payload → (nro de fila en la hoja, {columna: valor crudo}).
+    El modo lo fija la primera fila: dicts (objetos) o listas (legado, la
+    primera es la cabecera). El estado persiste entre lotes (streaming).
+    """
+
+    def __init__(self, resolutor: ResolutorCabeceras):
+        self.resolutor = resolutor
+        self.objetos: Optional[bool] = None
+        self.indices: Optional[Dict[str, int]] = None
+        self.mapeo: Dict[str, str] = {}
+        self.filas = 0
+
+    def mapear(self, rows: Iterable[Any], errores: List[Dict[str, Any]]) -> List[Fila]:
+        crudas: List[Fila] = []
+        for row in rows:
+            if self.objetos is None:
+                self.objetos = isinstance(row, dict)
+            if not self.objetos and self.indices is None:
+                self.indices = self.resolutor.por_indices(row)
+                self.mapeo = {str(row[idx]): db_col for db_col, idx in self.indices.items()}
+                continue
+            self.filas += 1
+            nro = self.filas + 1  # la fila 1 de la hoja es la cabecera
+            try:
+                if self.objetos:
+                    pares = self.resolutor.por_claves(tuple(row))
+                    for orig_key, db_col in pares:
+                        self.mapeo.setdefault(orig_key, db_col)
+                    crudas.append((nro, {db_col: row[orig_key] for orig_key, db_col in pares}))
+                else:
+                    crudas.append((nro, {db_col: row[idx] for db_col, idx in self.indices.items() if idx < len(row)}))
+            except Exception as e:
+                errores.append({"row": nro, "error": str(e)})
+        return crudas
+
+
+def _filas_de_linea(linea: bytes) -> List[Any]:
+    """Una línea NDJSON → filas: objeto, fila legado (lista de valores) o arreglo de filas."""
+    texto = linea.strip()
+    if not texto:
+        return []
+    valor = json.loads(texto)
+    if isinstance(valor, str):  # Apps Script a veces envía JSON doblemente codificado
+        valor = json.loads(valor)
+    if isinstance(valor, dict):
+        return [valor]
+    if isinstance(valor, list):
+        if valor and all(isinstance(v, (dict, list)) for v in valor):
+            return valor
+        return [valor] if valor else []
+    raise ValueError("Se esperaba un objeto o un arreglo")
+
+
+async def leer_ndjson(chunks: AsyncIterator[bytes], tam_lote: int, errores: List[Dict[str, Any]]) -> AsyncIterator[List[Any]]:
+    """
+    Lotes de hasta `tam_lote` filas leídos del cuerpo NDJSON a medida que llega.
+    Las líneas ilegibles se reportan en `errores` ({"linea", "error"}) y se saltan.
+    """
+    pendiente = b""
+    lote: List[Any] = []
+    nro_linea = 0
+
+    def procesar(linea: bytes):
+        nonlocal nro_linea
+        nro_linea += 1
+        try:
+            lote.extend(_filas_de_linea(linea))
+        except ValueError as e:
+            errores.append({"linea": nro_linea, "error": str(e)})
+
+    async for chunk in chunks:
+        pendiente += chunk
+        if b"\n" not in chunk:
+            continue
+        *lineas, pendiente = pendiente.split(b"\n")
+        for linea in lineas:
+            procesar(linea)
+            while len(lote) >= tam_lote:
+                yield lote[:tam_lote]
+                del lote[:tam_lote]
+    procesar(pendiente)
+    while lote:
+        yield lote[:tam_lote]
+        del lote[:tam_lote]
+
+
+_progreso: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lock_progreso = Lock()
+
+
+def publicar_progreso(sync_id: str, datos: Dict[str, Any]) -> None:
+    """Guarda el avance de una carga (en memoria por proceso, como pl_jobs)."""
+    with _lock_progreso:
+        _progreso[sync_id] = {**datos, "actualizado": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        _progreso.move_to_end(sync_id)
+        while len(_progreso) > MAX_PROGRESOS:
+            _progreso.popitem(last=False)
+
+
+def consultar_progreso(sync_id: str) -> Optional[Dict[str, Any]]:
+    with _lock_progreso:
+        datos = _progreso.get(sync_id)
+        return dict(datos) if datos else None
+
+
+def validar_fila(tabla, fila: Dict[str, Any]) -> Optional[str]:
+    """Motivo por el que la fila no se puede escribir en `tabla`, o None si es válida."""
+    for col, val in fila.items():
+        columna = tabla.c.get(col)
+        if columna is None:
+            return f"Columna desconocida: {col}"
+        if val is None:
+            if not columna.nullable and not columna.primary_key:
+                return f"{col}: valor obligatorio"
+            continue
+        largo = getattr(columna.type, "length", None)
+        if largo and isinstance(val, str) and len(val) > largo:
+            return f"{col}: '{val[:30]}' excede {largo} caracteres"
+    return None
+
+
+def huella_fila(datos: Dict[str, Any]) -> str:
+    """Hash estable (32 hex) del contenido de una fila ya limpia, sin la propia huella."""
+    contenido = json.dumps(sorted((k, v) for k, v in datos.items() if k != "huella"), default=str, ensure_ascii=False)
+    return hashlib.blake2b(contenido.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def huellas_existentes(db: Session, tabla, clave: str, valores: List[Any]) -> Dict[Any, Optional[str]]:
+    """{clave: huella guardada} de las filas existentes entre `valores` (IN por lotes)."""
+    encontradas: Dict[Any, Optional[str]] = {}
+    for inicio in range(0, len(valores), TAM_LOTE):
+        parte = valores[inicio:inicio + TAM_LOTE]
+        for k, h in db.execute(select(tabla.c[clave], tabla.c.huella).where(tabla.c[clave].in_(parte))):
+            encontradas[k] = h
+    return encontradas
+
+
+def diferencias(existentes: List[Any], nuevas: List[Dict[str, Any]], campo_par: str) -> Dict[str, Any]:
+    """
+    Compara un grupo que se reemplaza completo (p. ej. una porción cultivo/planta)
+    contra lo guardado. `existentes`: filas con id, huella y `campo_par`.
+    Cada fila nueva con una huella igual a una existente queda sin cambios; las
+    restantes se emparejan por `campo_par` (actualización) o se insertan, y las
+    existentes sobrantes se borran.
+    """
+    libres: Dict[Optional[str], List[Any]] = {}
+    for fila in existentes:
+        libres.setdefault(fila.huella, []).append(fila)
+
+    sin_cambios, pendientes = 0, []
+    for datos in nuevas:
+        iguales = libres.get(datos["huella"])
+        if iguales:
+            iguales.pop()
+            sin_cambios += 1
+        else:
+            pendientes.append(datos)
+
+    por_par: Dict[Any, List[Any]] = {}
+    for grupo in libres.values():
+        for fila in grupo:
+            por_par.setdefault(getattr(fila, campo_par), []).append(fila)
+
+    insertar, actualizar = [], []
+    for datos in pendientes:
+        candidatas = por_par.get(datos.get(campo_par))
+        if candidatas:
+            actualizar.append({**datos, "id": candidatas.pop().id})
+        else:
+            insertar.append(datos)
+    eliminar = [fila.id for grupo in por_par.values() for fila in grupo]
+    return {"insertar": insertar, "actualizar": actualizar, "eliminar": eliminar, "sin_cambios": sin_cambios}
+
+
+def aplicar_diferencias(db: Session, modelo, dif: Dict[str, Any]) -> Dict[str, int]:
+    """
+    Escribe el resultado de `diferencias` (sin commit). Las actualizaciones
+    reemplazan la fila completa: las columnas que no vinieron quedan en NULL,
+    igual que con el borrado y reinserción del modo completo.
+    """
+    tabla = modelo.__table__
+    datos_cols = [c.name for c in tabla.c if not c.primary_key and c.server_default is None]
+    if dif["actualizar"]:
+        db.bulk_update_mappings(modelo, [{c: d.get(c) for c in datos_cols} | {"id": d["id"]} for d in dif["actualizar"]])
+    if dif["insertar"]:
+        db.bulk_insert_mappings(modelo, dif["insertar"])
+    for inicio in range(0, len(dif["eliminar"]), TAM_LOTE):
+        db.execute(tabla.delete().where(tabla.c.id.in_(dif["eliminar"][inicio:inicio + TAM_LOTE])))
+    return {
+        "insertadas": len(dif["insertar"]),
+        "actualizadas": len(dif["actualizar"]),
+        "eliminadas": len(dif["eliminar"]),
+        "sin_cambios": dif["sin_cambios"],
+    }
+
+
+def sumar_delta(destino: Dict[str, int], conteos: Dict[str, int]) -> None:
+    for k, v in conteos.items():
+        destino[k] = destino.get(k, 0) + v
+
+
+def reemplazar_porciones_staging(db: Session, modelo, filas: List[Dict[str, Any]], porcion: Sequence[str]) -> Dict[str, int]:
+    """
+    Reemplaza en `modelo` las porciones (p. ej. cultivo, planta) presentes en
+    `filas` (con huella) vía una tabla temporal. Las filas idénticas (misma
+    huella, contadas como multiconjunto por porción) no se tocan: solo se borran
+    las que ya no vienen y se insertan las nuevas. No hace commit.
+    """
+    tabla = modelo.__table__
+    cols = [c.name for c in tabla.c if not c.primary_key and c.server_default is None]
+    staging = Table(f"tmp_{tabla.name}_sync", MetaData(), *[Column(c, tabla.c[c].type) for c in cols], prefixes=["TEMPORARY"])
+
+    conn = db.connection()
+    staging.drop(conn, checkfirst=True)  # la conexión del pool pudo quedar con una de una carga abortada
+    staging.create(conn)
+    for inicio in range(0, len(filas), TAM_LOTE):
+        conn.execute(staging.insert(), [{c: f.get(c) for c in cols} for f in filas[inicio:inicio + TAM_LOTE]])
+
+    t, st = tabla.name, staging.name
+    lista = ", ".join(cols)
+    claves = ", ".join(porcion)
+    claves_p = ", ".join(f"p.{c}" for c in porcion)
+    particion = ", ".join([*porcion, "huella"])
+    en_porcion = " AND ".join(f"p.{c} = s.{c}" for c in porcion)
+    igual = " AND ".join(f"n.{c} = v.{c}" for c in [*porcion, "huella"])
+
+    # 1) Borrar las filas de las porciones que no tienen par en staging
+    borradas = conn.execute(text(f"""
+        DELETE FROM {t} WHERE id IN (
+            SELECT v.id FROM (
+                SELECT p.id, {claves_p}, p.huella,
+                       row_number() OVER (PARTITION BY {claves_p}, p.huella ORDER BY p.id) AS rn
+                FROM {t} p JOIN (SELECT DISTINCT {claves} FROM {st}) s ON {en_porcion}
+            ) v
+            LEFT JOIN (
+                SELECT {particion}, row_number() OVER (PARTITION BY {particion}) AS rn FROM {st}
+            ) n ON {igual} AND n.rn = v.rn
+            WHERE n.rn IS NULL
+        )
+    """)).rowcount
+
+    # 2) Insertar las filas de staging que exceden a las que quedaron con el mismo contenido
+    insertadas = conn.execute(text(f"""
+        INSERT INTO {t} ({lista})
+        SELECT {", ".join(f"n.{c}" for c in cols)} FROM (
+            SELECT {lista}, row_number() OVER (PARTITION BY {particion}) AS rn FROM {st}
+        ) n
+        LEFT JOIN (
+            SELECT {claves_p}, p.huella, count(*) AS k
+            FROM {t} p JOIN (SELECT DISTINCT {claves} FROM {st}) s ON {en_porcion}
+            GROUP BY {claves_p}, p.huella
+        ) v ON {igual}
+        WHERE n.rn > COALESCE(v.k, 0)
+    """)).rowcount
+    # Ante un error el rollback del llamador descarta también la tabla temporal (DDL transaccional)
+    staging.drop(conn)
+
+    return {"insertadas": insertadas, "eliminadas": borradas, "sin_cambios": len(filas) - insertadas}
+
+
+def fusionar_por_clave(filas: List[Fila], clave: str, reemplazar: bool = False) -> List[Fila]:
+    """
+    Una fila por clave, en el orden de aparición. Por defecto los no nulos
+    posteriores pisan a los anteriores; con `reemplazar` se queda la primera fila.
+    """
+    fusion: Dict[Any, Fila] = {}
+    for nro, datos in filas:
+        previa = fusion.get(datos[clave])
+        if previa is None:
+            fusion[datos[clave]] = (nro, dict(datos))
+        elif not reemplazar:
+            previa[1].update({k: v for k, v in datos.items() if v is not None})
+    return list(fusion.values())
+
+
+def _sentencia_upsert(tabla, clave: str, lote: List[Dict[str, Any]], reemplazar: bool = False):
+    """
+    INSERT multi-fila; ante conflicto solo actualiza con los valores no nulos
+    (COALESCE), o con todos los recibidos si `reemplazar`.
+    """
+    columnas = sorted({c for fila in lote for c in fila})
+    valores = [{c: fila.get(c) for c in columnas} for fila in lote]
+    stmt = insert(tabla).values(valores)
+    if reemplazar:
+        set_ = {c: stmt.excluded[c] for c in columnas if c != clave}
+    else:
+        set_ = {c: func.coalesce(stmt.excluded[c], tabla.c[c]) for c in columnas if c != clave}
+    if not set_:
+        return stmt.on_conflict_do_nothing(index_elements=[tabla.c[clave]])
+    return stmt.on_conflict_do_update(index_elements=[tabla.c[clave]], set_=set_)
+
+
+def upsert_por_lotes(
+    db: Session, modelo, filas: List[Fila], clave: str, tam_lote: int = TAM_LOTE,
+    delta: bool = False, reemplazar: bool = False,
+) -> Dict[str, Any]:
+    """
+    Valida, fusiona y escribe `filas` en `modelo` con upserts multi-fila por `clave`.
+    Si la tabla tiene `huella` se guarda la de cada fila; con `delta` las filas
+    cuya huella coincide con la guardada no se escriben. Con `reemplazar` cada
+    fila pisa completa a la guardada (ver fusionar_por_clave/_sentencia_upsert).
+    No hace commit: el llamador cierra la transacción.
+    Devuelve {"processed", "errors": [{"row", "error"}], "fusionadas", "lotes",
+    "escritas": [claves efectivamente escritas]}
+    (+ "delta": {"insertadas", "actualizadas", "eliminadas", "sin_cambios"}).
+    """
+    tabla = modelo.__table__
+    resumen: Dict[str, Any] = {"processed": 0, "errors": [], "fusionadas": 0, "lotes": 0, "escritas": []}
+
+    validas: List[Fila] = []
+    for nro, datos in filas:
+        error = validar_fila(tabla, datos)
+        if error:
+            resumen["errors"].append({"row": nro, "error": error})
+        else:
+            validas.append((nro, datos))
+
+    unicas = fusionar_por_clave(validas, clave, reemplazar)
+    resumen["fusionadas"] = len(validas) - len(unicas)
+    # Cuántas filas del archivo representa cada clave (para el conteo de procesadas)
+    aportes: Dict[Any, int] = {}
+    for _, datos in validas:
+        aportes[datos[clave]] = aportes.get(datos[clave], 0) + 1
+
+    if "huella" in tabla.c:
+        for _, datos in unicas:
+            datos["huella"] = huella_fila(datos)
+    if delta:
+        guardadas = huellas_existentes(db, tabla, clave, [d[clave] for _, d in unicas])
+        conteo = {"insertadas": 0, "actualizadas": 0, "eliminadas": 0, "sin_cambios": 0}
+        cambiadas = []
+        for nro, datos in unicas:
+            if datos[clave] not in guardadas:
+                conteo["insertadas"] += 1
+            elif guardadas[datos[clave]] == datos["huella"]:
+                conteo["sin_cambios"] += 1
+                resumen["processed"] += aportes[datos[clave]]
+                continue
+            else:
+                conteo["actualizadas"] += 1
+            cambiadas.append((nro, datos))
+        resumen["delta"] = conteo
+        unicas = cambiadas
+
+    for inicio in range(0, len(unicas), tam_lote):
+        lote = unicas[inicio:inicio + tam_lote]
+        resumen["lotes"] += 1
+        try:
+            with db.begin_nested():
+                db.execute(_sentencia_upsert(tabla, clave, [d for _, d in lote], reemplazar))
+            resumen["processed"] += sum(aportes[d[clave]] for _, d in lote)
+            resumen["escritas"].extend(d[clave] for _, d in lote)
+            continue
+        except Exception as e:
+            logger.warning(f"Lote {resumen['lotes']} de {tabla.name} falló ({e}); reintentando fila a fila")
+
+        for nro, datos in lote:
+            try:
+                with db.begin_nested():
+                    db.execute(_sentencia_upsert(tabla, clave, [datos], reemplazar))
+                resumen["processed"] += aportes[datos[clave]]
+                resumen["escritas"].append(datos[clave])
+            except Exception as e:
+                resumen["errors"].append({"row": nro, "error": str(e)})
+
+    resumen["errors"].sort(key=lambda e: e["row"])
+    return resumen
+
+
+class Cronometro:
+    """Duración y filas/segundo de una ingesta, para el resumen de la respuesta."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+
+    def metricas(self, filas: int) -> Dict[str, float]:
+        duracion = max(time.perf_counter() - self.inicio, 1e-6)
+        return {"duracion_s": round(duracion, 3), "filas_por_segundo": round(filas / duracion, 1)}
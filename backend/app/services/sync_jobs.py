@@ -0,0 +1,284 @@
+"""
+Servicio: Cola de trabajos de sincronización con claves de idempotencia
+Las cargas grandes de las hojas de cálculo se aceptan al instante (202) y se
+procesan en un pool propio de hilos, fuera del event loop y sin competir con
+la cola de Packing List. Mismo modelo que pl_jobs: estado en memoria del
+proceso, sondeo por ID y limpieza de trabajos vencidos.
+
+- Cada envío trae una clave de idempotencia (cabecera Idempotency-Key). La
+  clave, la huella del contenido y el estado del trabajo se guardan en
+  sync_claves_idempotencia (insert atómico por PK), así que un reintento con la
+  misma clave y el mismo contenido devuelve el trabajo ya registrado aunque el
+  proceso se haya reiniciado o el trabajo haya vencido en memoria; con otro
+  contenido → 409. Las claves se conservan SYNC_JOB_RETENCION_DIAS.
+- Un trabajo terminado en ERROR libera su clave: el reintento se vuelve a
+  procesar (las escrituras por lote son upserts/reemplazos, repetirlas es seguro).
+  Lo mismo un trabajo que quedó PENDIENTE/EN_PROCESO en un proceso anterior
+  (reinicio/redeploy): se informa como interrumpido y el reintento lo retoma.
+- Las filas con error se guardan en el trabajo y se consultan paginadas mientras
+  siga en memoria; de un trabajo recuperado de la BD solo queda el total.
+
+Supone un único worker de uvicorn (como pl_jobs): la cola y el identificador
+PROCESO son por proceso, y un trabajo en curso de otro proceso se considera
+interrumpido.
+
+Con SYNC_JOB_WORKERS=1 (por defecto) las cargas se aplican de a una, en el
+orden en que llegaron.
+Autor: AgroFlow Dev Team
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import time
+import uuid
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+
+from app.configuracion import settings
+from app.database import SessionLocal
+from app.models.sincronizacion import ClaveIdempotenciaSync
+from app.services.pl_jobs import COMPLETADO, EN_PROCESO, ERROR, PENDIENTE, Trabajo
+from app.utils.logging import logger
+
+_pool = ThreadPoolExecutor(max_workers=max(1, settings.SYNC_JOB_WORKERS), thread_name_prefix="sync-job")
+_trabajos: Dict[str, "TrabajoSync"] = {}
+_por_clave: Dict[str, str] = {}  # clave de idempotencia → job_id
+_lock = Lock()
+PROCESO = uuid.uuid4().hex  # Identifica este proceso en las claves persistidas
+LARGO_MAXIMO_CLAVE = 200
+_INTERVALO_PODA = 3600
+_ultima_poda = 0.0
+
+
+class TrabajoSync(Trabajo):
+    """Trabajo de pl_jobs más la clave de idempotencia, la huella del envío y las filas con error."""
+
+    def __init__(self, tipo: str, clave: str, huella: str, descripcion: str = ""):
+        super().__init__(tipo, "sync", descripcion)
+        self.clave = clave
+        self.huella = huella
+        self.errores: List[Dict[str, Any]] = []
+        self.recuperado = False  # Reconstruido desde la BD: sin detalle de errores
+
+    def to_dict(self) -> Dict[str, Any]:
+        datos = super().to_dict()
+        datos.pop("usuario")
+        datos["clave"] = self.clave
+        datos["errores"] = self.resultado.get("errores", 0) if self.recuperado else len(self.errores)
+        return datos
+
+
+def _desde_fila(fila: ClaveIdempotenciaSync) -> TrabajoSync:
+    """Trabajo reconstruido desde su clave persistida (otro proceso o vencido en memoria)."""
+    trabajo = TrabajoSync(fila.tipo, fila.clave, fila.huella, fila.descripcion or "")
+    trabajo.id = fila.job_id
+    trabajo.recuperado = True
+    trabajo.estado = fila.estado
+    trabajo.resultado = fila.resultado or {}
+    trabajo.error = fila.error
+    if fila.fecha_creacion:
+        trabajo.creado = fila.fecha_creacion.timestamp()
+    if fila.estado in (PENDIENTE, EN_PROCESO) and fila.proceso != PROCESO:
+        trabajo.estado = ERROR
+        trabajo.error = "Sincronización interrumpida por un reinicio del servidor; reenvíe con la misma clave."
+    if trabajo.estado == COMPLETADO:
+        trabajo.avanzar(100, "Completado")
+    if trabajo.estado == ERROR:
+        trabajo.codigo_error = 500
+        trabajo.etapa = "Error"
+    if trabajo.estado in (COMPLETADO, ERROR) and fila.fecha_actualizacion:
+        trabajo.terminado = fila.fecha_actualizacion.timestamp()
+    return trabajo
+
+
+def huella_envio(cuerpo: bytes, *opciones: Any) -> str:
+    """Huella del contenido de un envío (cuerpo + opciones de la carga) para comparar reintentos."""
+    h = hashlib.blake2b(cuerpo, digest_size=16)
+    h.update(repr(opciones).encode())
+    return h.hexdigest()
+
+
+def _limpiar_vencidos(now: float) -> None:
+    """Elimina trabajos terminados hace más de SYNC_JOB_TTL_MINUTOS y sus claves (con el lock tomado)."""
+    corte = now - settings.SYNC_JOB_TTL_MINUTOS * 60
+    for trabajo in [j for j in _trabajos.values() if j.terminado and j.terminado < corte]:
+        del _trabajos[trabajo.id]
+        if _por_clave.get(trabajo.clave) == trabajo.id:
+            del _por_clave[trabajo.clave]
+
+
+def _podar_claves(db, now: float) -> None:
+    """Borra, como mucho una vez por hora, las claves terminadas hace más de SYNC_JOB_RETENCION_DIAS."""
+    global _ultima_poda
+    if now - _ultima_poda < _INTERVALO_PODA:
+        return
+    _ultima_poda = now
+    corte = datetime.now(timezone.utc) - timedelta(days=settings.SYNC_JOB_RETENCION_DIAS)
+    db.query(ClaveIdempotenciaSync).filter(
+        ClaveIdempotenciaSync.estado.in_((COMPLETADO, ERROR)),
+        ClaveIdempotenciaSync.fecha_actualizacion < corte,
+    ).delete(synchronize_session=False)
+    db.commit()
+
+
+def _validar_reintento(tipo_previo: str, huella_previa: str, tipo: str, huella: str) -> None:
+    if tipo_previo != tipo or huella_previa != huella:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="La clave de idempotencia ya se usó con otro contenido.",
+        )
+
+
+def _reservar_clave(trabajo: TrabajoSync, now: float) -> Optional[TrabajoSync]:
+    """
+    Inserta la clave del trabajo nuevo. Si ya existía devuelve el trabajo
+    registrado (reintento), salvo que haya terminado en ERROR o quedado en curso
+    en otro proceso: entonces la fila pasa a apuntar al trabajo nuevo (None).
+    """
+    db = SessionLocal()
+    try:
+        _podar_claves(db, now)
+        db.add(ClaveIdempotenciaSync(
+            clave=trabajo.clave, tipo=trabajo.tipo, huella=trabajo.huella, job_id=trabajo.id,
+            estado=PENDIENTE, proceso=PROCESO, descripcion=trabajo.descripcion[:200],
+        ))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        fila = db.query(ClaveIdempotenciaSync).filter(
+            ClaveIdempotenciaSync.clave == trabajo.clave
+        ).with_for_update().first()
+        if fila is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La clave de idempotencia se está registrando en paralelo. Reintente con la misma clave.",
+            )
+        _validar_reintento(fila.tipo, fila.huella, trabajo.tipo, trabajo.huella)
+        if fila.estado == COMPLETADO or (fila.estado in (PENDIENTE, EN_PROCESO) and fila.proceso == PROCESO):
+            previo = _desde_fila(fila)
+            db.rollback()
+            return previo
+
+        fila.job_id = trabajo.id
+        fila.estado = PENDIENTE
+        fila.proceso = PROCESO
+        fila.descripcion = trabajo.descripcion[:200]
+        fila.resultado = None
+        fila.error = None
+        db.commit()
+        return None
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+def _persistir_estado(trabajo: TrabajoSync) -> None:
+    """Guarda el estado final del trabajo en su clave; un fallo aquí no altera el trabajo."""
+    db = SessionLocal()
+    try:
+        resultado = json.loads(json.dumps(
+            {k: v for k, v in trabajo.resultado.items() if not isinstance(v, bytes)}, default=str
+        ))
+        db.query(ClaveIdempotenciaSync).filter(ClaveIdempotenciaSync.job_id == trabajo.id).update(
+            {"estado": trabajo.estado, "resultado": resultado, "error": trabajo.error},
+            synchronize_session=False,
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"No se pudo guardar el estado de la sincronización {trabajo.id} (clave {trabajo.clave}): {e}")
+    finally:
+        db.close()
+
+
+def _correr(trabajo: TrabajoSync, fn: Callable[[TrabajoSync], Dict[str, Any]]) -> None:
+    trabajo.estado = EN_PROCESO
+    trabajo.iniciado = time.time()
+    trabajo.avanzar(1, "Iniciando")
+    try:
+        trabajo.resultado = fn(trabajo) or {}
+        trabajo.avanzar(100, "Completado")
+        trabajo.estado = COMPLETADO
+    except Exception as e:
+        logger.error(f"Error en sincronización {trabajo.tipo} {trabajo.id} (clave {trabajo.clave}): {e}")
+        trabajo.estado = ERROR
+        trabajo.error = str(e)
+        trabajo.codigo_error = 500
+    finally:
+        trabajo.terminado = time.time()
+        _persistir_estado(trabajo)
+
+
+def encolar(
+    tipo: str, clave: str, huella: str, fn: Callable[[TrabajoSync], Dict[str, Any]], descripcion: str = ""
+) -> Tuple[TrabajoSync, bool]:
+    """
+    Registra y envía al pool la carga `clave`, salvo que ya exista: devuelve
+    (trabajo, nuevo). `fn` recibe el TrabajoSync para reportar avance y errores.
+    Consulta la BD: llamar fuera del event loop.
+    """
+    now = time.time()
+    with _lock:
+        _limpiar_vencidos(now)
+        previo = _trabajos.get(_por_clave.get(clave, ""))
+        if previo and previo.estado != ERROR:
+            _validar_reintento(previo.tipo, previo.huella, tipo, huella)
+            return previo, False
+        activos = sum(1 for j in _trabajos.values() if j.estado in (PENDIENTE, EN_PROCESO))
+        if activos >= settings.SYNC_JOB_MAX_PENDIENTES:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Hay demasiadas sincronizaciones en cola. Reintente en unos minutos con la misma clave.",
+            )
+        trabajo = TrabajoSync(tipo, clave, huella, descripcion)
+        previo = _reservar_clave(trabajo, now)
+        if previo:
+            return previo, False
+        _trabajos[trabajo.id] = trabajo
+        _por_clave[clave] = trabajo.id
+    _pool.submit(_correr, trabajo, fn)
+    return trabajo, True
+
+
+def obtener(job_id: str) -> TrabajoSync:
+    """Trabajo en memoria o, si ya no está (reinicio, TTL), reconstruido desde su clave."""
+    with _lock:
+        trabajo = _trabajos.get(job_id)
+    if trabajo:
+        return trabajo
+    db = SessionLocal()
+    try:
+        fila = db.query(ClaveIdempotenciaSync).filter(ClaveIdempotenciaSync.job_id == job_id).first()
+        if not fila:
+            raise HTTPException(status_code=404, detail="Sincronización no encontrada o expirada")
+        return _desde_fila(fila)
+    finally:
+        db.close()
+
+
+def errores(job_id: str, offset: int = 0, limite: int = 500) -> Dict[str, Any]:
+    """Página de filas con error de la carga (orden por fila de la hoja)."""
+    trabajo = obtener(job_id)
+    if trabajo.recuperado:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="El detalle de filas con error ya no está disponible; el total está en el resultado del trabajo.",
+        )
+    filas = trabajo.errores
+    return {
+        "job_id": trabajo.id,
+        "estado": trabajo.estado,
+        "total": len(filas),
+        "offset": offset,
+        "errores": filas[offset:offset + limite],
+    }
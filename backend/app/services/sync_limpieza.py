@@ -0,0 +1,116 @@
+"""
+Servicio: Limpieza columnar de valores de sincronización
+Equivalente por columnas de la limpieza celda a celda de routers/sync.py: los
+valores se agrupan por columna destino y se limpian según su tipo.
+
+- Nulos y errores de Excel ("", "-", "N/A", "#REF!", ...) → None; "0" → None
+  salvo en columnas numéricas.
+- Numéricas: SI/NO → 1/0 en CAJAS_VACIAS; primer número del texto (sin comas)
+  con regex vectorizada de pandas. Sin número → se trata como texto.
+- Fechas: meses en español → inglés y dateutil con dayfirst, memoizado por
+  texto (en un Plan Maestro las mismas fechas se repiten miles de veces).
+- Horas: dateutil memoizado. Texto: sin ';', recortado y en mayúsculas.
+Autor: AgroFlow Dev Team
+"""
+
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence
+from datetime import date, time
+
+import pandas as pd
+from dateutil.parser import parse as parse_date
+
+NULOS = frozenset({"", "-", "N/A", "NONE", "NULL", "NAN", "#¡VALOR!", "#VALUE!", "#REF!", "#DIV/0!", "#N/A", "#NAME?", "#¿NOMBRE?"})
+COLUMNAS_NUMERICAS = frozenset({"PESO_POR_CAJA", "CAJA_POR_PALLET", "TOTAL_PALLETS", "TOTAL_CAJAS", "SEMANA_ETA", "CAJAS_VACIAS"})
+COLUMNAS_FECHA = frozenset({"ETD", "ETA", "FECHA_PROGRAMADA", "FECHA_LLENADO_REPORTE"})
+COLUMNAS_HORA = frozenset({"HORA_PROGRAMADA", "HORA_LLENADO_REPORTE"})
+
+# Traducción básica de meses en español a inglés para el parser (el orden importa: reemplazos en cadena)
+MESES_ES_EN = {
+    "ENE": "JAN", "FEB": "FEB", "MAR": "MAR", "ABR": "APR", "MAY": "MAY", "JUN": "JUN",
+    "JUL": "JUL", "AGO": "AUG", "SEP": "SEP", "OCT": "OCT", "NOV": "NOV", "DIC": "DEC"
+}
+
+_NUMERO = r"(\d+(?:\.\d+)?)"
+
+
+@lru_cache(maxsize=4096)
+def _fecha(texto: str) -> Optional[date]:
+    try:
+        return parse_date(texto, dayfirst=True).date()
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=1024)
+def _hora(texto: str) -> Optional[time]:
+    try:
+        return parse_date(texto).time()
+    except Exception:
+        return None
+
+
+def limpiar_columna(valores: Sequence[Any], db_column: str) -> List[Any]:
+    """Valores limpios de `db_column`, en el mismo orden (mismo resultado que clean_data_value)."""
+    col = db_column.upper()
+    salida: List[Any] = [None] * len(valores)
+    if not salida:
+        return salida
+
+    texto = pd.Series(["" if v is None else str(v) for v in valores], dtype=object).str.strip()
+    mayus = texto.str.upper()
+    nulo = mayus.isin(NULOS)
+    if col not in COLUMNAS_NUMERICAS:
+        nulo |= texto == "0"
+    vivos = ~nulo
+    como_texto = vivos
+
+    if col in COLUMNAS_NUMERICAS:
+        pendientes = vivos
+        if col == "CAJAS_VACIAS":
+            for flag, valor in (("SI", 1), ("NO", 0)):
+                coincide = pendientes & (mayus == flag)
+                for i in coincide[coincide].index:
+                    salida[i] = valor
+                pendientes = pendientes & ~coincide
+        numeros = texto[pendientes].str.replace(",", "", regex=False).str.extract(_NUMERO, expand=False).dropna()
+        convertidos = numeros.astype(float)
+        if col != "PESO_POR_CAJA":
+            convertidos = convertidos.map(int)
+        for i, v in zip(convertidos.index, convertidos.tolist()):
+            salida[i] = v
+        como_texto = pendientes & ~pendientes.index.isin(numeros.index)
+
+    elif col in COLUMNAS_FECHA:
+        traducido = mayus[vivos]
+        for es, en in MESES_ES_EN.items():
+            traducido = traducido.str.replace(es, en, regex=False)
+        unicos = {t: _fecha(t) for t in traducido.unique()}
+        for i, t in zip(traducido.index, traducido.tolist()):
+            salida[i] = unicos[t]
+        return salida
+
+    elif col in COLUMNAS_HORA:
+        horas = texto[vivos]
+        unicos = {t: _hora(t) for t in horas.unique()}
+        for i, t in zip(horas.index, horas.tolist()):
+            salida[i] = unicos[t]
+        return salida
+
+    limpio = texto[como_texto].str.replace(";", "", regex=False).str.strip().str.upper()
+    for i, v in zip(limpio.index, limpio.tolist()):
+        salida[i] = v
+    return salida
+
+
+def limpiar_filas(filas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Limpia en sitio {columna: valor crudo} de todas las filas, una columna a la vez."""
+    por_columna: Dict[str, List[int]] = {}
+    for i, fila in enumerate(filas):
+        for col in fila:
+            por_columna.setdefault(col, []).append(i)
+    for col, indices in por_columna.items():
+        limpios = limpiar_columna([filas[i][col] for i in indices], col)
+        for i, v in zip(indices, limpios):
+            filas[i][col] = v
+    return filas
@@ -0,0 +1,101 @@
+"""
+Servicio: Parser de Termógrafos
+Convierte el archivo TERMOGRAFOS (hoja 1, cabecera en la fila 2, columna 12 =
+código de termógrafo, columna 13 = ID de pallet) en el mapa {pallet: código}.
+
+- Parseo vectorizado: solo se leen las dos columnas y se filtran con pandas.
+- Caché LRU por hash del contenido: el mismo archivo se vuelve a subir para
+  cada nave de la semana y en ese caso no se parsea de nuevo.
+Autor: AgroFlow Dev Team
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict
+import hashlib
+import io
+
+import pandas as pd
+
+from app.utils.logging import logger
+
+COL_CODIGO = 12
+COL_PALLET = 13
+
+# Límites de la caché (por proceso): cantidad de archivos y total de pallets
+MAX_ARCHIVOS = 32
+MAX_PALLETS = 200_000
+
+_cache: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+_pallets_en_cache = 0
+_hits = 0
+_misses = 0
+_lock = Lock()
+
+
+def parse_termografos(contenido: bytes) -> Dict[str, str]:
+    """
+    {ID pallet (mayúsculas): código de termógrafo}. Ante filas repetidas gana la última
+    (mismo criterio que el recorrido fila a fila original). Archivo ilegible → {}.
+    """
+    try:
+        df = pd.read_excel(io.BytesIO(contenido), engine="openpyxl", header=None, usecols=[COL_CODIGO, COL_PALLET])
+    except ValueError:
+        return {}  # La hoja no llega a la columna 13
+    if df.shape[1] < 2:
+        return {}
+
+    codigos, pallets = df[COL_CODIGO], df[COL_PALLET]
+    con_datos = codigos.notna() & pallets.notna()
+    pallets = pallets[con_datos].astype(str).str.strip().str.upper()
+    codigos = codigos[con_datos].astype(str).str.strip()
+    validos = (pallets != "") & (codigos != "") & (pallets != "ID PALLET")
+    return dict(zip(pallets[validos], codigos[validos]))
+
+
+def _guardar(clave: str, mapa: Dict[str, str]) -> None:
+    """Inserta en la caché respetando los límites (llamar con el lock tomado)."""
+    global _pallets_en_cache
+    if len(mapa) > MAX_PALLETS:
+        return
+    _cache[clave] = mapa
+    _pallets_en_cache += len(mapa)
+    while len(_cache) > MAX_ARCHIVOS or _pallets_en_cache > MAX_PALLETS:
+        _, expulsado = _cache.popitem(last=False)
+        _pallets_en_cache -= len(expulsado)
+
+
+def leer_termografos(contenido: bytes) -> Dict[str, str]:
+    """Mapa de termógrafos del archivo; si ya se parseó (mismo contenido) sale de la caché."""
+    global _hits, _misses
+    if not contenido:
+        return {}
+    clave = hashlib.sha256(contenido).hexdigest()
+    with _lock:
+        mapa = _cache.get(clave)
+        if mapa is not None:
+            _cache.move_to_end(clave)
+            _hits += 1
+            return dict(mapa)
+        _misses += 1
+
+    try:
+        mapa = parse_termografos(contenido)
+    except Exception as e:
+        logger.error(f"Error procesando termógrafos: {e}")
+        return {}
+
+    with _lock:
+        if clave not in _cache:
+            _guardar(clave, mapa)
+    return dict(mapa)
+
+
+def estadisticas() -> Dict[str, Any]:
+    with _lock:
+        return {
+            "archivos": len(_cache),
+            "pallets": _pallets_en_cache,
+            "hits": _hits,
+            "misses": _misses,
+        }
@@ -2,21 +2,74 @@ import re
 from fastapi import HTTPException
 from zoneinfo import ZoneInfo
 from datetime import datetime
+from typing import Optional
 
 def get_peru_time() -> datetime:
     """Devuelve la fecha y hora actual en la zona horaria de Perú."""
     return datetime.now(ZoneInfo("America/Lima"))
 
+def strip_orden_beta(orden_beta: Optional[str]) -> Optional[str]:
+    """Extrae la orden numérica pero evadiendo cruces con clientes que usan otros prefijos (ej. PE004)."""
+    if not orden_beta:
+        return None
+    
+    val_upper = orden_beta.strip().upper()
+    
+    # Si tiene letras, nos aseguramos de que sea solo BG, CO, BP, BAM, BU o BAA (prefijos de Beta)
+    has_letters = any(c.isalpha() for c in val_upper)
+    if has_letters:
+        allowed_prefixes = ["BG", "CO", "BP", "BAM", "BU", "BAA"]
+        if not any(prefix in val_upper for prefix in allowed_prefixes):
+            # Si tiene letras y no es de Beta, devolvemos el valor original crudo.
+            return val_upper
+            
+    # Si es puramente numérico o tiene prefijos autorizados, le quitamos las letras
+    numeric = re.sub(r'[^0-9]', '', val_upper)
+    return numeric if numeric else None
+
+def normalize_orden_beta(orden_beta: Optional[str]) -> Optional[str]:
+    """
+    Clave de orden para cruces indexados (columna orden_num): strip_orden_beta
+    sin ceros a la izquierda, así "BG117" == "0117" == "117".
+    """
+    num = strip_orden_beta(orden_beta)
+    if num and num.isdigit():
+        return num.lstrip("0") or "0"
+    return num
+
+CULTIVOS_SIN_DEFINIR = {"", "PENDIENTE", "N/A", "-"}
+
+def normalize_cultivo(cultivo: Optional[str]) -> Optional[str]:
+    """Clave de cultivo para cruces indexados (columna cultivo_key): Upper + Strip; None si vacío o pendiente."""
+    valor = (cultivo or "").strip().upper()
+    return None if valor in CULTIVOS_SIN_DEFINIR else valor
+
 def clean_booking(value: str) -> str:
     """Upper + Strip"""
     if not value: return ""
     return value.strip().upper()
 
+def normalize_vessel_name(value: Optional[str]) -> str:
+    """
+    Forma canónica del nombre de nave usada para búsquedas indexadas.
+    "ALBEMARLE ISLAND / SR26015" == "albemarle island SR26015" == "ALBEMARLE ISLAND/SR26015"
+    """
+    if not value: return ""
+    return " ".join(str(value).upper().replace("/", " ").split())
+
 def clean_plate(value: str) -> str:
     """Upper + No hyphens"""
     if not value: return ""
     return value.strip().upper().replace("-", "")
 
+def normalize_plate(value: Optional[str]) -> str:
+    """
+    Forma canónica de una placa usada para búsquedas indexadas (solo A-Z y 0-9).
+    "abc-123" == "ABC 123" == "ABC123"
+    """
+    if not value: return ""
+    return re.sub(r'[^A-Z0-9]', '', str(value).upper())
+
 def clean_container(value: str) -> str:
     """ISO Regex"""
     if not value: return ""
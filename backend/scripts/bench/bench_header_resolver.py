@@ -0,0 +1,90 @@
+"""
+Benchmark: resolución de cabeceras en modo objetos de /sync/*/raw.
+
+Compara, para payloads de N filas con las cabeceras del Plan Maestro:
+- legacy: por cada clave de cada fila, clean_header (regex) sobre todas las
+  entradas de COLUMN_MAPPING hasta encontrar coincidencia.
+- resolutor: ResolutorCabeceras precompilado + caché por firma de cabeceras.
+Ambos construyen los mismos dicts {columna: valor crudo} (se verifica).
+
+Uso (desde backend/):
+    python scripts/bench/bench_header_resolver.py [--filas 1000 5000 20000]
+
+Referencia (30 cabeceras por fila, 49 entradas en COLUMN_MAPPING):
+      filas |  legacy s | resolutor s |      x
+       1000 |     1.437 |      0.0045 |    320
+       5000 |     6.998 |      0.0282 |    248
+      20000 |    26.327 |      0.0866 |    304
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+# Ajustar el path para encontrar el backend (estando en scripts/bench)
+_base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _base not in sys.path: sys.path.append(_base)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SYNC_TOKEN", "bench")
+
+from app.routers.sync import COLUMN_MAPPING  # noqa: E402
+from app.services.sync_ingesta import ResolutorCabeceras  # noqa: E402
+
+CABECERAS = [
+    "PLT. EMPACADORA", "CULTIVO", "BOOKING LIMPIO", "NAVE", "ETD BOOKING", "ETA BOOKING", "POL",
+    "O/BETA FINAL", "PRECINTO SENASA (SI/NO)", "OPERADOR", "NAVIERA", "TERMOREGISTROS", "AC", "C/T",
+    "VENT", "T°", "HUMEDAD", "FILTROS", "FECHA SOLICITADA (OPERADOR)", "HORA SOLICITADA (OPERADOR)",
+    "CAJAS VACIAS (SI/NO)", "DESTINO (BOOKING)", "PAIS (BOOKING)", "TIPO TECNOLOGIA", "ETIQUETA CAJA",
+    "FECHA LLENADO", "HORA LLENADO", "OBSERVACIONES", "SEMANA", "CLIENTE",
+]
+
+
+def clean_header(h):
+    return re.sub(r'[^A-Z0-9]', '', str(h).upper()) if h else ""
+
+
+def legacy(payload):
+    salida = []
+    for row in payload:
+        row_data = {}
+        for orig_key, val in row.items():
+            c_header = clean_header(orig_key)
+            for ex_col, db_col in COLUMN_MAPPING.items():
+                if clean_header(ex_col) == c_header:
+                    if db_col not in row_data:
+                        row_data[db_col] = val
+                    break
+        salida.append(row_data)
+    return salida
+
+
+def resolutor(payload):
+    # Instancia nueva por corrida: incluye el precompilado y el primer miss de la firma
+    r = ResolutorCabeceras(COLUMN_MAPPING)
+    salida = []
+    for row in payload:
+        salida.append({db_col: row[k] for k, db_col in r.por_claves(tuple(row))})
+    return salida
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = ap.parse_args()
+
+    print(f"{'filas':>7} | {'legacy s':>9} | {'resolutor s':>11} | {'x':>6}")
+    for n in args.filas:
+        payload = [{h: f"{h}-{i}" for h in CABECERAS} for i in range(n)]
+        t0 = time.perf_counter()
+        a = legacy(payload)
+        t_l = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        b = resolutor(payload)
+        t_r = time.perf_counter() - t0
+        assert a == b, "Los mapeos difieren"
+        print(f"{n:>7} | {t_l:>9.3f} | {t_r:>11.4f} | {t_l / t_r:>6.0f}")
+
+
+if __name__ == "__main__":
+    main()
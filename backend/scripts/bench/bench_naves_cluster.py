@@ -0,0 +1,129 @@
+"""
+Benchmark: agrupación de naves (Smart Match) en /packing-list/naves.
+
+Compara, sobre una temporada sintética de nombres de nave, el algoritmo anterior
+(cada booking contra TODAS las naves vistas con difflib) frente a ClusterNaves
+en frío (sin alias) y en caliente (con los alias persistidos de la corrida previa).
+
+Uso (desde backend/):
+    python scripts/bench/bench_naves_cluster.py [--naves 150] [--viajes 5] [--bookings 15000] [--sin-legacy]
+
+Referencia (150 naves × 5 viajes, 15000 bookings, 2892 nombres distintos → 714 grupos):
+    legacy 333 s · cluster en frío 0.19 s · cluster con alias 0.05 s (mismos grupos)
+"""
+import argparse
+import difflib
+import os
+import random
+import re
+import sys
+import time
+
+# Ajustar el path para encontrar el backend (estando en scripts/bench)
+_base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _base not in sys.path: sys.path.append(_base)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SYNC_TOKEN", "bench")
+
+from app.services.naves_service import ClusterNaves  # noqa: E402
+
+PREFIJOS = ["MSC", "MAERSK", "CMA CGM", "HAPAG", "ONE", "COSCO", "EVERGREEN", "SEALAND", "HMM", "ZIM"]
+NOMBRES = ["ALANYA", "BATUR", "ALBEMARLE ISLAND", "CAPE TOWN", "SANTOS EXPRESS", "POLAR", "RIO GRANDE",
+           "VALPARAISO", "CALLAO", "ATLANTIC", "PACIFIC", "ANDES", "LIMA", "BUENAVENTURA", "GUAYAQUIL"]
+
+
+def _is_same_ship_legacy(name1: str, name2: str, threshold: float = 0.95) -> bool:
+    if not name1 or not name2: return False
+    if name1 == "SIN NAVE" or name2 == "SIN NAVE": return False
+    n1 = re.sub(r'[^A-Z0-9]', '', name1.upper())
+    n2 = re.sub(r'[^A-Z0-9]', '', name2.upper())
+    if n1 == n2: return True
+    return difflib.SequenceMatcher(None, n1, n2).ratio() >= threshold
+
+
+def _variante(nombre: str, rnd: random.Random) -> str:
+    """Variantes reales de digitación: slash, espacios, minúsculas."""
+    base, viaje = nombre.rsplit(" ", 1)
+    opcion = rnd.random()
+    if opcion < 0.5:
+        return nombre
+    if opcion < 0.7:
+        return f"{base} / {viaje}"
+    if opcion < 0.85:
+        return f"{base}  {viaje}".lower()
+    return f"{base}/{viaje}"
+
+
+def temporada(n_naves: int, viajes: int, n_bookings: int, seed: int = 7):
+    rnd = random.Random(seed)
+    naves = set()
+    while len(naves) < n_naves:
+        naves.add(f"{rnd.choice(PREFIJOS)} {rnd.choice(NOMBRES)} {rnd.randint(1, 99)}")
+    nombres = []
+    for nave in sorted(naves):
+        for _ in range(viajes):
+            nombres.append(f"{nave} {rnd.choice('NX')}{rnd.randint(600, 699)}{rnd.choice('ANRS')}")
+    return [_variante(rnd.choice(nombres), rnd) for _ in range(n_bookings)]
+
+
+def legacy(bookings_naves):
+    stats = {}
+    for nave in bookings_naves:
+        nave_final = nave.strip().upper()
+        target = nave_final
+        for existente in stats.keys():
+            if _is_same_ship_legacy(nave_final, existente):
+                target = existente
+                break
+        stats.setdefault(target, 0)
+        stats[target] += 1
+    return stats
+
+
+def cluster(bookings_naves, alias=None):
+    c = ClusterNaves(alias=alias)
+    stats = {}
+    for nave in bookings_naves:
+        nave_id, _ = c.resolver(nave.strip().upper())
+        stats.setdefault(nave_id, 0)
+        stats[nave_id] += 1
+    return stats, c
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--naves", type=int, default=150)
+    ap.add_argument("--viajes", type=int, default=5)
+    ap.add_argument("--bookings", type=int, default=15000)
+    ap.add_argument("--sin-legacy", action="store_true", help="Omite el algoritmo anterior (lento)")
+    args = ap.parse_args()
+
+    data = temporada(args.naves, args.viajes, args.bookings)
+    print(f"Temporada: {args.bookings} bookings, {len(set(data))} nombres distintos")
+
+    st_legacy, t_legacy = None, 0.0
+    if not args.sin_legacy:
+        t0 = time.perf_counter()
+        st_legacy = legacy(data)
+        t_legacy = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    st_frio, c = cluster(data)
+    t_frio = time.perf_counter() - t0
+
+    alias = dict(c.nuevos)
+    t0 = time.perf_counter()
+    st_caliente, _ = cluster(data, alias=alias)
+    t_caliente = time.perf_counter() - t0
+
+    print(f"{'algoritmo':<22}{'grupos':>8}{'tiempo (s)':>14}")
+    if st_legacy is not None:
+        print(f"{'legacy (difflib N×V)':<22}{len(st_legacy):>8}{t_legacy:>14.3f}")
+    print(f"{'cluster en frío':<22}{len(st_frio):>8}{t_frio:>14.3f}")
+    print(f"{'cluster con alias':<22}{len(st_caliente):>8}{t_caliente:>14.3f}")
+    if st_legacy is not None:
+        print(f"Mismos tamaños de grupo: {sorted(st_legacy.values()) == sorted(st_frio.values()) == sorted(st_caliente.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Benchmark: escritura del Packing List OGL (plantilla + grilla de pallets).
+
+Compara para 500, 2.000 y 10.000 pallets:
+- legacy: load_workbook de la plantilla en cada PL + ~24 asignaciones ws.cell() por fila.
+- writer: plantilla cacheada clonada en memoria + PackingListWriter.agregar_filas.
+Ambos incluyen el guardado a bytes. Reporta tiempo y pico de memoria (tracemalloc,
+en una corrida aparte para no distorsionar los tiempos).
+
+Uso (desde backend/):
+    python scripts/bench/bench_packing_list_writer.py [--plantilla RUTA.xlsx] [--filas 500 2000 10000]
+
+Por defecto usa assets/templates/TERMOGRAFOS.xlsx, que trae un logo: así cada
+medición guarda varias veces clones de la misma plantilla cacheada con imagen.
+
+Referencia (plantilla de 10.000 filas × 30 columnas preformateadas, --plantilla):
+      filas |  legacy s  legacy MB |  writer s  writer MB
+        500 |      6.70      118.3 |      4.94       94.5
+       2000 |      6.98      118.5 |      5.03       94.6
+      10000 |      8.11      119.1 |      6.87       95.3
+Referencia (TERMOGRAFOS.xlsx, 100 filas y un logo):
+        500 |      0.28        3.6 |      0.22        2.9
+       2000 |      0.70       11.0 |      0.80       10.4
+      10000 |      3.35       55.1 |      3.80       54.5
+Con una plantilla chica la ganancia es solo el parseo evitado; en grillas
+grandes domina el guardado del xlsx, igual para ambos. El pico del writer no
+incluye la plantilla cacheada, que queda residente en el proceso.
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+# Ajustar el path para encontrar el backend (estando en scripts/bench)
+_base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _base not in sys.path: sys.path.append(_base)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SYNC_TOKEN", "bench")
+
+import openpyxl  # noqa: E402
+
+from app.services.packing_list_writer import PackingListWriter, fila_pallet_ogl, nuevo_libro  # noqa: E402
+
+# Plantilla con logo: cada emisión debe llevar su propia copia de la imagen
+PLANTILLA_CON_IMAGEN = os.path.join(_base, "assets", "templates", "TERMOGRAFOS.xlsx")
+
+PEDIDO = SimpleNamespace(product="POMEGRANATE", variedad="WONDERFUL", peso_por_caja=3.8,
+                         caja_por_pallet=200, cultivo="GRANADA")
+
+
+def items(n):
+    return [{
+        "pallet": f"GW-{i:05d}", "calibre": "14", "kilos": 760, "total_kilos": 760, "cajas": 200,
+        "cosecha": "18/03/2026", "proceso": "19/03/2026", "lote_ogl": "L 12 - 04",
+        "trazabilidad": "123.078.5702.05",
+    } for i in range(n)]
+
+
+def legacy(ruta, data):
+    wb = openpyxl.load_workbook(ruta, keep_vba=False)
+    ws = wb.active
+    for i, item in enumerate(data):
+        fila_e = 21 + i
+        ws.cell(row=fila_e, column=3).value = item["pallet"]
+        ws.cell(row=fila_e, column=4).value = "MEDU 9114521"
+        ws.cell(row=fila_e, column=6).value = PEDIDO.product
+        ws.cell(row=fila_e, column=7).value = PEDIDO.variedad
+        ws.cell(row=fila_e, column=8).value = item["calibre"]
+        ws.cell(row=fila_e, column=9).value = f"{PEDIDO.peso_por_caja} KG"
+        ws.cell(row=fila_e, column=14).value = round(float(item["cajas"]) * 4.2, 2)
+        ws.cell(row=fila_e, column=15).value = item["total_kilos"]
+        ws.cell(row=fila_e, column=16).value = item["cosecha"]
+        ws.cell(row=fila_e, column=17).value = item["proceso"]
+        ws.cell(row=fila_e, column=18).value = item["lote_ogl"]
+        ws.cell(row=fila_e, column=19).value = "Complejo Agroindustrial"
+        ws.cell(row=fila_e, column=20).value = "7751043044355"
+        ws.cell(row=fila_e, column=21).value = PEDIDO.caja_por_pallet
+        ws.cell(row=fila_e, column=22).value = item["cajas"]
+        ws.cell(row=fila_e, column=23).value = "COMPLEJO AGROINDUSTRIAL BETA S.A."
+        ws.cell(row=fila_e, column=24).value = "4050373153151"
+        ws.cell(row=fila_e, column=25).value = "ICA"
+        ws.cell(row=fila_e, column=26).value = item["trazabilidad"]
+    out = io.BytesIO()
+    wb.save(out)
+    return out.getvalue()
+
+
+def writer(ruta, data):
+    w = PackingListWriter(ruta)
+    w.agregar_filas(fila_pallet_ogl(item, "MEDU 9114521", PEDIDO, "ICA") for item in data)
+    return w.guardar()
+
+
+def medir(fn, ruta, data):
+    t0 = time.perf_counter()
+    fn(ruta, data)
+    tiempo = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(ruta, data)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tiempo, pico / 1024 / 1024
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--plantilla", default=PLANTILLA_CON_IMAGEN)
+    ap.add_argument("--filas", type=int, nargs="+", default=[500, 2000, 10000])
+    args = ap.parse_args()
+    ruta = os.path.normpath(args.plantilla)
+
+    # Calentar la caché de plantilla (una vez por proceso, como en el servidor)
+    t0 = time.perf_counter()
+    nuevo_libro(ruta)
+    print(f"Parseo inicial de plantilla (una vez por proceso): {time.perf_counter() - t0:.2f} s")
+
+    print(f"{'filas':>7} | {'legacy s':>9} {'legacy MB':>10} | {'writer s':>9} {'writer MB':>10}")
+    for n in args.filas:
+        data = items(n)
+        t_l, m_l = medir(legacy, ruta, data)
+        t_w, m_w = medir(writer, ruta, data)
+        print(f"{n:>7} | {t_l:>9.2f} {m_l:>10.1f} | {t_w:>9.2f} {m_w:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
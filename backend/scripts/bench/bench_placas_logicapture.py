@@ -0,0 +1,147 @@
+"""
+Benchmark: búsqueda de tracto/carreta por placa en LogiCapture.
+
+Compara, sobre una flota sintética en SQLite, la búsqueda anterior de
+/logicapture/vehicle/{placa} y /trailer/{placa} (traer toda la tabla y aplicar
+clean_plate fila a fila, con el transportista en una consulta aparte) frente a
+los endpoints actuales (una búsqueda por el índice único de placa_norm con el
+transportista en el mismo SELECT). Las placas consultadas se escriben como en
+la balanza: minúsculas, con o sin guion. Verifica que ambos encuentren lo mismo.
+
+Uso (desde backend/):
+    python scripts/bench/bench_placas_logicapture.py [--vehiculos 20000] [--consultas 100]
+
+Referencia (20000 tractos + 20000 carretas, 300 consultas por tipo, 5% inexistentes):
+       tipo |  legacy ms/consulta | indexado ms/consulta |       x
+     tracto |              568.40 |                 0.88 |     647
+    carreta |              631.71 |                 0.51 |    1233
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# Ajustar el path para encontrar el backend (estando en scripts/bench)
+_base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _base not in sys.path: sys.path.append(_base)
+_tmp = tempfile.mkdtemp(prefix="bench_placas_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp, 'flota.db')}"
+os.environ.setdefault("SYNC_TOKEN", "bench")
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.models.maestros import Transportista, VehiculoCarreta, VehiculoTracto  # noqa: E402
+from app.routers.logicapture import get_trailer_data, get_vehicle_data  # noqa: E402
+from app.utils.formatters import clean_plate  # noqa: E402
+
+LETRAS = "ABCDEFGHJKLMNPRSTUVWXYZ"
+
+
+def _placa(rnd: random.Random) -> str:
+    return f"{rnd.choice(LETRAS)}{rnd.randint(0, 9)}{rnd.choice(LETRAS)}-{rnd.randint(0, 999):03d}"
+
+
+def poblar(n: int, seed: int = 11):
+    """n tractos y n carretas repartidos en n/20 transportistas; devuelve las placas de cada tipo."""
+    rnd = random.Random(seed)
+    placas = set()
+    while len(placas) < 2 * n:
+        placas.add(_placa(rnd))
+    placas = sorted(placas)
+    rnd.shuffle(placas)
+    tractos, carretas = placas[:n], placas[n:]
+
+    db = SessionLocal()
+    empresas = [Transportista(ruc=f"20{i:09d}", nombre_transportista=f"TRANSPORTES {i}") for i in range(max(1, n // 20))]
+    db.add_all(empresas)
+    db.flush()
+    db.add_all(VehiculoTracto(transportista_id=rnd.choice(empresas).id, placa_tracto=p, numero_ejes=3) for p in tractos)
+    db.add_all(VehiculoCarreta(transportista_id=rnd.choice(empresas).id, placa_carreta=p, numero_ejes=3) for p in carretas)
+    db.commit()
+    db.close()
+    return tractos, carretas
+
+
+def consultas(placas, n: int, seed: int = 5):
+    """Como se digitan: minúsculas y sin guion a veces; 5% de placas no registradas."""
+    rnd = random.Random(seed)
+    salida = []
+    for _ in range(n):
+        p = _placa(rnd) if rnd.random() < 0.05 else rnd.choice(placas)
+        if rnd.random() < 0.5: p = p.replace("-", "")
+        if rnd.random() < 0.3: p = p.lower()
+        salida.append(p)
+    return salida
+
+
+def legacy_tracto(placa, db):
+    clean = clean_plate(placa)
+    todos = db.query(VehiculoTracto).all()
+    v = next((v for v in todos if clean_plate(v.placa_tracto) == clean), None)
+    if not v:
+        return None
+    return v.placa_tracto, v.transportista.nombre_transportista if v.transportista else "S/N"
+
+
+def legacy_carreta(placa, db):
+    clean = clean_plate(placa)
+    todos = db.query(VehiculoCarreta).all()
+    t = next((t for t in todos if clean_plate(t.placa_carreta) == clean), None)
+    return (t.placa_carreta, None) if t else None
+
+
+def actual_tracto(placa, db):
+    try:
+        r = get_vehicle_data(placa, db)
+    except HTTPException:
+        return None
+    return r["placa"], r["transportista"]
+
+
+def actual_carreta(placa, db):
+    try:
+        r = get_trailer_data(placa, db)
+    except HTTPException:
+        return None
+    return r["placa"], None
+
+
+def medir(fn, placas):
+    """ms por consulta; sesión nueva por consulta, como cada request."""
+    resultados = []
+    t0 = time.perf_counter()
+    for p in placas:
+        db = SessionLocal()
+        try:
+            resultados.append(fn(p, db))
+        finally:
+            db.close()
+    return (time.perf_counter() - t0) * 1000 / len(placas), resultados
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--vehiculos", type=int, default=20000)
+    ap.add_argument("--consultas", type=int, default=100)
+    args = ap.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    tractos, carretas = poblar(args.vehiculos)
+
+    print(f"{'tipo':>11} | {'legacy ms/consulta':>19} | {'indexado ms/consulta':>20} | {'x':>7}")
+    for tipo, placas, legacy, actual in (
+        ("tracto", tractos, legacy_tracto, actual_tracto),
+        ("carreta", carretas, legacy_carreta, actual_carreta),
+    ):
+        qs = consultas(placas, args.consultas)
+        ms_legacy, r_legacy = medir(legacy, qs)
+        ms_actual, r_actual = medir(actual, qs)
+        assert r_legacy == r_actual, f"{tipo}: resultados distintos"
+        print(f"{tipo:>11} | {ms_legacy:>19.2f} | {ms_actual:>20.2f} | {ms_legacy / ms_actual:>7.0f}")
+
+
+if __name__ == "__main__":
+    main()
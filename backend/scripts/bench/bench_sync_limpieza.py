@@ -0,0 +1,102 @@
+"""
+Benchmark: limpieza de valores de sincronización (Plan Maestro).
+
+Compara, para N filas con columnas de texto, numéricas, fechas y horas:
+- legacy: clean_data_value celda a celda (versión previa a sync_limpieza).
+- columnar: sync_limpieza.limpiar_filas (pandas por columna + fechas memoizadas).
+Verifica que ambos produzcan exactamente los mismos valores.
+
+Uso (desde backend/):
+    python scripts/bench/bench_sync_limpieza.py [--filas 1000 5000 20000]
+
+Referencia (11 columnas, ~110 fechas distintas):
+      filas |  legacy s | columnar s |     x
+       1000 |     0.116 |      0.030 |   3.9
+       5000 |     0.610 |      0.092 |   6.6
+      20000 |     2.603 |      0.354 |   7.4
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+# Ajustar el path para encontrar el backend (estando en scripts/bench)
+_base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if _base not in sys.path: sys.path.append(_base)
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("SYNC_TOKEN", "bench")
+
+from dateutil.parser import parse as parse_date  # noqa: E402
+
+from app.services.sync_limpieza import limpiar_filas  # noqa: E402
+
+
+def legacy_clean(val, db_column):
+    null_and_errors = {"", "-", "N/A", "NONE", "NULL", "NAN", "#¡VALOR!", "#VALUE!", "#REF!", "#DIV/0!", "#N/A", "#NAME?", "#¿NOMBRE?"}
+    if val is None: return None
+    val_str = str(val).strip()
+    if not val_str or val_str.upper() in null_and_errors: return None
+    col_upper = db_column.upper()
+    numeric_cols = ["PESO_POR_CAJA", "CAJA_POR_PALLET", "TOTAL_PALLETS", "TOTAL_CAJAS", "SEMANA_ETA", "CAJAS_VACIAS"]
+    if val_str == "0" and col_upper not in numeric_cols:
+        return None
+    if col_upper in numeric_cols:
+        if col_upper == "CAJAS_VACIAS":
+            if val_str.upper() == "SI": return 1
+            if val_str.upper() == "NO": return 0
+        match = re.search(r'(\d+(\.\d+)?)', val_str.replace(',', ''))
+        if match:
+            num = float(match.group(1))
+            return int(num) if col_upper != "PESO_POR_CAJA" else num
+    if col_upper in ["ETD", "ETA", "FECHA_PROGRAMADA", "FECHA_LLENADO_REPORTE"]:
+        try:
+            meses_es_en = {
+                "ENE": "JAN", "FEB": "FEB", "MAR": "MAR", "ABR": "APR", "MAY": "MAY", "JUN": "JUN",
+                "JUL": "JUL", "AGO": "AUG", "SEP": "SEP", "OCT": "OCT", "NOV": "NOV", "DIC": "DEC"
+            }
+            temp_val = val_str.upper()
+            for es, en in meses_es_en.items():
+                if es in temp_val: temp_val = temp_val.replace(es, en)
+            return parse_date(temp_val, dayfirst=True).date()
+        except Exception:
+            return None
+    if col_upper in ["HORA_PROGRAMADA", "HORA_LLENADO_REPORTE"]:
+        try: return parse_date(val_str).time()
+        except Exception: return None
+    return val_str.replace(";", "").strip().upper()
+
+
+def payload(n):
+    rnd = random.Random(7)
+    fechas = [f"{d}-{m}-2026" for d in range(1, 29) for m in ("ene", "feb", "mar", "abr")]
+    return [{
+        "booking": f"ebkg{i:08d}", "nave": rnd.choice(["MSC ALANYA / NX618R", "maersk batur 615n"]),
+        "etd": rnd.choice(fechas), "eta": rnd.choice(fechas), "fecha_programada": rnd.choice(fechas + ["", "-"]),
+        "hora_programada": rnd.choice(["08:00", "10:30", "14:00", ""]), "cajas_vacias": rnd.choice(["SI", "NO", ""]),
+        "temperatura": rnd.choice(["-1.5", "0", "2"]), "orden_beta": f"BG-{rnd.randint(1, 999)}",
+        "cultivo": rnd.choice(["GRANADA", "PALTA", "UVA"]), "planta_llenado": rnd.choice(["ICA", "OLMOS;"]),
+    } for i in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--filas", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = ap.parse_args()
+
+    print(f"{'filas':>7} | {'legacy s':>9} | {'columnar s':>10} | {'x':>5}")
+    for n in args.filas:
+        crudas = payload(n)
+        t0 = time.perf_counter()
+        a = [{c: legacy_clean(v, c) for c, v in fila.items()} for fila in crudas]
+        t_l = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        b = limpiar_filas([dict(fila) for fila in crudas])
+        t_c = time.perf_counter() - t0
+        assert a == b, "Los valores limpios difieren"
+        print(f"{n:>7} | {t_l:>9.3f} | {t_c:>10.3f} | {t_l / t_c:>5.1f}")
+
+
+if __name__ == "__main__":
+    main()